@@ -0,0 +1,53 @@
+"""
+Cache mémoire à durée de vie bornée (TTL) - ECO PUMP AFRIK
+
+Cache local au processus : chaque worker uvicorn a le sien, la durée de vie
+borne donc le décalage possible entre workers.
+"""
+import time
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """Dictionary whose entries expire `ttl` seconds after being stored"""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if len(self._entries) >= self.max_entries and key not in self._entries:
+            self._evict()
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key: Hashable = None):
+        """Drop one entry, or every entry when no key is given"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        """Drop the entries whose value satisfies `predicate`"""
+        for key in [k for k, (_, value) in self._entries.items() if predicate(value)]:
+            del self._entries[key]
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._entries.items() if expires_at < now]
+        for k in expired:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            # Plus ancienne insertion en premier (ordre d'insertion des dict)
+            del self._entries[next(iter(self._entries))]
@@ -0,0 +1,240 @@
+"""
+Statistiques du tableau de bord matérialisées - ECO PUMP AFRIK
+
+Les compteurs du tableau de bord sont conservés dans un document unique de
+la collection `dashboard_stats`, mis à jour par $inc à chaque création
+(client, fournisseur, devis, facture, article) et à chaque paiement. La
+lecture du tableau de bord ne coûte donc qu'un find_one, servi la plupart du
+temps par un cache mémoire à durée de vie bornée.
+
+`rebuild_dashboard_stats()` recalcule tout depuis les collections pour
+réconcilier les compteurs (ex : données modifiées hors API). Un seul
+recalcul à la fois (bail `rebuild_started_at` pris sur le document) ; le
+résultat est écrit par $inc de l'écart entre le recalcul et les compteurs
+lus à la prise du bail : les $inc arrivés pendant le recalcul sont
+conservés (seuls ceux concurrents des agrégations elles-mêmes peuvent être
+comptés deux fois, jusqu'au recalcul suivant).
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+from database import (
+    clients_repo,
+    fournisseurs_repo,
+    devis_repo,
+    factures_repo,
+    stock_repo,
+    dashboard_stats_repo,
+)
+
+logger = logging.getLogger(__name__)
+
+STATS_ID = "global"
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', '10'))
+# Au-delà, un recalcul interrompu (processus arrêté) ne bloque plus les suivants
+REBUILD_LEASE_SECONDS = float(os.environ.get('DASHBOARD_REBUILD_LEASE_SECONDS', '300'))
+REBUILD_LEASE_FIELD = "rebuild_started_at"
+
+_stats_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL, max_entries=1)
+
+
+class RebuildInProgress(Exception):
+    """Another request or worker is already rebuilding the statistics"""
+
+
+def month_key(moment: Optional[datetime] = None) -> str:
+    """Monthly bucket of a document, from its created_at (YYYY-MM)"""
+    return (moment or datetime.now()).strftime("%Y-%m")
+
+
+async def _apply(increments: dict):
+    await dashboard_stats_repo.update_one({"_id": STATS_ID}, {"$inc": increments}, upsert=True)
+    _stats_cache.invalidate()
+
+
+async def record_client(devise: str, delta: int = 1):
+    await _apply({"total_clients": delta, f"clients_by_devise.{devise}": delta})
+
+
+async def record_client_devise_change(old_devise: str, new_devise: str):
+    if old_devise != new_devise:
+        await _apply({f"clients_by_devise.{old_devise}": -1, f"clients_by_devise.{new_devise}": 1})
+
+
+async def record_fournisseur(delta: int = 1):
+    await _apply({"total_fournisseurs": delta})
+
+
+async def record_devis(montant: float, created_at: datetime):
+    month = month_key(created_at)
+    await _apply({
+        "total_devis": 1,
+        f"months.{month}.devis": 1,
+        f"months.{month}.montant_devis": montant,
+    })
+
+
+async def record_facture(montant: float, created_at: datetime):
+    month = month_key(created_at)
+    await _apply({
+        "total_factures": 1,
+        f"months.{month}.factures": 1,
+        f"months.{month}.montant_factures": montant,
+        "montant_a_encaisser": montant,
+    })
+
+
+async def record_encaissement(montant: float):
+    """Payment applied to an invoice (only the part that reduced what was due)"""
+    if montant:
+        await _apply({"montant_a_encaisser": -montant})
+
+
+async def record_stock_alert(was_alert: bool, is_alert: bool):
+    if was_alert != is_alert:
+        await _apply({"stock_alerts": 1 if is_alert else -1})
+
+
+def is_stock_alert(article: dict) -> bool:
+    return article.get("quantite_stock", 0) < article.get("stock_minimum", 0)
+
+
+def _format_stats(document: dict) -> dict:
+    month = document.get("months", {}).get(month_key(), {})
+    by_devise = document.get("clients_by_devise", {})
+    return {
+        "total_clients": document.get("total_clients", 0),
+        "total_fournisseurs": document.get("total_fournisseurs", 0),
+        "total_devis": document.get("total_devis", 0),
+        "total_factures": document.get("total_factures", 0),
+        "devis_ce_mois": month.get("devis", 0),
+        "factures_ce_mois": month.get("factures", 0),
+        "montant_devis_mois": month.get("montant_devis", 0),
+        "montant_factures_mois": month.get("montant_factures", 0),
+        "montant_a_encaisser": document.get("montant_a_encaisser", 0),
+        "clients_fcfa": by_devise.get("FCFA", 0),
+        "clients_eur": by_devise.get("EUR", 0),
+        "stock_alerts": document.get("stock_alerts", 0),
+    }
+
+
+async def get_dashboard_stats() -> dict:
+    stats = _stats_cache.get(STATS_ID)
+    if stats is not None:
+        return stats
+
+    document = await dashboard_stats_repo.find_one({"_id": STATS_ID})
+    if document is None or "rebuilt_at" not in document:
+        # Première lecture : le document matérialisé n'a jamais été construit
+        try:
+            document = await rebuild_dashboard_stats()
+        except RebuildInProgress:
+            # Construction en cours ailleurs : compteurs actuels, non mis en cache
+            return _format_stats(await dashboard_stats_repo.find_one({"_id": STATS_ID}) or {})
+
+    stats = _format_stats(document)
+    _stats_cache.set(STATS_ID, stats)
+    return stats
+
+
+async def _monthly_totals(repo) -> dict:
+    pipeline = [
+        {"$match": {"created_at": {"$type": "string"}}},
+        {"$group": {
+            "_id": {"$substrBytes": ["$created_at", 0, 7]},
+            "count": {"$sum": 1},
+            "montant": {"$sum": "$total_ttc"},
+        }},
+    ]
+    return {row["_id"]: row for row in await repo.aggregate(pipeline)}
+
+
+def _counters(document: dict, prefix: str = "") -> dict:
+    """Numeric counters of a stats document, as dotted paths"""
+    counters = {}
+    for key, value in document.items():
+        if key in ("_id", "rebuilt_at", REBUILD_LEASE_FIELD):
+            continue
+        if isinstance(value, dict):
+            counters.update(_counters(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            counters[f"{prefix}{key}"] = value
+    return counters
+
+
+async def rebuild_dashboard_stats() -> dict:
+    """Recompute the materialised document from the collections (reconciliation)
+
+    Raises RebuildInProgress when another rebuild holds the lease.
+    """
+    started_at = datetime.now()
+    lease_expired = (started_at - timedelta(seconds=REBUILD_LEASE_SECONDS)).isoformat()
+    try:
+        # Bail et lecture des compteurs de départ en une seule opération
+        before = await dashboard_stats_repo.find_one_and_update(
+            {"_id": STATS_ID, "$or": [{REBUILD_LEASE_FIELD: {"$exists": False}},
+                                      {REBUILD_LEASE_FIELD: {"$lt": lease_expired}}]},
+            {"$set": {REBUILD_LEASE_FIELD: started_at.isoformat()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise RebuildInProgress()
+
+    try:
+        computed = await _compute_stats()
+    except Exception:
+        await dashboard_stats_repo.update_one({"_id": STATS_ID}, {"$unset": {REBUILD_LEASE_FIELD: ""}})
+        raise
+
+    # Écart relatif : les $inc arrivés depuis la prise du bail restent comptés
+    current = _counters(before or {})
+    target = _counters(computed)
+    correction = {path: target.get(path, 0) - current.get(path, 0) for path in current.keys() | target.keys()}
+    update = {
+        "$set": {"rebuilt_at": datetime.now().isoformat()},
+        "$unset": {REBUILD_LEASE_FIELD: ""},
+    }
+    correction = {path: delta for path, delta in correction.items() if delta}
+    if correction:
+        update["$inc"] = correction
+    document = await dashboard_stats_repo.find_one_and_update({"_id": STATS_ID}, update, after=True)
+    _stats_cache.invalidate()
+    logger.info("Dashboard statistics rebuilt")
+    return document
+
+
+async def _compute_stats() -> dict:
+    """Counters of the materialised document, computed from the collections"""
+    months = {}
+    for kind, repo in (("devis", devis_repo), ("factures", factures_repo)):
+        for month, row in (await _monthly_totals(repo)).items():
+            bucket = months.setdefault(month, {})
+            bucket[kind] = row["count"]
+            bucket[f"montant_{kind}"] = row["montant"]
+
+    by_devise = {
+        row["_id"]: row["count"]
+        for row in await clients_repo.aggregate([{"$group": {"_id": "$devise", "count": {"$sum": 1}}}])
+        if row["_id"]
+    }
+
+    encaissement_result = await factures_repo.aggregate([
+        {"$match": {"statut_paiement": {"$in": ["impayé", "partiel"]}}},
+        {"$group": {"_id": None, "total": {"$sum": {"$subtract": ["$total_ttc", "$montant_paye"]}}}}
+    ])
+
+    return {
+        "total_clients": await clients_repo.count(),
+        "total_fournisseurs": await fournisseurs_repo.count(),
+        "total_devis": await devis_repo.count(),
+        "total_factures": await factures_repo.count(),
+        "clients_by_devise": by_devise,
+        "months": months,
+        "montant_a_encaisser": encaissement_result[0]["total"] if encaissement_result else 0,
+        "stock_alerts": await stock_repo.count({"en_alerte": True}),
+    }
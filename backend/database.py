@@ -0,0 +1,410 @@
+"""
+Couche d'accès aux données asynchrone (Motor) - ECO PUMP AFRIK
+
+Toutes les routes FastAPI sont `async def` : les accès MongoDB doivent donc
+passer par un client non bloquant, sinon une requête lente fige la boucle
+d'événements uvicorn et sérialise tous les utilisateurs.
+
+Chaque collection métier est exposée via un repository dédié qui encapsule
+le nom de la collection et le champ identifiant métier (client_id, facture_id...).
+
+Les collections synchronisées avec le frontend (VersionedRepository) reçoivent
+à chaque écriture un numéro de `version` pris dans un compteur global
+croissant, et chaque suppression y laisse une pierre tombale : /api/sync
+renvoie ainsi uniquement ce qui a changé depuis un jeton.
+"""
+import os
+import json
+import base64
+import logging
+from datetime import datetime
+from typing import Any, NamedTuple, Optional, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, InsertOne, UpdateOne, UpdateMany
+from pymongo.results import DeleteResult
+
+logger = logging.getLogger(__name__)
+
+# MongoDB connection
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'ecopump_afrik')
+
+# Réglage du pool de connexions (surchargeable par variables d'environnement)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+
+mongo_client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+)
+db = mongo_client[DB_NAME]
+
+
+def encode_cursor(document: dict, id_field: str) -> str:
+    """Opaque pagination cursor pointing after `document` (created_at + business id)"""
+    payload = json.dumps([document.get("created_at"), document.get(id_field)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError if the cursor was not produced by encode_cursor"""
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    return created_at, doc_id
+
+
+class BaseRepository:
+    """Accès asynchrone à une collection MongoDB"""
+
+    collection_name: str = None
+    id_field: str = None
+
+    def __init__(self, database):
+        self.collection = database[self.collection_name]
+
+    async def find_one(self, query: dict, projection: Optional[dict] = None, **kwargs) -> Optional[dict]:
+        return await self.collection.find_one(query, projection, **kwargs)
+
+    async def get(self, doc_id: str, projection: Optional[dict] = None) -> Optional[dict]:
+        """Find a document by its business id (client_id, facture_id, ...)"""
+        return await self.collection.find_one({self.id_field: doc_id}, projection)
+
+    async def find_many(
+        self,
+        query: Optional[dict] = None,
+        projection: Optional[dict] = None,
+        sort: Optional[List[tuple]] = None,
+        limit: int = 0,
+        skip: int = 0,
+    ) -> List[dict]:
+        cursor = self.collection.find(query or {}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def find_page(
+        self,
+        query: Optional[dict] = None,
+        projection: Optional[dict] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Keyset pagination on (created_at, business id), newest first.
+
+        Returns the page and the cursor of the next page (None on the last page).
+        """
+        query = query or {}
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            after_cursor = {"$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, self.id_field: {"$lt": last_id}},
+            ]}
+            query = {"$and": [query, after_cursor]} if query else after_cursor
+
+        if projection and any(projection.values()):
+            # Inclusion projection : the cursor fields must stay in the documents
+            projection = {**projection, "created_at": 1, self.id_field: 1}
+
+        documents = await self.find_many(
+            query,
+            projection,
+            sort=[("created_at", -1), (self.id_field, -1)],
+            limit=limit + 1,
+        )
+        if len(documents) > limit:
+            documents = documents[:limit]
+            return documents, encode_cursor(documents[-1], self.id_field)
+        return documents, None
+
+    async def find_batches(self, query: Optional[dict] = None, projection: Optional[dict] = None,
+                           batch_size: int = 1000):
+        """Iterate over the matching documents `batch_size` at a time (server cursor, not a full list)"""
+        batch = []
+        async for document in self.collection.find(query or {}, projection, batch_size=batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def count(self, query: Optional[dict] = None) -> int:
+        return await self.collection.count_documents(query or {})
+
+    async def insert_one(self, document: dict, **kwargs):
+        return await self.collection.insert_one(document, **kwargs)
+
+    async def update_one(self, query: dict, update: dict, **kwargs):
+        return await self.collection.update_one(query, update, **kwargs)
+
+    async def update_many(self, query: dict, update, **kwargs):
+        return await self.collection.update_many(query, update, **kwargs)
+
+    async def replace_one(self, query: dict, document: dict, **kwargs):
+        return await self.collection.replace_one(query, document, **kwargs)
+
+    async def delete_one(self, query: dict, **kwargs):
+        return await self.collection.delete_one(query, **kwargs)
+
+    async def find_one_and_update(self, query: dict, update: dict, after: bool = False, **kwargs) -> Optional[dict]:
+        """Update a document and return it as it was before (or after) the update"""
+        return await self.collection.find_one_and_update(
+            query,
+            update,
+            return_document=ReturnDocument.AFTER if after else ReturnDocument.BEFORE,
+            **kwargs,
+        )
+
+    async def find_one_and_delete(self, query: dict) -> Optional[dict]:
+        return await self.collection.find_one_and_delete(query)
+
+    async def bulk_write(self, operations: list, ordered: bool = False, **kwargs):
+        return await self.collection.bulk_write(operations, ordered=ordered, **kwargs)
+
+    async def aggregate(self, pipeline: List[dict]) -> List[dict]:
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+
+SYNC_VERSION_KEY = "sync_version"
+SYNC_TOMBSTONE_TTL_DAYS = int(os.environ.get('SYNC_TOMBSTONE_TTL_DAYS', '30'))
+
+
+def stamped_update(update, stamp: dict):
+    """Add the version fields to an update document or an update pipeline"""
+    if isinstance(update, list):
+        return update + [{"$set": stamp}]
+    return {**update, "$set": {**update.get("$set", {}), **stamp}}
+
+
+class VersionedInsert(NamedTuple):
+    """Insertion of a VersionedRepository.bulk_write batch"""
+    document: dict
+
+
+class VersionedUpdate(NamedTuple):
+    """Update (update document or pipeline) of a VersionedRepository.bulk_write batch"""
+    query: dict
+    update: Any
+    many: bool = False
+    upsert: bool = False
+
+
+class VersionedRepository(BaseRepository):
+    """Collection synchronisée : version croissante à chaque écriture, pierre tombale à chaque suppression"""
+
+    async def next_stamp(self) -> dict:
+        version = await counters_repo.increment(SYNC_VERSION_KEY)
+        return {"version": version, "version_at": datetime.now().isoformat()}
+
+    async def insert_one(self, document: dict, **kwargs):
+        document.update(await self.next_stamp())
+        return await super().insert_one(document, **kwargs)
+
+    async def update_one(self, query: dict, update, **kwargs):
+        return await super().update_one(query, stamped_update(update, await self.next_stamp()), **kwargs)
+
+    async def update_many(self, query: dict, update, **kwargs):
+        return await super().update_many(query, stamped_update(update, await self.next_stamp()), **kwargs)
+
+    async def replace_one(self, query: dict, document: dict, **kwargs):
+        return await super().replace_one(query, {**document, **await self.next_stamp()}, **kwargs)
+
+    async def find_one_and_update(self, query: dict, update, after: bool = False, **kwargs) -> Optional[dict]:
+        return await super().find_one_and_update(query, stamped_update(update, await self.next_stamp()),
+                                                 after=after, **kwargs)
+
+    async def bulk_write(self, operations: list, ordered: bool = False, **kwargs):
+        """Write VersionedInsert / VersionedUpdate operations; the whole batch shares one version
+
+        Replacements are not accepted: a replacement document cannot carry
+        the version update, use replace_one.
+        """
+        stamp = await self.next_stamp()
+        requests = []
+        for operation in operations:
+            if isinstance(operation, VersionedInsert):
+                operation.document.update(stamp)
+                requests.append(InsertOne(operation.document))
+            elif isinstance(operation, VersionedUpdate):
+                request = UpdateMany if operation.many else UpdateOne
+                requests.append(request(operation.query, stamped_update(operation.update, stamp),
+                                        upsert=operation.upsert))
+            else:
+                raise TypeError(f"{self.collection_name}: bulk_write expects VersionedInsert or VersionedUpdate, "
+                                f"not {type(operation).__name__}")
+        return await super().bulk_write(requests, ordered=ordered, **kwargs)
+
+    async def write_derived(self, operations: list, **kwargs):
+        """Bulk write of derived fields (search terms, stock indicators) without a new version
+
+        These fields are recomputed from the stored data: the documents do not
+        change for synchronised clients and list ETags stay valid.
+        """
+        return await super().bulk_write(operations, **kwargs)
+
+    async def find_one_and_delete(self, query: dict) -> Optional[dict]:
+        document = await super().find_one_and_delete(query)
+        if document is not None:
+            await tombstones_repo.insert_one({
+                "collection": self.collection_name,
+                "document_id": document.get(self.id_field),
+                "deleted_at": datetime.now(),
+                **await self.next_stamp(),
+            })
+        return document
+
+    async def delete_one(self, query: dict):
+        deleted = await self.find_one_and_delete(query)
+        return DeleteResult({"n": 0 if deleted is None else 1}, acknowledged=True)
+
+
+class ClientsRepository(VersionedRepository):
+    collection_name = "clients"
+    id_field = "client_id"
+
+
+class FournisseursRepository(VersionedRepository):
+    collection_name = "fournisseurs"
+    id_field = "fournisseur_id"
+
+
+class DevisRepository(VersionedRepository):
+    collection_name = "devis"
+    id_field = "devis_id"
+
+
+class FacturesRepository(VersionedRepository):
+    collection_name = "factures"
+    id_field = "facture_id"
+
+
+class AchatsRepository(VersionedRepository):
+    collection_name = "achats"
+    id_field = "achat_id"
+
+
+class StockRepository(VersionedRepository):
+    collection_name = "stock"
+    id_field = "article_id"
+
+
+class MouvementsStockRepository(BaseRepository):
+    collection_name = "mouvements_stock"
+    id_field = "mouvement_id"
+
+
+class PaiementsRepository(VersionedRepository):
+    collection_name = "paiements"
+    id_field = "paiement_id"
+
+
+class UsersRepository(BaseRepository):
+    collection_name = "users"
+    id_field = "user_id"
+
+    async def get_by_username(self, username: str, projection: Optional[dict] = None) -> Optional[dict]:
+        return await self.collection.find_one({"username": username}, projection)
+
+
+class CountersRepository(BaseRepository):
+    """Compteurs de numérotation (un document par préfixe/client/date)"""
+
+    collection_name = "counters"
+    id_field = "_id"
+
+    async def increment(self, key: str, count: int = 1) -> int:
+        """Atomically reserve `count` values and return the last one"""
+        counter = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter["seq"]
+
+    async def current(self, key: str) -> int:
+        """Current value of a counter (0 when it was never incremented)"""
+        counter = await self.collection.find_one({"_id": key}, {"seq": 1})
+        return counter["seq"] if counter else 0
+
+    async def seed(self, key: str, value: int):
+        """Raise the counter to at least `value` (never lowers it)"""
+        await self.collection.update_one({"_id": key}, {"$max": {"seq": value}}, upsert=True)
+
+
+class TombstonesRepository(BaseRepository):
+    """Suppressions des collections synchronisées (expirées après SYNC_TOMBSTONE_TTL_DAYS)"""
+
+    collection_name = "tombstones"
+    id_field = "_id"
+
+
+class DashboardStatsRepository(BaseRepository):
+    """Statistiques du tableau de bord matérialisées (document unique)"""
+
+    collection_name = "dashboard_stats"
+    id_field = "_id"
+
+
+# Repositories
+clients_repo = ClientsRepository(db)
+fournisseurs_repo = FournisseursRepository(db)
+devis_repo = DevisRepository(db)
+factures_repo = FacturesRepository(db)
+achats_repo = AchatsRepository(db)
+stock_repo = StockRepository(db)
+mouvements_repo = MouvementsStockRepository(db)
+paiements_repo = PaiementsRepository(db)
+users_repo = UsersRepository(db)
+counters_repo = CountersRepository(db)
+tombstones_repo = TombstonesRepository(db)
+dashboard_stats_repo = DashboardStatsRepository(db)
+
+
+_transactions_supported = None
+
+
+async def supports_transactions() -> bool:
+    """Multi-document transactions need a replica set or a sharded cluster"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await mongo_client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.warning(f"Could not detect MongoDB transaction support: {e}")
+            _transactions_supported = False
+    return _transactions_supported
+
+
+async def run_in_transaction(callback):
+    """Run `await callback(session)` in a transaction when available, else `callback(None)`"""
+    if not await supports_transactions():
+        return await callback(None)
+    async with await mongo_client.start_session() as session:
+        return await session.with_transaction(callback)
+
+
+async def ping_database():
+    """Check that MongoDB is reachable"""
+    await mongo_client.admin.command("ping")
+    logger.info(f"Connected to MongoDB: {MONGO_URL}/{DB_NAME}")
+
+
+def close_database():
+    mongo_client.close()
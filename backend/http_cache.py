@@ -0,0 +1,177 @@
+"""
+Compression HTTP et GET conditionnel - ECO PUMP AFRIK
+
+Les réponses JSON de plus de COMPRESSION_MIN_SIZE octets sont compressées
+selon l'en-tête Accept-Encoding : brotli si le module est installé et que
+le client l'accepte, sinon gzip. Les PDF (déjà compressés) et les petites
+réponses sont envoyés tels quels.
+
+Les endpoints de liste et de recherche déclarent la dépendance
+`conditional(repo, ...)`. Leur ETag faible est l'empreinte du chemin, des
+paramètres de requête et de la version courante des collections lues (plus
+grande `version` de leurs documents et de leurs pierres tombales : deux
+lectures d'index par collection). Si le client présente déjà cet ETag
+(If-None-Match), la réponse est un 304 sans corps : la liste n'est ni lue
+ni encodée. Sinon le middleware ajoute l'ETag à la réponse 200.
+
+Comme pour /api/sync, une version est réservée avant l'écriture : tant que
+la dernière version d'une collection a moins de SYNC_SETTLE_SECONDS, une
+écriture de version plus petite peut encore arriver. La réponse n'a alors
+pas d'ETag (elle ne pourra pas être revalidée par un 304 périmé).
+"""
+import os
+import gzip
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers, MutableHeaders
+
+from database import tombstones_repo
+from sync import SYNC_SETTLE_SECONDS
+
+try:
+    import brotli
+except ImportError:  # compression brotli facultative
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+# Le navigateur garde la réponse mais la revalide à chaque affichage
+CACHE_CONTROL = "private, no-cache"
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred supported encoding of an Accept-Encoding header ("br", "gzip" or None)"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in (["br"] if brotli is not None else []) + ["gzip"]:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+async def collection_version(repo) -> dict:
+    """Stamp (version, version_at) of the last write to a versioned collection, deletions included"""
+    projection = {"_id": 0, "version": 1, "version_at": 1}
+    latest, deleted = await asyncio.gather(
+        repo.find_many({}, dict(projection), sort=[("version", -1)], limit=1),
+        tombstones_repo.find_many({"collection": repo.collection_name}, dict(projection),
+                                  sort=[("version", -1)], limit=1),
+    )
+    return max(latest + deleted, key=lambda stamp: stamp.get("version", 0), default={})
+
+
+def conditional(*repos, salt: Optional[Callable[[], str]] = None):
+    """Dependency: weak ETag from the versions of `repos` and the query, 304 when the client already has it
+
+    `salt` adds what else the response depends on (e.g. the day and the
+    template version of a PDF).
+    """
+    async def check(request: Request):
+        stamps = await asyncio.gather(*(collection_version(repo) for repo in repos))
+        settled_before = (datetime.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+        if any(stamp.get("version_at", "") >= settled_before for stamp in stamps):
+            # Écriture récente : une version plus petite peut encore être enregistrée
+            return
+        source = "|".join([
+            request.url.path,
+            "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items())),
+            *(str(stamp.get("version", 0)) for stamp in stamps),
+            salt() if salt else "",
+        ])
+        etag = f'W/"{hashlib.sha1(source.encode()).hexdigest()[:24]}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+        request.state.etag = etag
+
+    return check
+
+
+class HttpCacheMiddleware:
+    """ASGI middleware: ETag of conditional endpoints on 200 responses, negotiated JSON compression"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                etag = scope.get("state", {}).get("etag")
+                if etag and message["status"] == 200 and "etag" not in headers:
+                    headers["ETag"] = etag
+                    headers["Cache-Control"] = CACHE_CONTROL
+                compressible = (
+                    encoding is not None
+                    and message["status"] not in (204, 304)
+                    and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                )
+                if not compressible:
+                    await send(message)
+                    return
+                # Corps mis en attente jusqu'au dernier fragment pour décider de la compression
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(scope=start_message)
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+            headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
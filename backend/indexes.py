@@ -0,0 +1,217 @@
+"""
+Registre déclaratif des index MongoDB - ECO PUMP AFRIK
+
+Chaque collection métier déclare ici ses index : index uniques sur les
+identifiants métier (client_id, facture_id, numero_facture...) et index
+composés calqués sur les requêtes réelles des endpoints (tri par
+created_at, filtres de période sur date_facture/date_devis/date_paiement,
+factures impayées par statut_paiement, pagination par curseur sur
+created_at + identifiant...).
+
+`ensure_indexes()` est idempotent : il est appelé au démarrage et ne crée
+que les index absents. `index_report()` compare le registre à l'état réel
+de la base (index manquants, non déclarés, jamais utilisés).
+"""
+import logging
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from database import db, SYNC_TOMBSTONE_TTL_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec:
+    """Declaration of one index of the registry"""
+
+    def __init__(self, keys: List[tuple], name: str, unique: bool = False,
+                 sparse: bool = False, partial_filter: Optional[dict] = None,
+                 expire_after: Optional[int] = None):
+        self.keys = keys
+        self.name = name
+        self.unique = unique
+        self.sparse = sparse
+        self.partial_filter = partial_filter
+        self.expire_after = expire_after
+
+    def to_model(self) -> IndexModel:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        if self.partial_filter:
+            options["partialFilterExpression"] = self.partial_filter
+        if self.expire_after is not None:
+            options["expireAfterSeconds"] = self.expire_after
+        return IndexModel(self.keys, **options)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "keys": [[field, direction] for field, direction in self.keys],
+            "unique": self.unique,
+        }
+
+
+def unique_id(field: str) -> IndexSpec:
+    return IndexSpec([(field, ASCENDING)], f"uniq_{field}", unique=True)
+
+
+def sync_version() -> IndexSpec:
+    # /api/sync : documents modifiés depuis une version
+    return IndexSpec([("version", ASCENDING)], "version")
+
+
+def unique_numero(field: str) -> IndexSpec:
+    # sparse : les documents antérieurs sans numéro ne bloquent pas l'index
+    return IndexSpec([(field, ASCENDING)], f"uniq_{field}", unique=True, sparse=True)
+
+
+INDEX_REGISTRY = {
+    "clients": [
+        unique_id("client_id"),
+        IndexSpec([("created_at", DESCENDING), ("client_id", DESCENDING)], "created_at_client_id_desc"),
+        IndexSpec([("devise", ASCENDING)], "devise"),
+        IndexSpec([("type_client", ASCENDING), ("created_at", DESCENDING)], "type_client_created_at"),
+        IndexSpec([("search_terms", ASCENDING)], "search_terms"),
+        sync_version(),
+    ],
+    "fournisseurs": [
+        unique_id("fournisseur_id"),
+        IndexSpec([("created_at", DESCENDING), ("fournisseur_id", DESCENDING)], "created_at_fournisseur_id_desc"),
+        sync_version(),
+    ],
+    "devis": [
+        unique_id("devis_id"),
+        unique_numero("numero_devis"),
+        IndexSpec([("created_at", DESCENDING), ("devis_id", DESCENDING)], "created_at_devis_id_desc"),
+        IndexSpec([("date_devis", DESCENDING)], "date_devis_desc"),
+        IndexSpec([("client_id", ASCENDING), ("created_at", DESCENDING)], "client_id_created_at"),
+        IndexSpec([("statut", ASCENDING), ("date_devis", DESCENDING)], "statut_date_devis"),
+        IndexSpec([("search_terms", ASCENDING)], "search_terms"),
+        sync_version(),
+    ],
+    "factures": [
+        unique_id("facture_id"),
+        unique_numero("numero_facture"),
+        IndexSpec([("created_at", DESCENDING), ("facture_id", DESCENDING)], "created_at_facture_id_desc"),
+        IndexSpec([("date_facture", DESCENDING)], "date_facture_desc"),
+        IndexSpec([("client_id", ASCENDING), ("created_at", DESCENDING)], "client_id_created_at"),
+        IndexSpec([("statut_paiement", ASCENDING), ("date_facture", DESCENDING)], "statut_paiement_date_facture"),
+        IndexSpec([("total_ttc", ASCENDING)], "total_ttc"),
+        IndexSpec([("devis_id", ASCENDING)], "devis_id", sparse=True),
+        IndexSpec([("search_terms", ASCENDING)], "search_terms"),
+        sync_version(),
+    ],
+    "achats": [
+        unique_id("achat_id"),
+        unique_numero("numero_bon_commande"),
+        IndexSpec([("created_at", DESCENDING), ("achat_id", DESCENDING)], "created_at_achat_id_desc"),
+        IndexSpec([("date_commande", DESCENDING)], "date_commande_desc"),
+        IndexSpec([("fournisseur_id", ASCENDING), ("date_commande", DESCENDING)], "fournisseur_id_date_commande"),
+        IndexSpec([("statut", ASCENDING), ("date_commande", DESCENDING)], "statut_date_commande"),
+        sync_version(),
+    ],
+    "stock": [
+        unique_id("article_id"),
+        IndexSpec([("ref", ASCENDING)], "ref"),
+        IndexSpec([("created_at", DESCENDING), ("article_id", DESCENDING)], "created_at_article_id_desc"),
+        IndexSpec([("search_terms", ASCENDING)], "search_terms"),
+        # Seuls les articles en alerte sont indexés : la liste des alertes ne lit qu'eux
+        IndexSpec([("en_alerte", ASCENDING), ("created_at", DESCENDING)], "en_alerte_true",
+                  partial_filter={"en_alerte": True}),
+        sync_version(),
+    ],
+    "mouvements_stock": [
+        unique_id("mouvement_id"),
+        # Historique par article, paginé par curseur (created_at + mouvement_id)
+        IndexSpec([("article_id", ASCENDING), ("created_at", DESCENDING), ("mouvement_id", DESCENDING)],
+                  "article_id_created_at_mouvement_id"),
+        IndexSpec([("document_type", ASCENDING), ("document_id", ASCENDING)], "document_type_document_id"),
+        # Une ligne de facture / bon de commande ne produit qu'un mouvement
+        IndexSpec([("cle_ligne", ASCENDING)], "cle_ligne", unique=True, sparse=True),
+    ],
+    "paiements": [
+        unique_id("paiement_id"),
+        IndexSpec([("created_at", DESCENDING), ("paiement_id", DESCENDING)], "created_at_paiement_id_desc"),
+        IndexSpec([("date_paiement", DESCENDING)], "date_paiement_desc"),
+        IndexSpec([("type_document", ASCENDING), ("document_id", ASCENDING)], "type_document_document_id"),
+        IndexSpec([("client_id", ASCENDING), ("date_paiement", DESCENDING)], "client_id_date_paiement"),
+        IndexSpec([("reference_paiement", ASCENDING)], "reference_paiement", sparse=True),
+        # Références bancaires des imports de relevés : un même relevé n'est importé qu'une fois
+        IndexSpec([("reference_bancaire", ASCENDING)], "reference_bancaire", unique=True, sparse=True),
+        sync_version(),
+    ],
+    "users": [
+        unique_id("user_id"),
+        unique_id("username"),
+    ],
+    "tombstones": [
+        IndexSpec([("version", ASCENDING)], "version"),
+        # Dernière suppression d'une collection (ETag des listes, http_cache.collection_version)
+        IndexSpec([("collection", ASCENDING), ("version", DESCENDING)], "collection_version_desc"),
+        # Les pierres tombales ne servent qu'aux clients synchronisés récemment
+        IndexSpec([("deleted_at", ASCENDING)], "deleted_at_ttl", expire_after=SYNC_TOMBSTONE_TTL_DAYS * 86400),
+    ],
+}
+
+
+async def ensure_indexes() -> dict:
+    """Create every declared index that does not exist yet (idempotent)"""
+    summary = {"created": [], "failed": []}
+
+    for collection_name, specs in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        for spec in specs:
+            if spec.name in existing:
+                continue
+            try:
+                await collection.create_indexes([spec.to_model()])
+                summary["created"].append(f"{collection_name}.{spec.name}")
+            except OperationFailure as e:
+                # Ex : doublons existants sur un index unique - on n'empêche pas le démarrage
+                logger.error(f"Index {collection_name}.{spec.name} could not be created: {e}")
+                summary["failed"].append({"index": f"{collection_name}.{spec.name}", "error": str(e)})
+
+    if summary["created"]:
+        logger.info(f"Created {len(summary['created'])} MongoDB indexes: {', '.join(summary['created'])}")
+    return summary
+
+
+async def _index_usage(collection) -> Optional[dict]:
+    """Number of operations served by each index since the last mongod restart"""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+    except Exception as e:
+        logger.warning(f"$indexStats unavailable on {collection.name}: {e}")
+        return None
+    return {s["name"]: s.get("accesses", {}).get("ops", 0) for s in stats}
+
+
+async def index_report() -> dict:
+    """Compare the registry with the indexes actually present in the database"""
+    report = {}
+
+    for collection_name, specs in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        usage = await _index_usage(collection)
+        declared_names = {spec.name for spec in specs}
+
+        report[collection_name] = {
+            "declared": [spec.to_dict() for spec in specs],
+            "missing": [spec.name for spec in specs if spec.name not in existing],
+            "undeclared": sorted(name for name in existing if name != "_id_" and name not in declared_names),
+            "unused": (
+                sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_")
+                if usage is not None else None
+            ),
+            "usage": usage,
+        }
+
+    return report
@@ -0,0 +1,15 @@
+"""
+Mesures de latence - ECO PUMP AFRIK
+
+Percentile partagé par les métriques du service PDF et par les benchmarks
+(performance_test.py), pour que les deux rapportent le même p95.
+"""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
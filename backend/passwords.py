@@ -0,0 +1,81 @@
+"""
+Hachage des mots de passe hors boucle d'événements - ECO PUMP AFRIK
+
+Les mots de passe sont hachés avec une fonction de dérivation de clé lente
+(passlib, PBKDF2-SHA256 par défaut ; bcrypt ou argon2 si leur backend est
+installé). Ce calcul coûte volontairement des dizaines de millisecondes de
+CPU : il est exécuté dans un pool de threads dédié (les implémentations
+relâchent le GIL), jamais dans la boucle d'événements. Le nombre de calculs
+en attente est borné : au-delà, la connexion est refusée immédiatement
+(HTTP 503 + Retry-After côté API).
+
+Les anciens hachages SHA-256 sans sel restent acceptés et sont remplacés
+par un hachage au coût courant lors de la connexion suivante ; il en va de
+même quand PASSWORD_HASH_ROUNDS est augmenté.
+"""
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_SCHEME = os.environ.get('PASSWORD_HASH_SCHEME', 'pbkdf2_sha256')
+# Vide : coût par défaut de passlib pour le schéma choisi
+PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS') or 0) or None
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 2))))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 16)))
+
+# Hachage historique : sha256(password).hexdigest()
+LEGACY_SCHEME = "hex_sha256"
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes in flight, the caller should retry later"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__(f"Password hashing is saturated, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, scheme: str = PASSWORD_HASH_SCHEME, rounds: Optional[int] = PASSWORD_HASH_ROUNDS,
+                 workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        cost = {f"{scheme}__default_rounds": rounds, f"{scheme}__min_rounds": rounds} if rounds else {}
+        self.context = CryptContext(schemes=[scheme, LEGACY_SCHEME], deprecated=[LEGACY_SCHEME], **cost)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._pending = 0
+
+    async def _run(self, function, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    def _verify(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        if not hashed:
+            # Utilisateur inconnu : même coût qu'une vérification réelle
+            self.context.dummy_verify()
+            return False, None
+        try:
+            return self.context.verify_and_update(password, hashed)
+        except ValueError:
+            logger.warning("Unrecognized password hash format")
+            return False, None
+
+    async def verify(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash to store or None) - the new hash replaces a legacy or weaker one"""
+        return await self._run(self._verify, password, hashed)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,355 @@
+"""
+Application atomique des paiements - ECO PUMP AFRIK
+
+Un paiement augmente le montant payé de sa facture (ou de son bon de
+commande fournisseur) par une seule mise à jour conditionnelle : l'addition
+et le nouveau statut de paiement sont calculés par MongoDB (pipeline de mise
+à jour) au lieu d'être lus puis réécrits par le handler. Deux paiements
+simultanés sur la même facture sont ainsi tous les deux comptés.
+
+L'insertion du paiement et la mise à jour du document sont faites dans une
+transaction lorsque le déploiement MongoDB le permet (replica set). Sinon,
+si l'insertion échoue, la mise à jour est annulée par la mise à jour inverse.
+
+Les relevés bancaires et mobile money sont importés par lots : les lignes
+sont rapprochées des factures (numero_facture, ou reference_paiement égale
+à un numéro de facture) en une requête, les références déjà importées et
+les lignes dans une autre devise que la facture sont écartées, puis
+paiements et factures sont écrits par bulk_write par paquets de
+PAYMENT_IMPORT_CHUNK_SIZE lignes.
+
+Seule une vraie référence bancaire sert à détecter les doublons : quand la
+référence est le numéro de la facture payée (paiements échelonnés), elle
+n'identifie pas la transaction. Les références bancaires importées sont
+enregistrées dans `reference_bancaire` (index unique) : deux imports
+simultanés du même relevé ne peuvent pas l'enregistrer deux fois.
+"""
+import io
+import os
+import csv
+import uuid
+import logging
+from datetime import date, datetime
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from database import (factures_repo, achats_repo, paiements_repo, run_in_transaction,
+                      VersionedInsert, VersionedUpdate)
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_IMPORT_CHUNK_SIZE = int(os.environ.get('PAYMENT_IMPORT_CHUNK_SIZE', '500'))
+PAYMENT_IMPORT_MAX_LINES = int(os.environ.get('PAYMENT_IMPORT_MAX_LINES', '50000'))
+DEFAULT_IMPORT_MODE = "virement"
+DUPLICATE_KEY_ERROR = 11000
+
+# type_document -> (repository, champ identifiant)
+PAYMENT_TARGETS = {
+    "facture": (factures_repo, "facture_id"),
+    "achat": (achats_repo, "achat_id"),
+}
+
+
+class DocumentNotFound(Exception):
+    """The invoice or purchase order a payment refers to does not exist"""
+
+    def __init__(self, type_document: str, document_id: str):
+        super().__init__(f"{type_document} {document_id} not found")
+        self.type_document = type_document
+        self.document_id = document_id
+
+
+def payment_update(montant: float, moment: Optional[datetime] = None) -> list:
+    """Update pipeline adding `montant` to montant_paye and recomputing statut_paiement"""
+    return [
+        {"$set": {
+            "montant_paye": {"$add": [{"$ifNull": ["$montant_paye", 0]}, montant]},
+            "updated_at": (moment or datetime.now()).isoformat(),
+        }},
+        {"$set": {
+            "statut_paiement": {"$switch": {
+                "branches": [
+                    {"case": {"$gte": ["$montant_paye", "$total_ttc"]}, "then": "payé"},
+                    {"case": {"$gt": ["$montant_paye", 0]}, "then": "partiel"},
+                ],
+                "default": "impayé",
+            }},
+        }},
+    ]
+
+
+def reduced_due(previous: dict, montant: float) -> float:
+    """Part of a payment that reduced what was still due (dashboard montant_a_encaisser)"""
+    total = previous["total_ttc"]
+    paye = previous.get("montant_paye", 0)
+    reste_avant = total - paye if previous.get("statut_paiement") in ["impayé", "partiel"] else 0
+    reste_apres = max(total - (paye + montant), 0)
+    return reste_avant - reste_apres
+
+
+async def record_payment(paiement_data: dict) -> Optional[dict]:
+    """Insert a payment and apply it to its document
+
+    Returns the invoice / purchase order as it was before the payment (None
+    for a type_document without a target document).
+    """
+    target = PAYMENT_TARGETS.get(paiement_data["type_document"])
+    montant = paiement_data["montant"]
+
+    async def apply(session):
+        previous = None
+        if target:
+            repo, id_field = target
+            previous = await repo.find_one_and_update(
+                {id_field: paiement_data["document_id"]},
+                payment_update(montant),
+                session=session,
+            )
+            if previous is None:
+                raise DocumentNotFound(paiement_data["type_document"], paiement_data["document_id"])
+        try:
+            await paiements_repo.insert_one(paiement_data, session=session)
+        except Exception:
+            if session is None and previous is not None:
+                # Pas de transaction : on retire le montant déjà appliqué
+                await repo.update_one({id_field: paiement_data["document_id"]}, payment_update(-montant))
+            raise
+        return previous
+
+    return await run_in_transaction(apply)
+
+
+class InvalidImport(Exception):
+    """The import file cannot be read as a list of payment lines"""
+
+
+def parse_csv(content: bytes) -> List[dict]:
+    """Statement lines of a CSV export (',' or ';' separated, UTF-8 or Latin-1)"""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = content.decode("latin-1")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    if not reader.fieldnames:
+        raise InvalidImport("Fichier CSV vide")
+    return [{(key or "").strip().lower(): (value or "").strip() for key, value in row.items()} for row in reader]
+
+
+def parse_amount(value) -> float:
+    """Amount of a statement line: 1234.5, "1 234,50", "1234,5" """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").replace("\u00a0", "").replace("\u202f", "").replace(" ", "")
+    if "," in text and "." not in text:
+        text = text.replace(",", ".")
+    return float(text.replace(",", ""))
+
+
+def _line_report(number: int, line: dict, statut: str, message: str = None, **extra) -> dict:
+    return {
+        "ligne": number,
+        "numero_facture": line.get("numero_facture") or None,
+        "reference_paiement": line.get("reference_paiement") or None,
+        "statut": statut,
+        "message": message,
+        **extra,
+    }
+
+
+def _write_errors(error: BulkWriteError) -> dict:
+    """Index -> error code of the failed operations of a bulk write"""
+    return {write_error["index"]: write_error.get("code") for write_error in error.details.get("writeErrors", [])}
+
+
+async def _write_chunk(chunk: List[tuple], moment: datetime) -> dict:
+    """Insert the payments of a chunk and apply them to their invoices
+
+    Returns paiement_id -> statut ("doublon" or "échec") of the payments
+    that were not imported.
+    """
+    rejected = {}
+    pending = list(chunk)
+
+    async def write(session):
+        inserted = pending
+        try:
+            await paiements_repo.bulk_write([VersionedInsert(paiement) for paiement, _ in pending],
+                                            ordered=False, session=session)
+        except BulkWriteError as error:
+            if session is not None:
+                raise  # transaction annulée : le paquet est repris sans les doublons
+            errors = _write_errors(error)
+            for index, code in errors.items():
+                rejected[pending[index][0]["paiement_id"]] = "doublon" if code == DUPLICATE_KEY_ERROR else "échec"
+            inserted = [item for index, item in enumerate(pending) if index not in errors]
+        if not inserted:
+            return
+        try:
+            await factures_repo.bulk_write([
+                VersionedUpdate({"facture_id": paiement["document_id"]}, payment_update(paiement["montant"], moment))
+                for paiement, _ in inserted
+            ], ordered=True, session=session)
+        except Exception as error:
+            if session is not None:
+                raise
+            # Pas de transaction : les paiements non appliqués à leur facture sont retirés
+            # (bulk_write ordonné : les mises à jour avant la première erreur sont appliquées)
+            applied = min(_write_errors(error), default=0) if isinstance(error, BulkWriteError) else 0
+            logger.error(f"Payment import: invoice update failed after {applied} of {len(inserted)} payments: {error}")
+            for paiement, _ in inserted[applied:]:
+                await paiements_repo.delete_one({"paiement_id": paiement["paiement_id"]})
+                rejected[paiement["paiement_id"]] = "échec"
+
+    while pending:
+        try:
+            await run_in_transaction(write)
+            return rejected
+        except BulkWriteError as error:
+            # Import concurrent du même relevé : ses références sont maintenant enregistrées
+            if DUPLICATE_KEY_ERROR not in _write_errors(error).values():
+                raise
+            existing = {
+                paiement["reference_bancaire"]
+                for paiement in await paiements_repo.find_many(
+                    {"reference_bancaire": {"$in": [p["reference_bancaire"] for p, _ in pending
+                                                    if p.get("reference_bancaire")]}},
+                    {"_id": 0, "reference_bancaire": 1},
+                )
+            }
+            if not existing:
+                raise
+            for paiement, _ in pending:
+                if paiement.get("reference_bancaire") in existing:
+                    rejected[paiement["paiement_id"]] = "doublon"
+            pending = [item for item in pending if item[0].get("reference_bancaire") not in existing]
+    return rejected
+
+
+async def import_payments(lines: List[dict], dry_run: bool = False) -> dict:
+    """Match statement lines to invoices and apply them in bulk; one report entry per line"""
+    if len(lines) > PAYMENT_IMPORT_MAX_LINES:
+        raise InvalidImport(f"Trop de lignes ({len(lines)}), maximum {PAYMENT_IMPORT_MAX_LINES}")
+
+    numeros = set()
+    references = set()
+    for line in lines:
+        for key in ("numero_facture", "reference_paiement", "devise"):
+            if line.get(key):
+                line[key] = str(line[key]).strip()
+        if line.get("numero_facture"):
+            numeros.add(line["numero_facture"])
+        if line.get("reference_paiement"):
+            references.add(line["reference_paiement"])
+            numeros.add(line["reference_paiement"])
+
+    # Deux requêtes pour tout le lot : factures candidates et références déjà importées
+    factures = {
+        facture["numero_facture"]: facture
+        for facture in await factures_repo.find_many(
+            {"numero_facture": {"$in": list(numeros)}},
+            {"_id": 0, "facture_id": 1, "numero_facture": 1, "client_id": 1, "devise": 1,
+             "total_ttc": 1, "montant_paye": 1, "statut_paiement": 1},
+        )
+    }
+    # Une référence égale à un numéro de facture n'identifie pas le paiement
+    references -= factures.keys()
+    already_imported = {
+        paiement["reference_paiement"]
+        for paiement in await paiements_repo.find_many(
+            {"reference_paiement": {"$in": list(references)}},
+            {"_id": 0, "reference_paiement": 1},
+        )
+    }
+
+    import_id = str(uuid.uuid4())
+    current_time = datetime.now()
+    report = []
+    accepted = []  # (document paiement, facture)
+    seen_references = set()
+    for number, line in enumerate(lines, start=1):
+        reference = line.get("reference_paiement")
+        facture = factures.get(line.get("numero_facture") or reference)
+        bank_reference = reference if reference in references else None
+        try:
+            montant = parse_amount(line.get("montant"))
+        except (TypeError, ValueError):
+            report.append(_line_report(number, line, "invalide", "Montant illisible"))
+            continue
+        if montant <= 0:
+            report.append(_line_report(number, line, "invalide", "Le montant doit être positif"))
+        elif facture is None:
+            report.append(_line_report(number, line, "facture_introuvable", "Aucune facture ne correspond"))
+        elif line.get("devise") and line["devise"].upper() != facture.get("devise", "FCFA").upper():
+            # Pas de conversion : un montant en EUR n'est pas ajouté au montant payé d'une facture en FCFA
+            report.append(_line_report(number, line, "devise_differente",
+                                       f"Devise {line['devise']} différente de celle de la facture "
+                                       f"({facture.get('devise', 'FCFA')})", facture_id=facture["facture_id"]))
+        elif bank_reference and (bank_reference in already_imported or bank_reference in seen_references):
+            report.append(_line_report(number, line, "doublon", "Référence de paiement déjà importée"))
+        else:
+            if bank_reference:
+                seen_references.add(bank_reference)
+            paiement = {
+                "paiement_id": str(uuid.uuid4()),
+                "type_document": "facture",
+                "document_id": facture["facture_id"],
+                "client_id": facture.get("client_id"),
+                "fournisseur_id": None,
+                "montant": montant,
+                "devise": facture.get("devise", "FCFA"),
+                "mode_paiement": line.get("mode_paiement") or DEFAULT_IMPORT_MODE,
+                "reference_paiement": reference,
+                "date_paiement": line.get("date_paiement") or date.today().isoformat(),
+                "statut": "validé",
+                "import_id": import_id,
+                "created_at": current_time.isoformat(),
+                "created_at_formatted": current_time.strftime("%d/%m/%Y à %H:%M:%S"),
+                "updated_at": current_time.isoformat(),
+                "updated_at_formatted": current_time.strftime("%d/%m/%Y à %H:%M:%S"),
+            }
+            if bank_reference:
+                paiement["reference_bancaire"] = bank_reference
+            accepted.append((paiement, facture))
+            report.append(_line_report(number, line, "importé" if not dry_run else "rapproché",
+                                       facture_id=facture["facture_id"], montant=montant,
+                                       paiement_id=paiement["paiement_id"]))
+
+    if not dry_run:
+        rejected = {}
+        for start in range(0, len(accepted), PAYMENT_IMPORT_CHUNK_SIZE):
+            rejected.update(await _write_chunk(accepted[start:start + PAYMENT_IMPORT_CHUNK_SIZE], current_time))
+        if rejected:
+            for entry in report:
+                statut = rejected.get(entry.get("paiement_id"))
+                if statut:
+                    message = ("Référence de paiement déjà importée" if statut == "doublon"
+                               else "Écriture du paiement impossible")
+                    entry.update(statut=statut, message=message, paiement_id=None)
+            accepted = [(paiement, facture) for paiement, facture in accepted
+                        if paiement["paiement_id"] not in rejected]
+
+    # Part de chaque paiement qui réduit le reste à encaisser, facture par facture dans l'ordre du lot
+    encaissement = 0.0
+    for paiement, facture in accepted:
+        encaissement += reduced_due(facture, paiement["montant"])
+        facture["montant_paye"] = facture.get("montant_paye", 0) + paiement["montant"]
+        facture["statut_paiement"] = "payé" if facture["montant_paye"] >= facture["total_ttc"] else "partiel"
+
+    counts = {}
+    for entry in report:
+        counts[entry["statut"]] = counts.get(entry["statut"], 0) + 1
+
+    return {
+        "import_id": import_id,
+        "dry_run": dry_run,
+        "lignes": len(lines),
+        "resultats": counts,
+        "montant_importe": sum(paiement["montant"] for paiement, _ in accepted),
+        "encaissement": encaissement,
+        "rapport": report,
+    }
@@ -0,0 +1,145 @@
+"""
+Cache disque des PDF de documents (devis, factures, reçus) - ECO PUMP AFRIK
+
+Une facture émise ne change presque jamais : son PDF est rendu une fois puis
+servi depuis le disque. La clé est une empreinte du type, de l'identifiant,
+du `updated_at` du document et de la version des gabarits PDF ; toute
+modification du document (ou des gabarits) produit donc une nouvelle clé.
+L'empreinte sert aussi d'ETag HTTP.
+
+Un rendu périmé n'est jamais servi (sa clé n'est plus demandée) : il n'y a
+pas d'invalidation explicite, les anciens rendus vieillissent et sortent par
+l'éviction LRU (date de dernier accès des fichiers) au-delà de
+PDF_CACHE_MAX_BYTES. Le répertoire est partagé par les workers uvicorn ;
+le parcours du répertoire qui mesure sa taille n'a lieu qu'après
+PDF_CACHE_EVICT_EVERY_BYTES octets écrits par le worker, le dépassement est
+donc borné à ce seuil par worker. Les accès disque sont synchrones : les
+handlers les appellent via `run_in_threadpool`. Le répertoire est créé au
+démarrage (`open()`).
+"""
+import os
+import re
+import hashlib
+import logging
+import tempfile
+from typing import List, Optional
+
+from pdf_templates import TEMPLATE_VERSION
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), "ecopump_pdf_cache"))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+PDF_CACHE_EVICT_EVERY_BYTES = int(os.environ.get('PDF_CACHE_EVICT_EVERY_BYTES', str(PDF_CACHE_MAX_BYTES // 16)))
+
+
+def document_digest(doc_type: str, doc_id: str, *versions) -> str:
+    """Content address of a rendered document (also used as ETag)
+
+    `versions` are the values the rendering depends on, typically the
+    document's updated_at.
+    """
+    source = ":".join([doc_type, doc_id, *map(str, versions), TEMPLATE_VERSION])
+    return hashlib.sha256(source.encode()).hexdigest()[:32]
+
+
+def _safe(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", value)
+
+
+class PdfCache:
+    """Cache partagé par tous les workers : l'état est celui du répertoire, pas un index en mémoire"""
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES,
+                 evict_every_bytes: int = PDF_CACHE_EVICT_EVERY_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evict_every_bytes = evict_every_bytes
+        self.written_bytes = 0  # écrits par ce worker depuis la dernière éviction
+        self.hits = 0
+        self.misses = 0
+
+    def open(self):
+        """Create the cache directory and apply the size bound (called at startup)"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._evict()
+
+    def _path(self, doc_type: str, doc_id: str, digest: str) -> str:
+        return os.path.join(self.directory, f"{_safe(doc_type)}_{_safe(doc_id)}_{digest}.pdf")
+
+    def _files(self) -> List[tuple]:
+        """(mtime, path, size) of the cached PDFs, least recently used first"""
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # supprimé entre-temps par un autre worker
+            files.append((stat.st_mtime, entry.path, stat.st_size))
+        return sorted(files)
+
+    def get(self, doc_type: str, doc_id: str, digest: str) -> Optional[bytes]:
+        """Cached PDF content, or None (also when another worker removed the file meanwhile)"""
+        path = self._path(doc_type, doc_id, digest)
+        try:
+            with open(path, "rb") as pdf_file:
+                content = pdf_file.read()
+            os.utime(path)  # ordre LRU : date de dernière utilisation
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return content
+
+    def put(self, doc_type: str, doc_id: str, digest: str, content: bytes) -> str:
+        """Store a freshly rendered PDF and return its cached path"""
+        path = self._path(doc_type, doc_id, digest)
+        os.makedirs(self.directory, exist_ok=True)
+        # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+        partial_path = f"{path}.{os.getpid()}.part"
+        with open(partial_path, "wb") as pdf_file:
+            pdf_file.write(content)
+        os.replace(partial_path, path)
+        self.written_bytes += len(content)
+        if self.written_bytes >= self.evict_every_bytes:
+            self._evict(keep=path)
+        return path
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: Optional[str] = None):
+        """Remove the least recently used files until the directory fits in max_bytes"""
+        self.written_bytes = 0
+        files = self._files()
+        size = sum(file_size for _, _, file_size in files)
+        for _, path, file_size in files:
+            if size <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            size -= file_size
+            logger.debug(f"PDF cache evicted {path}")
+
+    def stats(self) -> dict:
+        files = self._files()
+        return {
+            "entries": len(files),
+            "size_bytes": sum(size for _, _, size in files),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+pdf_cache = PdfCache()
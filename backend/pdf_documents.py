@@ -0,0 +1,717 @@
+"""
+Rendu des documents PDF (ReportLab) - ECO PUMP AFRIK
+
+Fonctions pures : elles reçoivent des données déjà chargées (dicts MongoDB)
+et écrivent le PDF dans `output` (fichier binaire, ex : BytesIO). Elles
+n'accèdent jamais à la base, ce qui permet de les exécuter dans les
+processus du pool de rendu (voir pdf_service.py) sans bloquer la boucle
+d'événements de l'API.
+"""
+import logging
+from datetime import datetime
+
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+from reportlab.lib import colors
+
+from pdf_templates import EcoPumpDocTemplate, get_styles
+
+logger = logging.getLogger(__name__)
+
+
+def render_liste_factures_impayees(output, factures_impayees, date_debut, date_fin):
+    """Story of the unpaid invoices list"""
+    # En-tête (logo) et pied de page dessinés par le gabarit
+    doc = EcoPumpDocTemplate(output)
+    styles = get_styles("liste_factures_impayees")
+    story = []
+
+    period_text = ""
+    if date_debut and date_fin:
+        period_text = f" - Période: {date_debut} au {date_fin}"
+
+    story.append(Paragraph(f"LISTE DES FACTURES IMPAYÉES{period_text}", styles['title']))
+    story.append(Spacer(1, 20))
+
+    # Summary
+    total_impaye = sum(f.get('total_ttc', 0) - f.get('montant_paye', 0) for f in factures_impayees)
+
+    summary_data = [
+        ["Nombre de factures impayées", str(len(factures_impayees))],
+        ["Montant total à encaisser", f"{total_impaye:,.0f} F CFA"],
+        ["Date de génération", datetime.now().strftime("%d/%m/%Y à %H:%M:%S")]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[200, 280])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#ffe6e6')),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#dc3545')),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('PADDING', (0, 0), (-1, -1), 10),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ]))
+
+    story.append(summary_table)
+    story.append(Spacer(1, 25))
+
+    # Detailed list
+    if factures_impayees:
+        facture_data = [["N° Facture", "Client", "Date", "Total TTC", "Payé", "Reste à payer", "Retard"]]
+
+        for f in factures_impayees:
+            date_facture = datetime.fromisoformat(f.get('date_facture', ''))
+            jours_retard = (datetime.now().date() - date_facture.date()).days
+
+            # Truncate long client names
+            client_nom = f.get('client_nom', '')
+            if len(client_nom) > 25:
+                client_nom = client_nom[:25] + "..."
+
+            facture_data.append([
+                f.get('numero_facture', '')[:18],
+                client_nom,
+                f.get('date_facture', '')[:10],
+                f"{f.get('total_ttc', 0):,.0f}",
+                f"{f.get('montant_paye', 0):,.0f}",
+                f"{f.get('total_ttc', 0) - f.get('montant_paye', 0):,.0f}",
+                f"{jours_retard}j" if jours_retard > 30 else f"{jours_retard}j"
+            ])
+
+        detail_table = Table(facture_data, colWidths=[85, 120, 55, 60, 60, 70, 30])
+        detail_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc3545')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
+            ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),  # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        story.append(detail_table)
+    else:
+        story.append(Paragraph("✅ Aucune facture impayée pour la période sélectionnée", styles['body']))
+
+    doc.build(story)
+
+
+def render_liste_factures(output, factures_liste, date_debut, date_fin):
+    """Story of the invoices list"""
+    # En-tête (logo) et pied de page dessinés par le gabarit
+    doc = EcoPumpDocTemplate(output)
+    styles = get_styles("liste_factures")
+    story = []
+
+    period_text = ""
+    if date_debut and date_fin:
+        period_text = f" - Période: {date_debut} au {date_fin}"
+
+    story.append(Paragraph(f"LISTE DES FACTURES{period_text}", styles['title']))
+    story.append(Spacer(1, 20))
+
+    # Summary
+    total_factures = sum(f.get('total_ttc', 0) for f in factures_liste)
+    total_paye = sum(f.get('montant_paye', 0) for f in factures_liste)
+    nb_payees = len([f for f in factures_liste if f.get('statut_paiement') == 'payé'])
+
+    summary_data = [
+        ["Nombre total de factures", str(len(factures_liste))],
+        ["Factures payées", f"{nb_payees} ({nb_payees/len(factures_liste)*100:.1f}%)" if factures_liste else "0"],
+        ["Chiffre d'affaires total", f"{total_factures:,.0f} F CFA"],
+        ["Montant encaissé", f"{total_paye:,.0f} F CFA"],
+        ["Reste à encaisser", f"{total_factures - total_paye:,.0f} F CFA"]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[200, 280])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#e6f3ff')),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#0066cc')),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('PADDING', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ]))
+
+    story.append(summary_table)
+    story.append(Spacer(1, 25))
+
+    # Detailed list
+    if factures_liste:
+        facture_data = [["N° Facture", "Client", "Date", "Total TTC", "Statut", "Devise"]]
+
+        for f in factures_liste:
+            # Truncate long client names
+            client_nom = f.get('client_nom', '')
+            if len(client_nom) > 30:
+                client_nom = client_nom[:30] + "..."
+
+            statut_color = "✅" if f.get('statut_paiement') == 'payé' else "❌"
+
+            facture_data.append([
+                f.get('numero_facture', '')[:20],
+                client_nom,
+                f.get('date_facture', '')[:10],
+                f"{f.get('total_ttc', 0):,.0f}",
+                f"{statut_color} {f.get('statut_paiement', '')}",
+                f.get('devise', '')
+            ])
+
+        detail_table = Table(facture_data, colWidths=[90, 150, 55, 70, 80, 35])
+        detail_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),  # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        story.append(detail_table)
+    else:
+        story.append(Paragraph("Aucune facture trouvée pour la période sélectionnée", styles['body']))
+
+    doc.build(story)
+
+
+def render_liste_devis(output, devis_liste, date_debut, date_fin):
+    """Story of the quotes list"""
+    # En-tête (logo) et pied de page dessinés par le gabarit
+    doc = EcoPumpDocTemplate(output)
+    styles = get_styles("liste_devis")
+    story = []
+
+    period_text = ""
+    if date_debut and date_fin:
+        period_text = f" - Période: {date_debut} au {date_fin}"
+
+    story.append(Paragraph(f"LISTE DES DEVIS{period_text}", styles['title']))
+    story.append(Spacer(1, 20))
+
+    # Summary
+    total_devis = sum(d.get('total_ttc', 0) for d in devis_liste)
+    nb_acceptes = len([d for d in devis_liste if d.get('statut') == 'accepté'])
+    nb_refuses = len([d for d in devis_liste if d.get('statut') == 'refusé'])
+
+    summary_data = [
+        ["Nombre total de devis", str(len(devis_liste))],
+        ["Devis acceptés", f"{nb_acceptes} ({nb_acceptes/len(devis_liste)*100:.1f}%)" if devis_liste else "0"],
+        ["Devis refusés", f"{nb_refuses} ({nb_refuses/len(devis_liste)*100:.1f}%)" if devis_liste else "0"],
+        ["Valeur totale des devis", f"{total_devis:,.0f} F CFA"],
+        ["Taux de conversion", f"{nb_acceptes/len(devis_liste)*100:.1f}%" if devis_liste else "0%"]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[200, 280])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#e6ffe6')),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#28a745')),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('PADDING', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ]))
+
+    story.append(summary_table)
+    story.append(Spacer(1, 25))
+
+    # Detailed list
+    if devis_liste:
+        devis_data = [["N° Devis", "Client", "Date", "Total TTC", "Statut", "Devise"]]
+
+        for d in devis_liste:
+            # Truncate long client names
+            client_nom = d.get('client_nom', '')
+            if len(client_nom) > 30:
+                client_nom = client_nom[:30] + "..."
+
+            statut_icon = {"accepté": "✅", "refusé": "❌", "en_attente": "⏳"}.get(d.get('statut', ''), "❓")
+
+            devis_data.append([
+                d.get('numero_devis', '')[:20],
+                client_nom,
+                d.get('date_devis', '')[:10],
+                f"{d.get('total_ttc', 0):,.0f}",
+                f"{statut_icon} {d.get('statut', '')}",
+                d.get('devise', '')
+            ])
+
+        detail_table = Table(devis_data, colWidths=[90, 150, 55, 70, 80, 35])
+        detail_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),  # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        story.append(detail_table)
+    else:
+        story.append(Paragraph("Aucun devis trouvé pour la période sélectionnée", styles['body']))
+
+    doc.build(story)
+
+
+def render_document(output, doc_type, document, doc_title, doc_number, doc_date, client_nom=None):
+    """Story of a devis, facture or payment receipt"""
+    # En-tête, bandeau de contact et pied de page (mentions légales) dessinés par le gabarit
+    doc = EcoPumpDocTemplate(output, contact_bar=True, legal_mentions=True)
+    styles = get_styles("document")
+    story = []
+    story.append(Spacer(1, 20))
+
+    # Document title
+    story.append(Paragraph(f"{doc_title} - {doc_number}", styles['title']))
+
+    # Date du document (pas d'heure de génération : le rendu est mis en cache)
+    story.append(Paragraph(f"Date: {doc_date}", styles['body']))
+    story.append(Spacer(1, 20))
+
+    if doc_type in ["devis", "facture"]:
+        # Client info
+        story.append(Paragraph(f"<b>Client:</b> {document['client_nom']}", styles['body']))
+        if document.get('reference_commande'):
+            story.append(Paragraph(f"<b>Référence commande:</b> {document['reference_commande']}", styles['body']))
+        story.append(Spacer(1, 15))
+
+        # Articles table with proper column widths
+        article_data = [["Item", "Réf", "Désignation", "Qté", "P.U.", "Total"]]
+        for article in document.get('articles', []):
+            # Truncate long designations to fit in column
+            designation = article['designation']
+            if len(designation) > 25:
+                designation = designation[:25] + "..."
+
+            article_data.append([
+                str(article['item']),
+                article.get('ref', '')[:8] if article.get('ref') else '',  # Limit ref to 8 chars
+                designation,
+                str(article['quantite']),
+                f"{article['prix_unitaire']:,.0f}",
+                f"{article['total']:,.0f}"
+            ])
+
+        # Define column widths to prevent overflow (total width = 480)
+        table = Table(article_data, colWidths=[30, 50, 180, 40, 80, 100])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'LEFT'),  # Left align designation
+            ('ALIGN', (4, 1), (-1, -1), 'RIGHT'), # Right align prices
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('WORDWRAP', (2, 1), (2, -1), 1)  # Enable word wrap for designation
+        ]))
+        story.append(table)
+        story.append(Spacer(1, 20))
+
+        # Totals with color coding
+        story.append(Paragraph(f"<b>Sous-total:</b> {document['sous_total']:,.2f} {document['devise']}", styles['body']))
+        story.append(Paragraph(f"<b>TVA (18%):</b> {document['tva']:,.2f} {document['devise']}", styles['body']))
+
+        # Total with color based on payment status
+        if doc_type == "facture":
+            statut_paiement = document.get('statut_paiement', 'impayé')
+            if statut_paiement == 'payé':
+                total_color = '#28a745'  # Green for paid
+                total_text = f"<b><font color='{total_color}'>TOTAL TTC (PAYÉ):</font></b> <font color='{total_color}'>{document['total_ttc']:,.2f} {document['devise']}</font>"
+            else:
+                total_color = '#dc3545'  # Red for unpaid
+                total_text = f"<b><font color='{total_color}'>TOTAL TTC (À PAYER):</font></b> <font color='{total_color}'>{document['total_ttc']:,.2f} {document['devise']}</font>"
+        else:
+            # For devis, use normal blue color
+            total_color = '#0066cc'
+            total_text = f"<b><font color='{total_color}'>TOTAL TTC:</font></b> <font color='{total_color}'>{document['total_ttc']:,.2f} {document['devise']}</font>"
+
+        story.append(Paragraph(total_text, styles['heading2']))
+        story.append(Spacer(1, 15))
+
+        # Terms and conditions
+        if document.get('delai_livraison'):
+            story.append(Paragraph(f"<b>Délai de livraison:</b> {document['delai_livraison']}", styles['body']))
+        if document.get('conditions_paiement'):
+            story.append(Paragraph(f"<b>Conditions de paiement:</b> {document['conditions_paiement']}", styles['body']))
+        if document.get('mode_livraison'):
+            story.append(Paragraph(f"<b>Mode de livraison:</b> {document['mode_livraison']}", styles['body']))
+        if document.get('commentaires'):
+            story.append(Spacer(1, 15))
+
+            # Create a bordered box for comments
+            comment_table = Table([[f"💬 COMMENTAIRES:\n{document['commentaires']}"]], colWidths=[460])
+            comment_table.setStyle(TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 11),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2c5530')),
+                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fff8')),
+                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#28a745')),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('TOPPADDING', (0, 0), (-1, -1), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+                ('LEFTPADDING', (0, 0), (-1, -1), 15),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 15),
+            ]))
+            story.append(comment_table)
+
+    else:  # paiement
+        story.append(Paragraph(f"<b>Montant:</b> {document['montant']:,.2f} {document['devise']}", styles['heading2']))
+        story.append(Paragraph(f"<b>Mode de paiement:</b> {document['mode_paiement']}", styles['body']))
+        if document.get('reference_paiement'):
+            story.append(Paragraph(f"<b>Référence:</b> {document['reference_paiement']}", styles['body']))
+        if client_nom:
+            story.append(Paragraph(f"<b>Client:</b> {client_nom}", styles['body']))
+
+    doc.build(story)
+
+
+def render_report(output, report_type, date_debut, date_fin, data):
+    """Story of a financial report, `data` comes from reports.load_report_data"""
+    # En-tête, bandeau de contact et pied de page (mentions légales) dessinés par le gabarit
+    doc = EcoPumpDocTemplate(output, contact_bar=True, legal_mentions=True)
+    styles = get_styles("report")
+    story = []
+    story.append(Spacer(1, 15))
+
+    if report_type == "journal_ventes":
+        period_text = ""
+        if date_debut and date_fin:
+            period_text = f" - Période: {date_debut} au {date_fin}"
+
+        story.append(Paragraph(f"JOURNAL DES VENTES{period_text}", styles['title']))
+        story.append(Spacer(1, 20))
+
+        # Sales summary table
+        totaux = data["totaux"]
+        summary_data = [
+            ["Indicateur", "Valeur"],
+            ["Nombre de factures", str(totaux["nombre"])],
+            ["Chiffre d'affaires", f"{totaux['total_ttc']:,.2f} F CFA"],
+            ["TVA collectée", f"{totaux['tva']:,.2f} F CFA"],
+            ["Factures impayées", str(totaux["impayees"])],
+        ]
+
+        table = Table(summary_data)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(table)
+        story.append(Spacer(1, 20))
+
+        # Detailed factures table with fixed column widths
+        story.append(Paragraph("Détail des Factures", styles['heading2']))
+        facture_data = [["N° Facture", "Client", "Date", "Montant", "Statut"]]
+        for f in data["factures"]:  # 15 most recent invoices
+            # Truncate long client names
+            client_nom = f.get('client_nom', '')
+            if len(client_nom) > 20:
+                client_nom = client_nom[:20] + "..."
+
+            facture_data.append([
+                f.get('numero_facture', '')[:15],  # Limit invoice number
+                client_nom,
+                f.get('date_facture', '')[:10],  # Date only, no time
+                f"{f.get('total_ttc', 0):,.0f} {f.get('devise', 'FCFA')}",
+                f.get('statut_paiement', '')
+            ])
+
+        detail_table = Table(facture_data, colWidths=[80, 120, 60, 80, 60])
+        detail_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'), # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(detail_table)
+
+    elif report_type == "balance_clients":
+        story.append(Paragraph("BALANCE CLIENTS", styles['title']))
+        story.append(Spacer(1, 20))
+
+        # Client balance table with strictly controlled column widths
+        balance_data = [["Client", "Type", "Dev", "Fact", "Facturé", "Payé", "Solde"]]
+        for row in data["clients"]:
+            # Truncate long client names to fit
+            client_nom = row.get('nom', '')
+            if len(client_nom) > 18:
+                client_nom = client_nom[:18] + "..."
+
+            balance_data.append([
+                client_nom,
+                row.get('type_client', '')[:4],  # Truncate type
+                row.get('devise', '')[:4],
+                str(row['nombre_factures']),
+                f"{row['total_facture']:,.0f}",
+                f"{row['total_paye']:,.0f}",
+                f"{row['solde']:,.0f}"
+            ])
+
+        # Very strict column widths (total = 480)
+        balance_table = Table(balance_data, colWidths=[90, 30, 25, 25, 70, 70, 70], repeatRows=1)
+        balance_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # Left align client names
+            ('ALIGN', (4, 1), (-1, -1), 'RIGHT'), # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),  # Smaller header font
+            ('FONTSIZE', (0, 1), (-1, -1), 7),  # Smaller content font
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+        ]))
+        story.append(balance_table)
+        story.append(Spacer(1, 20))
+
+        # Subtotals per currency with the ageing of outstanding amounts
+        story.append(Paragraph(f"Sous-totaux par devise - ancienneté au {data['date_reference']}", styles['heading2']))
+        subtotal_data = [["Devise", "Clients", "Facturé", "Payé", "Solde", "0-30 j", "31-60 j", "61-90 j", "+90 j"]]
+        for devise, totals in data["sous_totaux"].items():
+            anciennete = totals["anciennete"]
+            subtotal_data.append([
+                devise,
+                str(totals["clients"]),
+                f"{totals['total_facture']:,.0f}",
+                f"{totals['total_paye']:,.0f}",
+                f"{totals['solde']:,.0f}",
+                f"{anciennete['0_30']:,.0f}",
+                f"{anciennete['31_60']:,.0f}",
+                f"{anciennete['61_90']:,.0f}",
+                f"{anciennete['plus_90']:,.0f}"
+            ])
+
+        subtotal_table = Table(subtotal_data, colWidths=[35, 35, 65, 65, 65, 55, 55, 55, 50])
+        subtotal_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),  # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('TOPPADDING', (0, 0), (-1, -1), 3),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#e6f3ff')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+        ]))
+        story.append(subtotal_table)
+
+    elif report_type == "journal_achats":
+        period_text = ""
+        if date_debut and date_fin:
+            period_text = f" - Période: {date_debut} au {date_fin}"
+
+        story.append(Paragraph(f"JOURNAL DES ACHATS{period_text}", styles['title']))
+        story.append(Spacer(1, 20))
+
+        # Purchases summary
+        totaux = data["totaux"]
+        summary_data = [
+            ["Indicateur", "Valeur"],
+            ["Nombre de commandes", str(totaux["nombre"])],
+            ["Total des achats", f"{totaux['total_ttc']:,.2f} F CFA"],
+            ["TVA déductible", f"{totaux['tva']:,.2f} F CFA"],
+            ["Montant réglé", f"{totaux['total_paye']:,.2f} F CFA"],
+            ["Commandes en attente", str(totaux["en_attente"])],
+            ["Fournisseurs actifs", str(totaux["fournisseurs_actifs"])],
+        ]
+
+        table = Table(summary_data)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(table)
+        story.append(Spacer(1, 20))
+
+        # Most recent purchase orders
+        story.append(Paragraph("Détail des Commandes", styles['heading2']))
+        achat_data = [["N° Bon de commande", "Fournisseur", "Date", "Montant", "Statut"]]
+        for a in data["achats"]:
+            fournisseur_nom = a.get('fournisseur_nom', '')
+            if len(fournisseur_nom) > 20:
+                fournisseur_nom = fournisseur_nom[:20] + "..."
+
+            achat_data.append([
+                a.get('numero_bon_commande', '')[:20],
+                fournisseur_nom,
+                a.get('date_commande', '')[:10],
+                f"{a.get('total_ttc', 0):,.0f} {a.get('devise', 'FCFA')}",
+                a.get('statut', '')
+            ])
+
+        detail_table = Table(achat_data, colWidths=[100, 120, 60, 90, 60])
+        detail_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align supplier names
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'), # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(detail_table)
+
+    elif report_type == "balance_fournisseurs":
+        story.append(Paragraph("BALANCE FOURNISSEURS", styles['title']))
+        story.append(Spacer(1, 20))
+
+        # Supplier balance table
+        balance_data = [["Fournisseur", "Devise", "Nb Commandes", "Total Commandé", "Total Payé", "Solde"]]
+
+        for row in data["fournisseurs"]:
+            fournisseur_nom = row.get('nom', '')
+            if len(fournisseur_nom) > 22:
+                fournisseur_nom = fournisseur_nom[:22] + "..."
+
+            balance_data.append([
+                fournisseur_nom,
+                row['devise'],
+                str(row['nombre_commandes']),
+                f"{row['total_commande']:,.2f}",
+                f"{row['total_paye']:,.2f}",
+                f"{row['solde']:,.2f}"
+            ])
+
+        for devise, totals in data["sous_totaux"].items():
+            balance_data.append([
+                f"TOTAL {devise} ({totals['fournisseurs']})",
+                devise,
+                str(totals['nombre_commandes']),
+                f"{totals['total_commande']:,.2f}",
+                f"{totals['total_paye']:,.2f}",
+                f"{totals['solde']:,.2f}"
+            ])
+
+        nb_totals = len(data["sous_totaux"])
+        balance_table = Table(balance_data, repeatRows=1)
+        balance_style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ffc107')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # Left align supplier names
+            ('ALIGN', (3, 1), (-1, -1), 'RIGHT'), # Right align amounts
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]
+        if nb_totals:
+            # Sous-totaux par devise en fin de tableau
+            balance_style += [
+                ('BACKGROUND', (0, -nb_totals), (-1, -1), colors.HexColor('#fff3cd')),
+                ('FONTNAME', (0, -nb_totals), (-1, -1), 'Helvetica-Bold'),
+            ]
+        balance_table.setStyle(TableStyle(balance_style))
+        story.append(balance_table)
+
+    elif report_type == "tresorerie":
+        story.append(Paragraph("SUIVI DE TRÉSORERIE", styles['title']))
+        story.append(Spacer(1, 20))
+
+        # Treasury summary
+        paiements = data["paiements"]
+        factures = data["factures"]
+
+        tresorerie_data = [
+            ["Indicateur", "Montant"],
+            ["Total encaissé", f"{paiements['montant']:,.2f} F CFA"],
+            ["À encaisser", f"{factures['reste_a_encaisser']:,.2f} F CFA"],
+            ["Nombre de paiements", str(paiements["nombre"])],
+            ["Factures impayées", str(factures["impayees"])]
+        ]
+
+        tresorerie_table = Table(tresorerie_data)
+        tresorerie_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ffc107')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(tresorerie_table)
+
+    elif report_type == "compte_resultat":
+        story.append(Paragraph("COMPTE DE RÉSULTAT", styles['title']))
+        story.append(Spacer(1, 20))
+
+        # Results summary
+        factures = data["factures"]
+        ca_ttc = factures["total_ttc"]
+        tva_collectee = factures["tva"]
+        ca_ht = ca_ttc - tva_collectee
+        taux_conversion = (factures["nombre"] / data["nombre_devis"] * 100) if data["nombre_devis"] else 0
+
+        resultat_data = [
+            ["Poste", "Montant"],
+            ["Chiffre d'affaires HT", f"{ca_ht:,.2f} F CFA"],
+            ["TVA collectée (18%)", f"{tva_collectee:,.2f} F CFA"],
+            ["Chiffre d'affaires TTC", f"{ca_ttc:,.2f} F CFA"],
+            ["Taux de conversion devis", f"{taux_conversion:.1f}%"],
+            ["Nombre de clients actifs", str(data["nombre_clients"])]
+        ]
+
+        resultat_table = Table(resultat_data)
+        resultat_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#17a2b8')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(resultat_table)
+
+    story.append(Spacer(1, 30))
+    story.append(Paragraph(f"Rapport généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}", styles['footer']))
+
+    doc.build(story)
@@ -0,0 +1,195 @@
+"""
+Service de rendu PDF hors boucle d'événements - ECO PUMP AFRIK
+
+La mise en page ReportLab (doc.build) est purement CPU : exécutée dans un
+handler `async def`, un gros rapport fige toutes les autres requêtes. Les
+fonctions de pdf_documents.py sont donc exécutées dans un ProcessPoolExecutor.
+Chaque processus web (WEB_CONCURRENCY workers uvicorn/gunicorn) démarre son
+propre pool : les cœurs sont partagés entre eux, le total des processus de
+rendu reste de l'ordre du nombre de cœurs.
+
+Le nombre de rendus en cours ou en attente est borné : au-delà, le service
+refuse immédiatement le travail (HTTP 503 + Retry-After côté API) au lieu de
+laisser la file grossir. Chaque rendu a un délai maximal : un rendu expiré
+encore en file est annulé ; déjà commencé, il ne peut pas être interrompu et
+reste compté dans la borne jusqu'à sa fin réelle (métrique `abandoned`).
+
+Le PDF est rendu en mémoire (BytesIO) dans le worker et renvoyé sous forme
+d'octets : aucun fichier temporaire n'est créé. Les octets rendus et la
+mémoire tampon détenue par les réponses en cours d'envoi sont mesurés.
+"""
+import io
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdf_documents
+import pdf_templates
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS',
+                                        str(max(1, (os.cpu_count() or 2) // WEB_CONCURRENCY))))
+PDF_MAX_PENDING = int(os.environ.get('PDF_MAX_PENDING', str(PDF_RENDER_WORKERS * 4)))
+PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', '60'))
+
+
+class PdfQueueFull(Exception):
+    """Too many renders in flight, the caller should retry later"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"PDF render queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PdfRenderTimeout(Exception):
+    """A render did not finish within PDF_RENDER_TIMEOUT"""
+
+
+def _run_renderer(renderer_name: str, args: tuple):
+    """Executed in a worker process: render into an in-memory buffer"""
+    start = time.perf_counter()
+    renderer = getattr(pdf_documents, renderer_name)
+    buffer = io.BytesIO()
+    renderer(buffer, *args)
+    return buffer.getvalue(), time.perf_counter() - start
+
+
+def _warm_up_worker():
+    """Load the logo, styles and page decorations once per worker"""
+    pdf_templates.load_templates()
+
+
+class PdfRenderService:
+    def __init__(self, workers: int = PDF_RENDER_WORKERS, max_pending: int = PDF_MAX_PENDING,
+                 timeout: float = PDF_RENDER_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pending = 0
+        self._render_times = deque(maxlen=500)
+        self._abandoned = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0}
+        self._bytes_rendered = 0
+        self._largest_pdf = 0
+        self._buffered = 0
+        self._peak_buffered = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up_worker,
+            )
+            logger.info(f"PDF render pool started with {self.workers} workers")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _retry_after(self) -> int:
+        """Rough estimate of when a slot frees up, from recent render times"""
+        average = sum(self._render_times) / len(self._render_times) if self._render_times else 1.0
+        queued = max(0, self._pending - self.workers)
+        return max(1, int(average * (queued / self.workers + 1)) + 1)
+
+    def _release(self, abandoned: bool = False):
+        self._pending -= 1
+        if abandoned:
+            self._abandoned -= 1
+
+    def _abandon(self, job):
+        """Cancel a render still queued; one already running keeps its slot until it really ends"""
+        if job.cancel():
+            self._counters["cancelled"] += 1
+            self._release()
+            return
+        self._abandoned += 1
+        loop = asyncio.get_running_loop()
+        job.add_done_callback(lambda _job: loop.call_soon_threadsafe(self._release, True))
+
+    def _submit(self, renderer_name: str, args: tuple):
+        try:
+            return self._executor.submit(_run_renderer, renderer_name, args)
+        except BrokenProcessPool:
+            # Un worker est mort : on recrée le pool pour les requêtes suivantes
+            logger.error("PDF render pool is broken, restarting it")
+            self._executor = None
+            self.start()
+            return self._executor.submit(_run_renderer, renderer_name, args)
+
+    async def render(self, renderer_name: str, *args) -> bytes:
+        """Render with pdf_documents.<renderer_name>(output, *args) and return the PDF bytes"""
+        if self._pending >= self.max_pending:
+            self._counters["rejected"] += 1
+            raise PdfQueueFull(self._retry_after())
+
+        self.start()
+        job = self._submit(renderer_name, args)
+        self._pending += 1
+        try:
+            content, render_time = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)), self.timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            self._abandon(job)
+            raise PdfRenderTimeout(f"{renderer_name} exceeded {self.timeout}s")
+        except asyncio.CancelledError:
+            # Client parti avant la fin du rendu
+            self._abandon(job)
+            raise
+        except BrokenProcessPool:
+            self._release()
+            self._counters["failed"] += 1
+            logger.error("PDF render pool is broken, it will be restarted")
+            self._executor = None
+            raise
+        except Exception:
+            self._release()
+            self._counters["failed"] += 1
+            raise
+
+        self._release()
+        self._counters["completed"] += 1
+        self._render_times.append(render_time)
+        self._bytes_rendered += len(content)
+        self._largest_pdf = max(self._largest_pdf, len(content))
+        return content
+
+    def buffer_acquired(self, size: int):
+        """A response started streaming a rendered PDF held in memory"""
+        self._buffered += size
+        self._peak_buffered = max(self._peak_buffered, self._buffered)
+
+    def buffer_released(self, size: int):
+        self._buffered -= size
+
+    def metrics(self) -> dict:
+        times = sorted(self._render_times)
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._pending,
+            "abandoned": self._abandoned,
+            "queue_depth": max(0, self._pending - self.workers),
+            **self._counters,
+            "render_time_avg_ms": round(sum(times) / len(times) * 1000, 1) if times else None,
+            "render_time_p95_ms": round(percentile(times, 95) * 1000, 1) if len(times) >= 20 else None,
+            "render_time_max_ms": round(times[-1] * 1000, 1) if times else None,
+            "bytes_rendered": self._bytes_rendered,
+            "largest_pdf_bytes": self._largest_pdf,
+            "buffered_bytes": self._buffered,
+            "peak_buffered_bytes": self._peak_buffered,
+        }
+
+
+pdf_renderer = PdfRenderService()
@@ -0,0 +1,278 @@
+"""
+Gabarits PDF réutilisables - ECO PUMP AFRIK
+
+Tout ce qui ne dépend pas du document est construit une seule fois par
+processus (au démarrage des workers de rendu, voir pdf_service.py) :
+logo décodé, styles de paragraphe par type de document, en-tête, bandeau
+de contact et pied de page. L'en-tête et le pied de page sont dessinés par
+les PageTemplate d'EcoPumpDocTemplate, les fonctions de pdf_documents.py
+ne construisent plus que le contenu propre à chaque document.
+
+Les styles sont immuables : pour une variante, dériver un nouveau style
+(`ParagraphStyle(..., parent=style)`) au lieu de modifier celui du registre.
+"""
+import os
+import logging
+from types import MappingProxyType
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph, Table, TableStyle
+from reportlab.lib import colors
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter à chaque modification de mise en page : invalide le cache PDF (pdf_cache.py)
+TEMPLATE_VERSION = "3"
+
+LOGO_PATH = os.environ.get('PDF_LOGO_PATH', "/app/logo_eco_pump.png")
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 72
+FRAME_PADDING = 6
+HEADER_SPACING = 10
+FOOTER_SPACING = 20
+FOOTER_BOTTOM = 36
+
+
+class FrozenParagraphStyle(ParagraphStyle):
+    """ParagraphStyle that can no longer be modified once built"""
+
+    def __init__(self, name, **kw):
+        super().__init__(name, **kw)
+        self.__dict__["_frozen"] = True
+
+    def __setattr__(self, key, value):
+        if self.__dict__.get("_frozen"):
+            raise AttributeError(f"PDF style '{self.name}' is immutable, derive a new style instead")
+        super().__setattr__(key, value)
+
+
+def _derive(name: str, base: ParagraphStyle, **overrides) -> FrozenParagraphStyle:
+    attributes = {k: v for k, v in base.__dict__.items() if k not in ("name", "parent")}
+    attributes.update(overrides)
+    return FrozenParagraphStyle(name, **attributes)
+
+
+def _build_styles():
+    sample = getSampleStyleSheet()
+    common = {
+        "body": _derive("body", sample["Normal"]),
+        "heading2": _derive("heading2", sample["Heading2"]),
+        "footer": _derive("footer", sample["Normal"], fontSize=8, leading=10, textColor=colors.HexColor('#666666')),
+    }
+
+    def list_title(color):
+        return _derive("title", sample["Heading1"], fontSize=22, textColor=colors.HexColor(color), alignment=1)
+
+    def document_title(size):
+        return _derive("title", sample["Heading1"], fontSize=size, textColor=colors.HexColor('#333333'))
+
+    titles = {
+        "liste_factures_impayees": list_title('#dc3545'),  # Rouge pour les impayés
+        "liste_factures": list_title('#0066cc'),
+        "liste_devis": list_title('#28a745'),  # Vert pour les devis
+        "document": document_title(20),
+        "report": document_title(18),
+    }
+    return MappingProxyType({
+        doc_kind: MappingProxyType({**common, "title": title})
+        for doc_kind, title in titles.items()
+    })
+
+
+def get_logo_image():
+    """Load and decode the ECO PUMP AFRIK logo for PDFs"""
+    try:
+        if os.path.exists(LOGO_PATH):
+            from reportlab.platypus import Image as ReportLabImage
+            # TAILLE AUGMENTÉE : 120x120 pixels (au lieu de 80x80) - lazy=0 : décodé une seule fois
+            logo_img = ReportLabImage(LOGO_PATH, width=120, height=120, lazy=0)
+            return logo_img
+        else:
+            logger.warning("Logo file not found, using text-based branding")
+            return None
+    except Exception as e:
+        logger.error(f"Error loading logo: {e}")
+        return None
+
+def create_pdf_header_with_logo(logo_img):
+    """Create standardized PDF header with ECO PUMP AFRIK logo - PERFECTLY CENTERED"""
+    if logo_img:
+        # Header with actual logo - LOGO 120x120 PARFAITEMENT CENTRÉ
+        logo_table_data = [
+            [logo_img, "ECO PUMP AFRIK", ""],
+            ["", "Solutions Hydrauliques Professionnelles", ""]
+        ]
+
+        # Colonne de gauche et droite égales pour parfait centrage du logo 120x120
+        logo_table = Table(logo_table_data, colWidths=[140, 320, 140])
+        logo_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'CENTER'),  # Logo parfaitement centré
+            ('VALIGN', (0, 0), (0, 0), 'MIDDLE'), # Logo au milieu verticalement
+            ('ALIGN', (1, 0), (1, 1), 'CENTER'),  # Texte centré horizontalement
+            ('VALIGN', (1, 0), (1, 1), 'MIDDLE'), # Texte centré verticalement
+            # FOND BLANC comme demandé
+            ('BACKGROUND', (0, 0), (2, 1), colors.white),
+            ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (1, 0), (1, 0), 24),  # Taille réduite pour équilibrer avec logo plus grand
+            ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#000000')),
+            ('FONTNAME', (1, 1), (1, 1), 'Helvetica'),
+            ('FONTSIZE', (1, 1), (1, 1), 11),
+            ('TEXTCOLOR', (1, 1), (1, 1), colors.HexColor('#0066cc')),
+            ('BOX', (0, 0), (-1, -1), 3, colors.HexColor('#0066cc')),
+            ('TOPPADDING', (0, 0), (-1, -1), 20),  # Plus d'espace pour logo plus grand
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+        ]))
+    else:
+        # Fallback to text-based header - CENTRÉ
+        logo_table_data = [
+            ["", "ECO PUMP AFRIK", ""],
+            ["", "Solutions Hydrauliques Professionnelles", ""]
+        ]
+
+        logo_table = Table(logo_table_data, colWidths=[140, 320, 140])
+        logo_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (2, 1), colors.white),  # Fond blanc partout
+            ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (1, 0), (1, 0), 28),
+            ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#000000')),
+            ('ALIGN', (1, 0), (1, 1), 'CENTER'),  # Tout centré
+            ('VALIGN', (1, 0), (1, 1), 'MIDDLE'),
+            ('FONTNAME', (1, 1), (1, 1), 'Helvetica'),
+            ('FONTSIZE', (1, 1), (1, 1), 14),
+            ('TEXTCOLOR', (1, 1), (1, 1), colors.HexColor('#0066cc')),
+            ('BOX', (0, 0), (-1, -1), 3, colors.HexColor('#0066cc')),
+            ('TOPPADDING', (0, 0), (-1, -1), 20),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+        ]))
+
+    return logo_table
+
+
+def _build_contact_bar():
+    contact_data = [
+        ["📧 contact@ecopumpafrik.com", "📞 +225 0707806359", "🌐 www.ecopumpafrik.com"]
+    ]
+
+    contact_table = Table(contact_data, colWidths=[160, 160, 160])
+    contact_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f8ff')),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#0066cc')),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    return contact_table
+
+
+def _build_footer(footer_style, legal_mentions: bool):
+    lines = [
+        "─" * 80,
+        "<b>SARL ECO PUMP AFRIK au capital de 1 000 000 F CFA</b>",
+        "Siège social: Cocody - Angré 7e Tranche",
+        "Tél: +225 0707806359",
+        "Email: contact@ecopumpafrik.com | Site WEB: www.ecopumpafrik.com",
+    ]
+    if legal_mentions:
+        lines.append("RCCM: CI-ABJ-2024-B-12345 | N°CC: 2407891H")
+
+    footer_table = Table([[Paragraph(line, footer_style)] for line in lines], colWidths=[PAGE_WIDTH - 2 * MARGIN])
+    footer_table.setStyle(TableStyle([
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+    ]))
+    return footer_table
+
+
+class PdfTemplates:
+    """Branding assets and styles shared by every PDF of the process"""
+
+    def __init__(self):
+        self.logo = get_logo_image()
+        self.styles = _build_styles()
+        self.header = create_pdf_header_with_logo(self.logo)
+        self.contact_bar = _build_contact_bar()
+        self.footers = {
+            legal: _build_footer(self.styles["document"]["footer"], legal)
+            for legal in (False, True)
+        }
+        # Hauteurs calculées une fois : elles fixent la géométrie des cadres de page
+        self.header_height = self.header.wrap(PAGE_WIDTH, PAGE_HEIGHT)[1]
+        self.contact_bar_height = self.contact_bar.wrap(PAGE_WIDTH, PAGE_HEIGHT)[1]
+        self.footer_heights = {
+            legal: footer.wrap(PAGE_WIDTH - 2 * MARGIN, PAGE_HEIGHT)[1]
+            for legal, footer in self.footers.items()
+        }
+
+
+_templates = None
+
+
+def load_templates() -> PdfTemplates:
+    """Build the template registry (once per process)"""
+    global _templates
+    if _templates is None:
+        _templates = PdfTemplates()
+    return _templates
+
+
+def get_styles(doc_kind: str):
+    """Immutable paragraph styles of a document kind (body, heading2, footer, title)"""
+    return load_templates().styles[doc_kind]
+
+
+def _draw_centered(canvas, flowable, top: float) -> float:
+    """Draw a cached flowable horizontally centered on the page, return its bottom"""
+    width, height = flowable.wrapOn(canvas, PAGE_WIDTH, PAGE_HEIGHT)
+    flowable.drawOn(canvas, (PAGE_WIDTH - width) / 2, top - height)
+    return top - height
+
+
+class EcoPumpDocTemplate(BaseDocTemplate):
+    """A4 document whose header (first page) and footer (every page) come from the registry"""
+
+    def __init__(self, output, contact_bar: bool = False, legal_mentions: bool = False):
+        super().__init__(output, pagesize=A4, leftMargin=MARGIN, rightMargin=MARGIN,
+                         topMargin=MARGIN, bottomMargin=MARGIN)
+        templates = load_templates()
+        self._contact_bar = contact_bar
+        self._footer = templates.footers[legal_mentions]
+
+        frame_width = PAGE_WIDTH - 2 * MARGIN
+        frame_bottom = FOOTER_BOTTOM + templates.footer_heights[legal_mentions] + FOOTER_SPACING
+        first_top = PAGE_HEIGHT - MARGIN - FRAME_PADDING - templates.header_height - HEADER_SPACING
+        if contact_bar:
+            first_top -= templates.contact_bar_height
+        later_top = PAGE_HEIGHT - MARGIN
+
+        self.addPageTemplates([
+            PageTemplate(
+                id="first",
+                frames=[Frame(MARGIN, frame_bottom, frame_width, first_top - frame_bottom, id="first")],
+                onPage=self._draw_first_page,
+                autoNextPageTemplate="later",
+            ),
+            PageTemplate(
+                id="later",
+                frames=[Frame(MARGIN, frame_bottom, frame_width, later_top - frame_bottom, id="later")],
+                onPage=self._draw_footer,
+            ),
+        ])
+
+    def _draw_first_page(self, canvas, doc):
+        templates = load_templates()
+        bottom = _draw_centered(canvas, templates.header, PAGE_HEIGHT - MARGIN - FRAME_PADDING)
+        if self._contact_bar:
+            _draw_centered(canvas, templates.contact_bar, bottom - HEADER_SPACING)
+        self._draw_footer(canvas, doc)
+
+    def _draw_footer(self, canvas, doc):
+        self._footer.wrapOn(canvas, PAGE_WIDTH - 2 * MARGIN, PAGE_HEIGHT)
+        self._footer.drawOn(canvas, MARGIN, FOOTER_BOTTOM)
@@ -0,0 +1,302 @@
+"""
+Données des rapports financiers PDF - ECO PUMP AFRIK
+
+Chaque type de rapport déclare ses propres besoins : un chargeur dédié
+lit uniquement les champs affichés (projections) ou fait calculer les
+totaux par MongoDB (agrégations), au lieu de charger toutes les
+collections avant de savoir quel rapport est demandé. La mémoire et la
+latence d'un rapport dépendent ainsi de ce qu'il affiche.
+
+Les dictionnaires retournés sont consommés par pdf_documents.render_report.
+"""
+import logging
+from datetime import date, timedelta
+from typing import List, Optional
+
+from database import (
+    clients_repo,
+    fournisseurs_repo,
+    devis_repo,
+    factures_repo,
+    achats_repo,
+    paiements_repo,
+)
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_VENTES_DETAIL_LIMIT = 15
+JOURNAL_ACHATS_DETAIL_LIMIT = 15
+
+# Tranches d'ancienneté des soldes clients (jours depuis la date de facture)
+AGEING_BUCKETS = ["0_30", "31_60", "61_90", "plus_90"]
+
+REPORT_LOADERS = {}
+
+
+def report(report_type: str):
+    """Register the data loader of a report type"""
+    def register(loader):
+        REPORT_LOADERS[report_type] = loader
+        return loader
+    return register
+
+
+def _period(field: str, date_filter: Optional[dict]) -> dict:
+    return {field: date_filter} if date_filter else {}
+
+
+async def _factures_totals(match: dict) -> dict:
+    """Invoice count and amounts of a period, computed by MongoDB"""
+    unpaid = {"$ne": ["$statut_paiement", "payé"]}
+    rows = await factures_repo.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "nombre": {"$sum": 1},
+            "total_ttc": {"$sum": "$total_ttc"},
+            "tva": {"$sum": "$tva"},
+            "impayees": {"$sum": {"$cond": [unpaid, 1, 0]}},
+            "reste_a_encaisser": {"$sum": {"$cond": [
+                unpaid,
+                {"$subtract": ["$total_ttc", {"$ifNull": ["$montant_paye", 0]}]},
+                0
+            ]}},
+        }},
+    ])
+    totals = rows[0] if rows else {}
+    return {
+        key: totals.get(key, 0)
+        for key in ("nombre", "total_ttc", "tva", "impayees", "reste_a_encaisser")
+    }
+
+
+@report("journal_ventes")
+async def _journal_ventes(date_filter: Optional[dict]) -> dict:
+    match = _period("date_facture", date_filter)
+    return {
+        "totaux": await _factures_totals(match),
+        "factures": await factures_repo.find_many(
+            match,
+            projection={"_id": 0, "numero_facture": 1, "client_nom": 1, "date_facture": 1,
+                        "total_ttc": 1, "devise": 1, "statut_paiement": 1},
+            sort=[("created_at", -1)],
+            limit=JOURNAL_VENTES_DETAIL_LIMIT,
+        ),
+    }
+
+
+def _ageing_buckets(today: date) -> List[tuple]:
+    """(bucket, first day) from the most recent; dates are compared as ISO strings"""
+    return [
+        (name, (today - timedelta(days=days)).isoformat())
+        for name, days in (("0_30", 30), ("31_60", 60), ("61_90", 90))
+    ]
+
+
+async def balance_clients(date_filter: Optional[dict] = None, today: Optional[date] = None) -> dict:
+    """Per-client balance with currency subtotals and ageing of the outstanding amounts
+
+    One $group by client and currency over the invoices of the period, joined
+    to clients with $lookup. Clients without invoices in the period are not
+    listed.
+    """
+    today = today or date.today()
+    buckets = _ageing_buckets(today)
+    reste = {"$cond": [
+        {"$ne": ["$statut_paiement", "payé"]},
+        {"$subtract": ["$total_ttc", {"$ifNull": ["$montant_paye", 0]}]},
+        0
+    ]}
+
+    # Ancienneté : première tranche dont la date de début précède la facture
+    anciennete = "plus_90"
+    for name, first_day in reversed(buckets):
+        anciennete = {"$cond": [{"$gte": ["$date_facture", first_day]}, name, anciennete]}
+
+    rows = await factures_repo.aggregate([
+        {"$match": _period("date_facture", date_filter)},
+        {"$project": {
+            "client_id": 1,
+            "devise": {"$ifNull": ["$devise", "FCFA"]},
+            "total_ttc": 1,
+            "montant_paye": {"$ifNull": ["$montant_paye", 0]},
+            "reste": reste,
+            "anciennete": anciennete,
+        }},
+        {"$group": {
+            "_id": {"client_id": "$client_id", "devise": "$devise"},
+            "nombre_factures": {"$sum": 1},
+            "total_facture": {"$sum": "$total_ttc"},
+            "total_paye": {"$sum": "$montant_paye"},
+            "solde": {"$sum": "$reste"},
+            **{
+                f"anciennete_{name}": {"$sum": {"$cond": [{"$eq": ["$anciennete", name]}, "$reste", 0]}}
+                for name in AGEING_BUCKETS
+            },
+        }},
+        {"$lookup": {
+            "from": clients_repo.collection_name,
+            "localField": "_id.client_id",
+            "foreignField": "client_id",
+            "as": "client",
+        }},
+        {"$project": {
+            "_id": 0,
+            "client_id": "$_id.client_id",
+            "devise": "$_id.devise",
+            "nom": {"$ifNull": [{"$arrayElemAt": ["$client.nom", 0]}, ""]},
+            "type_client": {"$ifNull": [{"$arrayElemAt": ["$client.type_client", 0]}, ""]},
+            "nombre_factures": 1,
+            "total_facture": 1,
+            "total_paye": 1,
+            "solde": 1,
+            **{f"anciennete_{name}": 1 for name in AGEING_BUCKETS},
+        }},
+        {"$sort": {"nom": 1, "devise": 1}},
+    ])
+
+    sous_totaux = {}
+    for row in rows:
+        row["anciennete"] = {name: row.pop(f"anciennete_{name}", 0) for name in AGEING_BUCKETS}
+        totals = sous_totaux.setdefault(row["devise"], {
+            "clients": 0, "nombre_factures": 0, "total_facture": 0, "total_paye": 0, "solde": 0,
+            "anciennete": {name: 0 for name in AGEING_BUCKETS},
+        })
+        totals["clients"] += 1
+        for key in ("nombre_factures", "total_facture", "total_paye", "solde"):
+            totals[key] += row[key]
+        for name in AGEING_BUCKETS:
+            totals["anciennete"][name] += row["anciennete"][name]
+
+    return {
+        "date_reference": today.isoformat(),
+        "clients": rows,
+        "sous_totaux": sous_totaux,
+    }
+
+
+@report("balance_clients")
+async def _balance_clients(date_filter: Optional[dict]) -> dict:
+    return await balance_clients(date_filter)
+
+
+async def _achats_totals(match: dict) -> dict:
+    """Purchase order count and amounts of a period, computed by MongoDB"""
+    rows = await achats_repo.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "nombre": {"$sum": 1},
+            "total_ttc": {"$sum": "$total_ttc"},
+            "tva": {"$sum": "$tva"},
+            "en_attente": {"$sum": {"$cond": [{"$eq": ["$statut", "commandé"]}, 1, 0]}},
+            "total_paye": {"$sum": {"$ifNull": ["$montant_paye", 0]}},
+            "fournisseurs": {"$addToSet": "$fournisseur_id"},
+        }},
+        {"$project": {
+            "_id": 0, "nombre": 1, "total_ttc": 1, "tva": 1, "en_attente": 1, "total_paye": 1,
+            "fournisseurs_actifs": {"$size": "$fournisseurs"},
+        }},
+    ])
+    totals = rows[0] if rows else {}
+    return {
+        key: totals.get(key, 0)
+        for key in ("nombre", "total_ttc", "tva", "en_attente", "total_paye", "fournisseurs_actifs")
+    }
+
+
+@report("journal_achats")
+async def _journal_achats(date_filter: Optional[dict]) -> dict:
+    match = _period("date_commande", date_filter)
+    return {
+        "totaux": await _achats_totals(match),
+        "achats": await achats_repo.find_many(
+            match,
+            projection={"_id": 0, "numero_bon_commande": 1, "fournisseur_nom": 1, "date_commande": 1,
+                        "total_ttc": 1, "devise": 1, "statut": 1},
+            sort=[("created_at", -1)],
+            limit=JOURNAL_ACHATS_DETAIL_LIMIT,
+        ),
+    }
+
+
+async def balance_fournisseurs(date_filter: Optional[dict] = None) -> dict:
+    """Per-supplier orders, amounts ordered and paid, balance, with currency subtotals
+
+    One $group by supplier and currency over the purchase orders of the
+    period, joined to fournisseurs with $lookup.
+    """
+    rows = await achats_repo.aggregate([
+        {"$match": _period("date_commande", date_filter)},
+        {"$group": {
+            "_id": {"fournisseur_id": "$fournisseur_id", "devise": {"$ifNull": ["$devise", "FCFA"]}},
+            "fournisseur_nom": {"$first": "$fournisseur_nom"},
+            "nombre_commandes": {"$sum": 1},
+            "total_commande": {"$sum": "$total_ttc"},
+            "total_paye": {"$sum": {"$ifNull": ["$montant_paye", 0]}},
+        }},
+        {"$lookup": {
+            "from": fournisseurs_repo.collection_name,
+            "localField": "_id.fournisseur_id",
+            "foreignField": "fournisseur_id",
+            "as": "fournisseur",
+        }},
+        {"$project": {
+            "_id": 0,
+            "fournisseur_id": "$_id.fournisseur_id",
+            "devise": "$_id.devise",
+            # Nom actuel du fournisseur, sinon celui du bon de commande
+            "nom": {"$ifNull": [{"$arrayElemAt": ["$fournisseur.nom", 0]}, "$fournisseur_nom"]},
+            "nombre_commandes": 1,
+            "total_commande": 1,
+            "total_paye": 1,
+            "solde": {"$subtract": ["$total_commande", "$total_paye"]},
+        }},
+        {"$sort": {"nom": 1, "devise": 1}},
+    ])
+
+    sous_totaux = {}
+    for row in rows:
+        totals = sous_totaux.setdefault(row["devise"], {
+            "fournisseurs": 0, "nombre_commandes": 0, "total_commande": 0, "total_paye": 0, "solde": 0,
+        })
+        totals["fournisseurs"] += 1
+        for key in ("nombre_commandes", "total_commande", "total_paye", "solde"):
+            totals[key] += row[key]
+
+    return {"fournisseurs": rows, "sous_totaux": sous_totaux}
+
+
+@report("balance_fournisseurs")
+async def _balance_fournisseurs(date_filter: Optional[dict]) -> dict:
+    return await balance_fournisseurs(date_filter)
+
+
+@report("tresorerie")
+async def _tresorerie(date_filter: Optional[dict]) -> dict:
+    paiements = await paiements_repo.aggregate([
+        {"$match": _period("date_paiement", date_filter)},
+        {"$group": {"_id": None, "nombre": {"$sum": 1}, "montant": {"$sum": "$montant"}}},
+    ])
+    return {
+        "factures": await _factures_totals(_period("date_facture", date_filter)),
+        "paiements": {
+            "nombre": paiements[0]["nombre"] if paiements else 0,
+            "montant": paiements[0]["montant"] if paiements else 0,
+        },
+    }
+
+
+@report("compte_resultat")
+async def _compte_resultat(date_filter: Optional[dict]) -> dict:
+    return {
+        "factures": await _factures_totals(_period("date_facture", date_filter)),
+        "nombre_devis": await devis_repo.count(_period("date_devis", date_filter)),
+        "nombre_clients": await clients_repo.count(),
+    }
+
+
+async def load_report_data(report_type: str, date_filter: Optional[dict]) -> dict:
+    """Data shown by one report type (KeyError for an unknown type)"""
+    loader = REPORT_LOADERS[report_type]
+    return await loader(date_filter)
@@ -0,0 +1,299 @@
+"""
+Index de recherche plein texte - ECO PUMP AFRIK
+
+Chaque client, devis et facture porte un champ `search_terms` : les mots
+(minuscules, sans accents) de ses noms, numéros, NIF/CC/RC, email et
+désignations d'articles. Le champ est indexé (index multiclé) ; une
+recherche devient une suite de préfixes ancrés (`^pomp`) sur cet index, au
+lieu de `$regex` non ancrées et insensibles à la casse qui parcourent toute
+la collection. La saisie utilisateur est réduite à des mots alphanumériques
+et ne parvient jamais telle quelle au moteur d'expressions régulières.
+
+Les handlers qui créent ou modifient un document appellent
+`with_search_terms()` (ou `refresh_search_terms()` après une mise à jour
+partielle) ; `backfill_search_terms()` complète les documents antérieurs
+(au démarrage ou via l'endpoint d'administration).
+
+L'autocomplétion des sélecteurs (clients, articles de stock) s'appuie sur
+le même index et met ses suggestions en cache quelques secondes : une
+frappe qui prolonge un préfixe dont toutes les suggestions tiennent dans
+la réponse est filtrée en mémoire, sans requête.
+"""
+import os
+import re
+import asyncio
+import logging
+import unicodedata
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from cache import TTLCache
+from database import clients_repo, devis_repo, factures_repo, stock_repo
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELD = "search_terms"
+SEARCH_LIMIT = 10
+SEARCH_CANDIDATES = 50
+MAX_QUERY_TERMS = 6
+BACKFILL_BATCH_SIZE = 1000
+AUTOCOMPLETE_LIMIT = 8
+# Le cache des suggestions est local au worker : invalidate_suggestions ne vide
+# que celui du worker courant, les autres servent d'anciennes suggestions au plus
+# AUTOCOMPLETE_CACHE_TTL secondes après une écriture faite ailleurs.
+AUTOCOMPLETE_CACHE_TTL = float(os.environ.get('AUTOCOMPLETE_CACHE_TTL', '30'))
+
+# Champs indexés par collection et leur poids dans le classement
+SEARCH_FIELDS = {
+    "clients": {"nom": 3, "numero_cc": 3, "numero_rc": 3, "nif": 3, "email": 2, "telephone": 1},
+    "devis": {"numero_devis": 3, "client_nom": 2, "reference_commande": 2, "articles.designation": 1},
+    "factures": {"numero_facture": 3, "client_nom": 2, "reference_commande": 2, "articles.designation": 1},
+    "stock": {"ref": 3, "designation": 2, "fournisseur_principal": 1},
+}
+
+SEARCH_REPOS = {
+    "clients": clients_repo,
+    "devis": devis_repo,
+    "factures": factures_repo,
+    "stock": stock_repo,
+}
+
+# Collections de la recherche globale (/api/search)
+GLOBAL_SEARCH = ["clients", "devis", "factures"]
+
+# Autocomplétion : champs affichés (par ordre de priorité) et projection des suggestions
+AUTOCOMPLETE = {
+    "clients": {
+        "fields": ["nom"],
+        "projection": {"_id": 0, "client_id": 1, "nom": 1, "devise": 1, "type_client": 1,
+                       "conditions_paiement": 1, "created_at": 1},
+    },
+    "stock": {
+        "fields": ["ref", "designation"],
+        "projection": {"_id": 0, "article_id": 1, "ref": 1, "designation": 1, "prix_vente": 1,
+                       "quantite_stock": 1, "created_at": 1},
+    },
+}
+
+_suggestions_cache = TTLCache(ttl=AUTOCOMPLETE_CACHE_TTL, max_entries=2048)
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents ("Société Générale" -> "societe generale")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text) -> List[str]:
+    if not text:
+        return []
+    return re.findall(r"[a-z0-9]+", fold(str(text)))
+
+
+def _field_values(document: dict, field: str) -> list:
+    """Values of a field, following one level of lists (articles.designation)"""
+    head, _, rest = field.partition(".")
+    value = document.get(head)
+    if not rest:
+        return [value]
+    if isinstance(value, list):
+        return [item.get(rest) for item in value if isinstance(item, dict)]
+    return []
+
+
+def _field_tokens(kind: str, document: dict) -> Dict[str, set]:
+    return {
+        field: {token for value in _field_values(document, field) for token in tokenize(value)}
+        for field in SEARCH_FIELDS[kind]
+    }
+
+
+def build_search_terms(kind: str, document: dict) -> List[str]:
+    terms = set()
+    for tokens in _field_tokens(kind, document).values():
+        terms |= tokens
+    return sorted(terms)
+
+
+def with_search_terms(kind: str, document: dict) -> dict:
+    """Set the search terms of a document about to be written (returns it)"""
+    document[SEARCH_FIELD] = build_search_terms(kind, document)
+    return document
+
+
+async def refresh_search_terms(kind: str, document: dict):
+    """Recompute the terms of a stored document after a partial update"""
+    terms = build_search_terms(kind, document)
+    if terms != document.get(SEARCH_FIELD):
+        # Champ dérivé : la mise à jour du document a déjà été versionnée
+        await SEARCH_REPOS[kind].write_derived([UpdateOne({"_id": document["_id"]}, {"$set": {SEARCH_FIELD: terms}})])
+        document[SEARCH_FIELD] = terms
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def search_filter(terms: List[str]) -> dict:
+    """Every query term must prefix one of the document terms (anchored regex, index bounds)"""
+    return {"$and": [{SEARCH_FIELD: {"$regex": f"^{re.escape(term)}"}} for term in terms]}
+
+
+def fields_filter(kind: str, values: Dict[str, Optional[str]]) -> dict:
+    """Text filters of an advanced search: each value must appear in its field (escaped, case-insensitive)
+
+    For the indexed fields the value's terms are also required as prefixes of
+    the search terms, so the multikey index narrows the candidates before the
+    substring check.
+    """
+    terms = []
+    conditions = []
+    for field, value in values.items():
+        if not value:
+            continue
+        conditions.append({field: {"$regex": re.escape(value.strip()), "$options": "i"}})
+        if field in SEARCH_FIELDS[kind]:
+            terms.extend(tokenize(value))
+    if not conditions:
+        return {}
+    terms = list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]
+    return {"$and": (search_filter(terms)["$and"] if terms else []) + conditions}
+
+
+def score(kind: str, document: dict, terms: List[str]) -> int:
+    """Sum over the query terms of the best field weight (doubled on an exact word match)"""
+    field_tokens = _field_tokens(kind, document)
+    total = 0
+    for term in terms:
+        best = 0
+        for field, weight in SEARCH_FIELDS[kind].items():
+            tokens = field_tokens[field]
+            if term in tokens:
+                best = max(best, weight * 2)
+            elif any(token.startswith(term) for token in tokens):
+                best = max(best, weight)
+        total += best
+    return total
+
+
+async def _candidates(kind: str, terms: List[str], projection: dict, limit: int) -> List[dict]:
+    """Exact word matches first, then the other prefix matches, each limited to the `limit` most recent
+
+    The documents where every term is a whole word (equality on the
+    multikey index) are always candidates, however old.
+    """
+    repo = SEARCH_REPOS[kind]
+    exact, prefixed = await asyncio.gather(*(
+        repo.find_many(query, projection=projection, sort=[("created_at", -1)], limit=limit)
+        for query in ({"$and": [{SEARCH_FIELD: term} for term in terms]}, search_filter(terms))
+    ))
+    exact_ids = {document[repo.id_field] for document in exact}
+    return exact + [document for document in prefixed if document[repo.id_field] not in exact_ids]
+
+
+async def _search_collection(kind: str, terms: List[str], limit: int) -> List[dict]:
+    """Ranked matches of one collection (prefix matches limited to the SEARCH_CANDIDATES most recent)"""
+    candidates = await _candidates(kind, terms, {"_id": 0, SEARCH_FIELD: 0}, SEARCH_CANDIDATES)
+    # Tri stable : à score égal, les plus récents d'abord
+    candidates.sort(key=lambda document: score(kind, document, terms), reverse=True)
+    return candidates[:limit]
+
+
+async def search(query: str, limit: int = SEARCH_LIMIT) -> dict:
+    """Ranked matches per collection, the collections being queried concurrently"""
+    terms = query_terms(query)
+    if not terms:
+        return {kind: [] for kind in GLOBAL_SEARCH}
+
+    results = await asyncio.gather(*(_search_collection(kind, terms, limit) for kind in GLOBAL_SEARCH))
+    return dict(zip(GLOBAL_SEARCH, results))
+
+
+def _suggestion_rank(kind: str, document: dict, prefix: str) -> tuple:
+    """Display value starting with the typed text first, then word prefixes, then alphabetical"""
+    values = [fold(str(document.get(field) or "")) for field in AUTOCOMPLETE[kind]["fields"]]
+    starts = any(value.startswith(prefix) for value in values)
+    return (not starts, -score(kind, document, query_terms(prefix)), values[0])
+
+
+def _matches(document: dict, terms: List[str]) -> bool:
+    return all(any(token.startswith(term) for token in document[SEARCH_FIELD]) for term in terms)
+
+
+def _public(suggestions: List[dict]) -> List[dict]:
+    return [{k: v for k, v in document.items() if k != SEARCH_FIELD} for document in suggestions]
+
+
+def _cached_suggestions(kind: str, prefix: str, limit: int) -> Optional[List[dict]]:
+    """Suggestions of this prefix, or narrowed from a shorter prefix whose matches all fit in the cache"""
+    cached = _suggestions_cache.get((kind, prefix, limit))
+    if cached is not None:
+        return cached[0]
+    terms = query_terms(prefix)
+    for length in range(len(prefix) - 1, 0, -1):
+        cached = _suggestions_cache.get((kind, prefix[:length], limit))
+        if cached is None:
+            continue
+        suggestions, complete = cached
+        if not complete:
+            return None
+        narrowed = [document for document in suggestions if _matches(document, terms)]
+        narrowed.sort(key=lambda document: _suggestion_rank(kind, document, prefix))
+        _suggestions_cache.set((kind, prefix, limit), (narrowed, True))
+        return narrowed
+    return None
+
+
+async def autocomplete(kind: str, query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[dict]:
+    """Top `limit` suggestions of a picker (clients, stock) for the text typed so far"""
+    prefix = " ".join(query_terms(query))
+    if not prefix:
+        return []
+
+    suggestions = _cached_suggestions(kind, prefix, limit)
+    if suggestions is not None:
+        return _public(suggestions)
+
+    # Au moins limit + 1 candidats : une liste qui tient dans la réponse est
+    # alors certainement complète, jamais une liste tronquée par la requête
+    candidates = await _candidates(
+        kind,
+        query_terms(prefix),
+        {**AUTOCOMPLETE[kind]["projection"], SEARCH_FIELD: 1},
+        max(SEARCH_CANDIDATES, limit + 1),
+    )
+    candidates.sort(key=lambda document: _suggestion_rank(kind, document, prefix))
+    suggestions = candidates[:limit]
+    # Liste complète (toutes les correspondances tiennent dans la réponse) : les
+    # frappes suivantes qui prolongent ce préfixe seront filtrées en mémoire
+    _suggestions_cache.set((kind, prefix, limit), (suggestions, len(candidates) <= limit))
+    return _public(suggestions)
+
+
+def invalidate_suggestions():
+    """Forget cached suggestions (after a client or stock article write)"""
+    _suggestions_cache.invalidate()
+
+
+async def backfill_search_terms(kinds: Optional[List[str]] = None, rebuild: bool = False) -> dict:
+    """Compute the search terms of the documents that have none (or of all of them)"""
+    summary = {}
+    for kind in kinds or SEARCH_REPOS:
+        repo = SEARCH_REPOS[kind]
+        query = {} if rebuild else {SEARCH_FIELD: {"$exists": False}}
+        projection = {field.split(".")[0]: 1 for field in SEARCH_FIELDS[kind]}
+
+        # Champ dérivé : écrit sans nouvelle version (ni resynchronisation des clients)
+        updated = 0
+        async for batch in repo.find_batches(query, projection, batch_size=BACKFILL_BATCH_SIZE):
+            await repo.write_derived([
+                UpdateOne({"_id": document["_id"]}, {"$set": {SEARCH_FIELD: build_search_terms(kind, document)}})
+                for document in batch
+            ])
+            updated += len(batch)
+        summary[kind] = updated
+
+    if any(summary.values()):
+        logger.info(f"Search terms computed for {summary}")
+    return summary
@@ -0,0 +1,44 @@
+"""
+Sérialisation JSON rapide - ECO PUMP AFRIK
+
+Les listes (factures, devis avec leurs articles...) sont encodées par
+orjson, directement en octets, sans passer par `jsonable_encoder` de
+FastAPI qui reparcourt et recopie chaque document. Les ObjectId restants
+sont convertis en chaîne par l'encodeur ; les datetime et date sont gérés
+nativement (format ISO, identique à `isoformat()`).
+
+Un handler qui renvoie `FastJSONResponse(...)` contourne la validation du
+`response_model` et l'encodage générique : c'est le chemin des endpoints de
+liste et de recherche. `FastJSONResponse` est aussi la classe de réponse
+par défaut de l'application.
+"""
+from decimal import Decimal
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import ORJSONResponse
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """UTF-8 JSON of a response payload (ObjectId as string, datetime as ISO 8601)"""
+    return orjson.dumps(content, default=_default, option=JSON_OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
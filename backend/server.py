@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
@@ -6,29 +6,25 @@ from typing import Optional, List
 from datetime import datetime, date, timedelta
 import os
 import uuid
-from pymongo import MongoClient
-from fastapi.responses import FileResponse
-import tempfile
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import logging
 import json
+import asyncio
 from bson import ObjectId
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib import colors
 import base64
 import io
-import hashlib
+from urllib.parse import quote
 import jwt
 import secrets
+from serialization import FastJSONResponse
+from http_cache import HttpCacheMiddleware, conditional, etag_matches
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="ECO PUMP AFRIK - Gestion Intelligente")
+app = FastAPI(title="ECO PUMP AFRIK - Gestion Intelligente", default_response_class=FastJSONResponse)
 
 # CORS configuration for React frontend
 app.add_middleware(
@@ -39,31 +35,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'ecopump_afrik')
-
-try:
-    client = MongoClient(MONGO_URL)
-    db = client[DB_NAME]
-    
-    # Collections
-    clients_collection = db.clients
-    fournisseurs_collection = db.fournisseurs
-    devis_collection = db.devis
-    factures_collection = db.factures
-    achats_collection = db.achats
-    stock_collection = db.stock
-    paiements_collection = db.paiements
-    settings_collection = db.settings
-    users_collection = db.users  # Nouvelle collection pour les utilisateurs
-    
-    # Créer un utilisateur admin par défaut s'il n'existe pas
-    admin_user = users_collection.find_one({"username": "admin"})
+# Compression des réponses JSON et ETag des listes (304 si inchangées)
+app.add_middleware(HttpCacheMiddleware)
+
+# MongoDB connection (Motor, non bloquant)
+from database import (
+    clients_repo,
+    fournisseurs_repo,
+    devis_repo,
+    factures_repo,
+    achats_repo,
+    stock_repo,
+    mouvements_repo,
+    paiements_repo,
+    users_repo,
+    counters_repo,
+    run_in_transaction,
+    ping_database,
+    close_database,
+)
+from indexes import ensure_indexes, index_report
+from cache import TTLCache
+import dashboard_stats
+from pdf_service import pdf_renderer, PdfQueueFull, PdfRenderTimeout
+from pdf_cache import pdf_cache, document_digest
+from pdf_templates import TEMPLATE_VERSION
+import reports
+from reports import REPORT_LOADERS, load_report_data
+import search
+from search import with_search_terms, backfill_search_terms
+from passwords import password_hasher, PasswordHasherBusy
+from payments import record_payment, reduced_due, DocumentNotFound
+from payments import import_payments, parse_csv, InvalidImport
+import stock
+from stock import ArticleNotFound
+import sync
+from sync import InvalidSyncToken
+
+async def ensure_default_admin():
+    """Créer un utilisateur admin par défaut s'il n'existe pas"""
+    admin_user = await users_repo.get_by_username("admin")
     if not admin_user:
         # Mot de passe par défaut : admin123
         default_password = "admin123"
-        hashed_password = hashlib.sha256(default_password.encode()).hexdigest()
+        hashed_password = await password_hasher.hash(default_password)
         
         # Permissions complètes pour l'admin
         admin_permissions = {
@@ -78,7 +93,7 @@ try:
             "administration": True
         }
         
-        users_collection.insert_one({
+        await users_repo.insert_one({
             "user_id": str(uuid.uuid4()),
             "username": "admin",
             "password": hashed_password,
@@ -90,11 +105,28 @@ try:
             "last_login": None
         })
         logger.info("Utilisateur admin par défaut créé avec toutes les permissions (admin/admin123)")
-    
-    logger.info(f"Connected to MongoDB: {MONGO_URL}/{DB_NAME}")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    raise
+
+@app.on_event("startup")
+async def startup_event():
+    try:
+        await ping_database()
+        await ensure_indexes()
+        # Clé par clé ($max) : le compteur sync_version ou auth_epoch ne masque
+        # pas les numéros de documents encore jamais semés
+        await seed_counters_from_documents()
+        await backfill_search_terms()
+        await stock.backfill_indicators()
+        await ensure_default_admin()
+        pdf_renderer.start()
+        pdf_cache.open()
+    except Exception as e:
+        logger.error(f"Failed to connect to MongoDB: {e}")
+        raise
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    pdf_renderer.shutdown()
+    close_database()
 
 # Pydantic models
 class Client(BaseModel):
@@ -190,6 +222,17 @@ class ArticleStock(BaseModel):
     created_at: str = None
     updated_at: str = None
 
+class ArticleStockUpdate(BaseModel):
+    """Champs modifiables d'un article (les champs dérivés et techniques sont calculés par le serveur)"""
+    ref: Optional[str] = None
+    designation: Optional[str] = None
+    quantite_stock: Optional[float] = None
+    stock_minimum: Optional[float] = None
+    prix_achat_moyen: Optional[float] = None
+    prix_vente: Optional[float] = None
+    fournisseur_principal: Optional[str] = None
+    emplacement: Optional[str] = None
+
 class MouvementStock(BaseModel):
     mouvement_id: str = None
     article_id: str
@@ -211,12 +254,33 @@ class Achat(BaseModel):
     sous_total: float
     tva: float = 0.0
     total_ttc: float
+    devise: str = "FCFA"
     statut: str = "commandé"  # commandé, reçu, facturé
+    statut_paiement: str = "impayé"  # impayé, partiel, payé
+    montant_paye: float = 0.0
     date_reception: Optional[str] = None
     numero_bl: Optional[str] = None
     created_at: str = None
     updated_at: str = None
 
+class AchatUpdate(BaseModel):
+    """Champs modifiables d'un bon de commande non réceptionné"""
+    date_commande: Optional[str] = None
+    articles: Optional[List[ArticleDevis]] = None
+    sous_total: Optional[float] = None
+    tva: Optional[float] = None
+    total_ttc: Optional[float] = None
+
+class MouvementManuel(BaseModel):
+    type_mouvement: str  # entrée, sortie, inventaire (quantité comptée)
+    quantite: float
+    prix_unitaire: float = 0.0
+    motif: Optional[str] = None
+
+class ReceptionAchat(BaseModel):
+    date_reception: Optional[str] = None
+    numero_bl: Optional[str] = None
+
 class Paiement(BaseModel):
     paiement_id: str = None
     type_document: str  # facture, achat
@@ -258,6 +322,12 @@ class UserPermissions(BaseModel):
     user_id: str
     permissions: dict
 
+class NumeroReservation(BaseModel):
+    prefix: str  # DEV, FACT, BC
+    count: int
+    client_nom: Optional[str] = None
+    date_doc: Optional[date] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -268,17 +338,22 @@ SECRET_KEY = os.environ.get('JWT_SECRET_KEY', secrets.token_hex(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 heures
 
+# Cache des utilisateurs authentifiés, par (username, jti du token, époque
+# d'authentification). Le cache est local au worker : invalidate_principal ne
+# vide que celui du worker courant. Pour les autres workers, toute modification
+# d'utilisateur (droits, désactivation, suppression) incrémente l'époque
+# partagée AUTH_EPOCH_KEY, relue au plus toutes les AUTH_EPOCH_TTL secondes ;
+# une permission retirée reste donc effective au plus AUTH_EPOCH_TTL secondes
+# ailleurs, et PRINCIPAL_CACHE_TTL ne borne plus que la durée de vie des entrées.
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', '30'))
+principal_cache = TTLCache(ttl=PRINCIPAL_CACHE_TTL, max_entries=4096)
+AUTH_EPOCH_KEY = "auth_epoch"
+AUTH_EPOCH_TTL = float(os.environ.get('AUTH_EPOCH_TTL', '1'))
+auth_epoch_cache = TTLCache(ttl=AUTH_EPOCH_TTL, max_entries=1)
+
 # Security
 security = HTTPBearer()
 
-def hash_password(password: str) -> str:
-    """Hash a password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return hash_password(plain_password) == hashed_password
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -286,11 +361,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(16)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token and return user info"""
     try:
         token = credentials.credentials
@@ -303,16 +378,23 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # Vérifier que l'utilisateur existe toujours
-        user = users_collection.find_one({"username": username})
-        if not user or not user.get("is_active", False):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Utilisateur inactif ou inexistant",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        principal_key = (username, payload.get("jti"), await current_auth_epoch())
+        user = principal_cache.get(principal_key)
+        if user is None:
+            # Vérifier que l'utilisateur existe toujours, et que c'est bien celui
+            # pour lequel le token a été émis (pas un homonyme recréé depuis)
+            user = await users_repo.get_by_username(username, {"password": 0})
+            token_user_id = payload.get("uid")
+            if (not user or not user.get("is_active", False)
+                    or (token_user_id is not None and user.get("user_id") != token_user_id)):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Utilisateur inactif ou inexistant",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            principal_cache.set(principal_key, user)
         
-        return user
+        return dict(user)
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -320,83 +402,35 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def get_logo_image():
-    """Load the ECO PUMP AFRIK logo for PDFs"""
-    try:
-        logo_path = "/app/logo_eco_pump.png"
-        if os.path.exists(logo_path):
-            from reportlab.platypus import Image as ReportLabImage
-            # TAILLE AUGMENTÉE : 120x120 pixels (au lieu de 80x80)
-            logo_img = ReportLabImage(logo_path, width=120, height=120)
-            return logo_img
-        else:
-            logger.warning("Logo file not found, using text-based branding")
-            return None
-    except Exception as e:
-        logger.error(f"Error loading logo: {e}")
-        return None
-
-def create_pdf_header_with_logo():
-    """Create standardized PDF header with ECO PUMP AFRIK logo - PERFECTLY CENTERED"""
-    logo_img = get_logo_image()
-    
-    if logo_img:
-        # Header with actual logo - LOGO 120x120 PARFAITEMENT CENTRÉ
-        logo_table_data = [
-            [logo_img, "ECO PUMP AFRIK", ""],
-            ["", "Solutions Hydrauliques Professionnelles", ""]
-        ]
-        
-        # Colonne de gauche et droite égales pour parfait centrage du logo 120x120
-        logo_table = Table(logo_table_data, colWidths=[140, 320, 140])
-        logo_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'CENTER'),  # Logo parfaitement centré
-            ('VALIGN', (0, 0), (0, 0), 'MIDDLE'), # Logo au milieu verticalement
-            ('ALIGN', (1, 0), (1, 1), 'CENTER'),  # Texte centré horizontalement
-            ('VALIGN', (1, 0), (1, 1), 'MIDDLE'), # Texte centré verticalement
-            # FOND BLANC comme demandé
-            ('BACKGROUND', (0, 0), (2, 1), colors.white),
-            ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (1, 0), (1, 0), 24),  # Taille réduite pour équilibrer avec logo plus grand
-            ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#000000')),
-            ('FONTNAME', (1, 1), (1, 1), 'Helvetica'),
-            ('FONTSIZE', (1, 1), (1, 1), 11),
-            ('TEXTCOLOR', (1, 1), (1, 1), colors.HexColor('#0066cc')),
-            ('BOX', (0, 0), (-1, -1), 3, colors.HexColor('#0066cc')),
-            ('TOPPADDING', (0, 0), (-1, -1), 20),  # Plus d'espace pour logo plus grand
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
-        ]))
-    else:
-        # Fallback to text-based header - CENTRÉ
-        logo_table_data = [
-            ["", "ECO PUMP AFRIK", ""],
-            ["", "Solutions Hydrauliques Professionnelles", ""]
-        ]
-        
-        logo_table = Table(logo_table_data, colWidths=[140, 320, 140])  
-        logo_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (2, 1), colors.white),  # Fond blanc partout
-            ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (1, 0), (1, 0), 28),
-            ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#000000')),
-            ('ALIGN', (1, 0), (1, 1), 'CENTER'),  # Tout centré
-            ('VALIGN', (1, 0), (1, 1), 'MIDDLE'),
-            ('FONTNAME', (1, 1), (1, 1), 'Helvetica'),
-            ('FONTSIZE', (1, 1), (1, 1), 14),
-            ('TEXTCOLOR', (1, 1), (1, 1), colors.HexColor('#0066cc')),
-            ('BOX', (0, 0), (-1, -1), 3, colors.HexColor('#0066cc')),
-            ('TOPPADDING', (0, 0), (-1, -1), 20),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
-        ]))
-    
-    return logo_table
+async def current_auth_epoch() -> int:
+    """Shared authentication epoch, re-read at most every AUTH_EPOCH_TTL seconds"""
+    epoch = auth_epoch_cache.get(AUTH_EPOCH_KEY)
+    if epoch is None:
+        epoch = await counters_repo.current(AUTH_EPOCH_KEY)
+        auth_epoch_cache.set(AUTH_EPOCH_KEY, epoch)
+    return epoch
+
+async def invalidate_principal(user_id: str):
+    """Forget the cached sessions of a user (modified, deactivated or deleted) on every worker"""
+    # L'époque incrémentée périme les entrées des autres workers ; ce worker
+    # les oublie immédiatement
+    await counters_repo.increment(AUTH_EPOCH_KEY)
+    auth_epoch_cache.invalidate()
+    principal_cache.invalidate_matching(lambda user: user.get("user_id") == user_id)
 
 # Helper functions
 def generate_id():
     return str(uuid.uuid4())
 
-def generate_numero(prefix: str, client_nom: str = None, date_doc: date = None):
-    """Generate document number in format PREFIX/CLIENT/DDMMYYYY/NNN"""
+# Champ du numéro de document pour chaque préfixe
+NUMERO_FIELDS = {
+    "DEV": ("numero_devis", devis_repo),
+    "FACT": ("numero_facture", factures_repo),
+    "BC": ("numero_bon_commande", achats_repo),
+}
+
+def numero_base(prefix: str, client_nom: str = None, date_doc: date = None) -> str:
+    """Base of a document number: PREFIX/CLIENT/DDMMYYYY (also the counter key)"""
     if date_doc is None:
         date_doc = date.today()
     
@@ -404,34 +438,129 @@ def generate_numero(prefix: str, client_nom: str = None, date_doc: date = None):
     
     if client_nom:
         client_clean = client_nom.upper()[:10].replace(" ", "")
-        base_format = f"{prefix}/{client_clean}/{date_str}"
-    else:
-        base_format = f"{prefix}/{date_str}"
+        return f"{prefix}/{client_clean}/{date_str}"
+    return f"{prefix}/{date_str}"
+
+async def generate_numero(prefix: str, client_nom: str = None, date_doc: date = None):
+    """Generate document number in format PREFIX/CLIENT/DDMMYYYY/NNN"""
+    base_format = numero_base(prefix, client_nom, date_doc)
     
-    # Get next sequence number
-    if prefix == "DEV":
-        collection = devis_collection
-        query_field = "numero_devis"
-    elif prefix == "FACT":
-        collection = factures_collection
-        query_field = "numero_facture"
-    elif prefix == "BC":
-        collection = achats_collection
-        query_field = "numero_bon_commande"
-    else:
-        return f"{base_format}/001"
+    # Séquence atomique : un $inc sur le compteur, sans scan ni doublon
+    sequence = await counters_repo.increment(base_format)
+    return f"{base_format}/{str(sequence).zfill(3)}"
+
+async def reserve_numeros(prefix: str, count: int, client_nom: str = None, date_doc: date = None) -> List[str]:
+    """Reserve `count` consecutive numbers in a single counter update (bulk imports)"""
+    base_format = numero_base(prefix, client_nom, date_doc)
+    
+    last = await counters_repo.increment(base_format, count)
+    return [f"{base_format}/{str(seq).zfill(3)}" for seq in range(last - count + 1, last + 1)]
+
+async def seed_counters_from_documents() -> dict:
+    """Raise each counter to the highest number already issued (idempotent, never lowers a counter)"""
+    highest = {}
+    
+    for prefix, (field, repo) in NUMERO_FIELDS.items():
+        async for documents in repo.find_batches({field: {"$type": "string"}}, {field: 1, "_id": 0}):
+            for document in documents:
+                base_format, _, sequence = document[field].rpartition("/")
+                if base_format and sequence.isdigit():
+                    highest[base_format] = max(highest.get(base_format, 0), int(sequence))
     
-    # Count existing documents with same pattern
-    pattern = f"{base_format}/"
-    count = collection.count_documents({query_field: {"$regex": f"^{pattern}"}})
+    for base_format, sequence in highest.items():
+        await counters_repo.seed(base_format, sequence)
     
-    sequence = str(count + 1).zfill(3)
-    return f"{base_format}/{sequence}"
+    logger.info(f"Seeded {len(highest)} document counters from existing numbers")
+    return {"counters_seeded": len(highest)}
 
 def calculate_tva(montant: float, taux_tva: float = 0.18):
     """Calculate TVA (18% by default)"""
     return montant * taux_tva
 
+# Pagination des listes
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Champs internes jamais renvoyés par l'API (exclus dès la requête pour les listes)
+HIDDEN_FIELDS = {"_id": 0, "search_terms": 0}
+
+def public_document(document: dict) -> dict:
+    """Document as returned by the API, without HIDDEN_FIELDS"""
+    return {key: value for key, value in document.items() if key not in HIDDEN_FIELDS}
+
+def build_projection(fields: Optional[str] = None, summary: bool = False) -> dict:
+    """Projection MongoDB à partir de ?fields=a,b,c et ?summary=true (sans les articles)"""
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip() and f.strip() not in HIDDEN_FIELDS]
+        if summary:
+            selected = [f for f in selected if f != "articles"]
+        if selected:
+            return {**{f: 1 for f in selected}, "_id": 0}
+    if summary:
+        return {"articles": 0, **HIDDEN_FIELDS}
+    return dict(HIDDEN_FIELDS)
+
+async def list_documents(repo, key: str, limit: Optional[int], cursor: Optional[str], fields: Optional[str],
+                         summary: bool, all_items: bool, legacy_sort: Optional[list] = None,
+                         projection: Optional[dict] = None) -> dict:
+    """Liste complète (comportement historique), paginée par curseur (created_at + id) si ?limit ou ?cursor"""
+    projection = projection or build_projection(fields, summary)
+    
+    if all_items or (limit is None and cursor is None):
+        # Ancien comportement non paginé : reste le défaut pour les clients existants
+        documents = await repo.find_many({}, projection, sort=legacy_sort)
+        next_cursor = None
+    else:
+        limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+        try:
+            documents, next_cursor = await repo.find_page({}, projection, cursor=cursor, limit=limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    
+    return {key: documents, "next_cursor": next_cursor, "has_more": next_cursor is not None}
+
+async def faceted_search(repo, query: dict, facet_fields: List[str], sums: dict,
+                         limit: int, skip: int = 0) -> dict:
+    """Page, exact total, counts per facet value and sums of amounts in one aggregation
+    
+    $match and $sort precede the $facet so that they can use the indexes
+    (period, amount, created_at); each facet then works on the matched set.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    amounts = {name: {"$sum": expression} for name, expression in sums.items()}
+    facets = {
+        "page": [{"$skip": max(skip, 0)}, {"$limit": limit}, {"$project": HIDDEN_FIELDS}],
+        "total": [{"$group": {"_id": None, "count": {"$sum": 1}, **amounts}}],
+    }
+    for field in facet_fields:
+        facets[f"by_{field}"] = [
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}, **amounts}},
+            {"$sort": {"count": -1}},
+        ]
+    
+    rows = await repo.aggregate([
+        {"$match": query},
+        {"$sort": {"created_at": -1}},
+        {"$facet": facets},
+    ])
+    result = rows[0] if rows else {}
+    
+    page = result.get("page", [])
+    totals = (result.get("total") or [{}])[0]
+    
+    return {
+        "items": page,
+        "total": totals.get("count", 0),
+        "totaux": {name: totals.get(name, 0) for name in sums},
+        "facets": {
+            field: {
+                ("" if group["_id"] is None else str(group["_id"])): {"count": group["count"], **{name: group[name] for name in sums}}
+                for group in result.get(f"by_{field}", [])
+            }
+            for field in facet_fields
+        },
+    }
+
 # API Routes
 @app.get("/api/health")
 async def health_check():
@@ -451,24 +580,31 @@ async def create_client(client: Client):
         client_data["updated_at"] = current_time.isoformat()
         client_data["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         
-        result = clients_collection.insert_one(client_data)
+        result = await clients_repo.insert_one(with_search_terms("clients", client_data))
         
         if result.inserted_id:
-            client_data["_id"] = str(result.inserted_id)
-            return {"success": True, "client": client_data}
+            await dashboard_stats.record_client(client_data["devise"])
+            search.invalidate_suggestions()
+            return {"success": True, "client": public_document(client_data)}
         else:
             raise HTTPException(status_code=500, detail="Erreur lors de la création du client")
     except Exception as e:
         logger.error(f"Error creating client: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/clients", response_model=dict)
-async def get_clients():
+@app.get("/api/clients", response_model=dict, dependencies=[Depends(conditional(clients_repo))])
+async def get_clients(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
     try:
-        clients = list(clients_collection.find({}))
-        for client in clients:
-            client["_id"] = str(client["_id"])
-        return {"clients": clients}
+        page = await list_documents(clients_repo, "clients", limit, cursor, fields, summary, all_items)
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching clients: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -476,12 +612,11 @@ async def get_clients():
 @app.get("/api/clients/{client_id}", response_model=dict)
 async def get_client(client_id: str):
     try:
-        client = clients_collection.find_one({"client_id": client_id})
+        client = await clients_repo.find_one({"client_id": client_id})
         if not client:
             raise HTTPException(status_code=404, detail="Client non trouvé")
         
-        client["_id"] = str(client["_id"])
-        return {"client": client}
+        return {"client": public_document(client)}
     except HTTPException:
         raise
     except Exception as e:
@@ -493,18 +628,22 @@ async def update_client(client_id: str, client_update: dict):
     try:
         client_update["updated_at"] = datetime.now().isoformat()
         
-        result = clients_collection.update_one(
+        previous_client = await clients_repo.find_one_and_update(
             {"client_id": client_id},
             {"$set": client_update}
         )
         
-        if result.matched_count == 0:
+        if previous_client is None:
             raise HTTPException(status_code=404, detail="Client non trouvé")
         
-        updated_client = clients_collection.find_one({"client_id": client_id})
-        updated_client["_id"] = str(updated_client["_id"])
+        if "devise" in client_update:
+            await dashboard_stats.record_client_devise_change(previous_client.get("devise"), client_update["devise"])
+        
+        updated_client = await clients_repo.find_one({"client_id": client_id})
+        await search.refresh_search_terms("clients", updated_client)
+        search.invalidate_suggestions()
         
-        return {"success": True, "client": updated_client}
+        return {"success": True, "client": public_document(updated_client)}
     except HTTPException:
         raise
     except Exception as e:
@@ -515,8 +654,8 @@ async def update_client(client_id: str, client_update: dict):
 async def delete_client(client_id: str):
     try:
         # Check if client has devis or factures
-        devis_count = devis_collection.count_documents({"client_id": client_id})
-        factures_count = factures_collection.count_documents({"client_id": client_id})
+        devis_count = await devis_repo.count({"client_id": client_id})
+        factures_count = await factures_repo.count({"client_id": client_id})
         
         if devis_count > 0 or factures_count > 0:
             raise HTTPException(
@@ -524,11 +663,14 @@ async def delete_client(client_id: str):
                 detail=f"Impossible de supprimer le client: {devis_count} devis et {factures_count} factures associé(s)"
             )
         
-        result = clients_collection.delete_one({"client_id": client_id})
+        deleted_client = await clients_repo.find_one_and_delete({"client_id": client_id})
         
-        if result.deleted_count == 0:
+        if deleted_client is None:
             raise HTTPException(status_code=404, detail="Client non trouvé")
         
+        await dashboard_stats.record_client(deleted_client.get("devise"), -1)
+        search.invalidate_suggestions()
+        
         return {"success": True, "message": "Client supprimé avec succès"}
     except HTTPException:
         raise
@@ -552,24 +694,30 @@ async def create_fournisseur(fournisseur: Fournisseur):
         fournisseur_data["updated_at"] = current_time.isoformat()
         fournisseur_data["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         
-        result = fournisseurs_collection.insert_one(fournisseur_data)
+        result = await fournisseurs_repo.insert_one(fournisseur_data)
         
         if result.inserted_id:
-            fournisseur_data["_id"] = str(result.inserted_id)
-            return {"success": True, "fournisseur": fournisseur_data}
+            await dashboard_stats.record_fournisseur()
+            return {"success": True, "fournisseur": public_document(fournisseur_data)}
         else:
             raise HTTPException(status_code=500, detail="Erreur lors de la création du fournisseur")
     except Exception as e:
         logger.error(f"Error creating fournisseur: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/fournisseurs", response_model=dict)
-async def get_fournisseurs():
+@app.get("/api/fournisseurs", response_model=dict, dependencies=[Depends(conditional(fournisseurs_repo))])
+async def get_fournisseurs(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
     try:
-        fournisseurs = list(fournisseurs_collection.find({}))
-        for fournisseur in fournisseurs:
-            fournisseur["_id"] = str(fournisseur["_id"])
-        return {"fournisseurs": fournisseurs}
+        page = await list_documents(fournisseurs_repo, "fournisseurs", limit, cursor, fields, summary, all_items)
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching fournisseurs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -581,7 +729,7 @@ async def get_fournisseurs():
 async def create_devis(devis: Devis):
     try:
         # Get client info
-        client = clients_collection.find_one({"client_id": devis.client_id})
+        client = await clients_repo.find_one({"client_id": devis.client_id})
         if not client:
             raise HTTPException(status_code=404, detail="Client non trouvé")
         
@@ -590,18 +738,18 @@ async def create_devis(devis: Devis):
         
         devis_data["devis_id"] = generate_id()
         devis_data["date_devis"] = date.today().isoformat()
-        devis_data["numero_devis"] = generate_numero("DEV", devis.client_nom, date.today())
+        devis_data["numero_devis"] = await generate_numero("DEV", devis.client_nom, date.today())
         devis_data["devise"] = client["devise"]
         devis_data["created_at"] = current_time.isoformat()
         devis_data["created_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         devis_data["updated_at"] = current_time.isoformat()
         devis_data["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         
-        result = devis_collection.insert_one(devis_data)
+        result = await devis_repo.insert_one(with_search_terms("devis", devis_data))
         
         if result.inserted_id:
-            devis_data["_id"] = str(result.inserted_id)
-            return {"success": True, "devis": devis_data}
+            await dashboard_stats.record_devis(devis_data["total_ttc"], current_time)
+            return {"success": True, "devis": public_document(devis_data)}
         else:
             raise HTTPException(status_code=500, detail="Erreur lors de la création du devis")
     except HTTPException:
@@ -610,13 +758,20 @@ async def create_devis(devis: Devis):
         logger.error(f"Error creating devis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/devis", response_model=dict)
-async def get_devis():
+@app.get("/api/devis", response_model=dict, dependencies=[Depends(conditional(devis_repo))])
+async def get_devis(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
     try:
-        devis = list(devis_collection.find({}).sort("created_at", -1))
-        for d in devis:
-            d["_id"] = str(d["_id"])
-        return {"devis": devis}
+        page = await list_documents(devis_repo, "devis", limit, cursor, fields, summary, all_items,
+                                    legacy_sort=[("created_at", -1)])
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching devis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -624,12 +779,11 @@ async def get_devis():
 @app.get("/api/devis/{devis_id}", response_model=dict)
 async def get_devis_by_id(devis_id: str):
     try:
-        devis = devis_collection.find_one({"devis_id": devis_id})
+        devis = await devis_repo.find_one({"devis_id": devis_id})
         if not devis:
             raise HTTPException(status_code=404, detail="Devis non trouvé")
         
-        devis["_id"] = str(devis["_id"])
-        return {"devis": devis}
+        return {"devis": public_document(devis)}
     except HTTPException:
         raise
     except Exception as e:
@@ -640,14 +794,26 @@ async def get_devis_by_id(devis_id: str):
 async def convert_devis_to_facture(devis_id: str):
     try:
         # Get devis
-        devis = devis_collection.find_one({"devis_id": devis_id})
+        devis = await devis_repo.find_one({"devis_id": devis_id})
         if not devis:
             raise HTTPException(status_code=404, detail="Devis non trouvé")
         
+        # Conversion reprise après un échec : on complète la facture existante au lieu d'en créer une autre
+        facture_existante = await factures_repo.find_one({"devis_id": devis_id}, dict(HIDDEN_FIELDS))
+        if facture_existante:
+            await stock.document_movements(facture_existante["articles"], "sortie", "facture",
+                                           facture_existante["facture_id"], motif=facture_existante["numero_facture"])
+            if devis.get("statut") != "converti":
+                await devis_repo.update_one(
+                    {"devis_id": devis_id},
+                    {"$set": {"statut": "converti", "updated_at": datetime.now().isoformat()}}
+                )
+            return {"success": True, "facture": facture_existante}
+        
         # Create facture from devis
         facture_data = {
             "facture_id": generate_id(),
-            "numero_facture": generate_numero("FACT", devis["client_nom"], date.today()),
+            "numero_facture": await generate_numero("FACT", devis["client_nom"], date.today()),
             "date_facture": date.today().isoformat(),
             "devis_id": devis_id,
             "client_id": devis["client_id"],
@@ -669,17 +835,27 @@ async def convert_devis_to_facture(devis_id: str):
             "updated_at": datetime.now().isoformat()
         }
         
-        result = factures_collection.insert_one(facture_data)
+        # Facture et sorties de stock dans la même transaction (si disponible)
+        async def write(session):
+            result = await factures_repo.insert_one(with_search_terms("factures", facture_data), session=session)
+            movements = await stock.write_document_movements(
+                session, facture_data["articles"], "sortie", "facture",
+                facture_data["facture_id"], motif=facture_data["numero_facture"]
+            )
+            return result, movements
+        
+        result, movements = await run_in_transaction(write)
         
         if result.inserted_id:
+            await stock.movements_applied(movements)
             # Update devis status
-            devis_collection.update_one(
+            await devis_repo.update_one(
                 {"devis_id": devis_id},
                 {"$set": {"statut": "converti", "updated_at": datetime.now().isoformat()}}
             )
+            await dashboard_stats.record_facture(facture_data["total_ttc"], datetime.now())
             
-            facture_data["_id"] = str(result.inserted_id)
-            return {"success": True, "facture": facture_data}
+            return {"success": True, "facture": public_document(facture_data)}
         else:
             raise HTTPException(status_code=500, detail="Erreur lors de la conversion")
     except HTTPException:
@@ -695,7 +871,7 @@ async def convert_devis_to_facture(devis_id: str):
 async def create_facture(facture: Facture):
     try:
         # Get client info
-        client = clients_collection.find_one({"client_id": facture.client_id})
+        client = await clients_repo.find_one({"client_id": facture.client_id})
         if not client:
             raise HTTPException(status_code=404, detail="Client non trouvé")
         
@@ -704,7 +880,7 @@ async def create_facture(facture: Facture):
         
         # Generate facture ID and number
         facture_data["facture_id"] = generate_id()
-        facture_data["numero_facture"] = generate_numero("FACT", facture.client_nom, date.today())
+        facture_data["numero_facture"] = await generate_numero("FACT", facture.client_nom, date.today())
         facture_data["date_facture"] = date.today().isoformat()
         facture_data["created_at"] = current_time.isoformat()
         facture_data["created_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
@@ -716,11 +892,21 @@ async def create_facture(facture: Facture):
         facture_data["statut_paiement"] = "impayé"
         facture_data["montant_paye"] = 0.0
         
-        result = factures_collection.insert_one(facture_data)
+        # Facture et sorties de stock dans la même transaction (si disponible)
+        async def write(session):
+            result = await factures_repo.insert_one(with_search_terms("factures", facture_data), session=session)
+            movements = await stock.write_document_movements(
+                session, facture_data["articles"], "sortie", "facture",
+                facture_data["facture_id"], motif=facture_data["numero_facture"]
+            )
+            return result, movements
+        
+        result, movements = await run_in_transaction(write)
         
         if result.inserted_id:
-            facture_data["_id"] = str(result.inserted_id)
-            return {"success": True, "facture": facture_data}
+            await stock.movements_applied(movements)
+            await dashboard_stats.record_facture(facture_data["total_ttc"], current_time)
+            return {"success": True, "facture": public_document(facture_data)}
         else:
             raise HTTPException(status_code=500, detail="Erreur lors de la création de la facture")
     except HTTPException:
@@ -729,27 +915,204 @@ async def create_facture(facture: Facture):
         logger.error(f"Error creating facture: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/factures", response_model=dict)
-async def get_factures():
+@app.get("/api/factures", response_model=dict, dependencies=[Depends(conditional(factures_repo))])
+async def get_factures(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
     try:
-        factures = list(factures_collection.find({}).sort("created_at", -1))
-        for f in factures:
-            f["_id"] = str(f["_id"])
-        return {"factures": factures}
+        page = await list_documents(factures_repo, "factures", limit, cursor, fields, summary, all_items,
+                                    legacy_sort=[("created_at", -1)])
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching factures: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ========================================
+# ACHATS ENDPOINTS
+# ========================================
+@app.post("/api/achats", response_model=dict)
+async def create_achat(achat: Achat):
+    try:
+        # Get fournisseur info
+        fournisseur = await fournisseurs_repo.find_one({"fournisseur_id": achat.fournisseur_id})
+        if not fournisseur:
+            raise HTTPException(status_code=404, detail="Fournisseur non trouvé")
+        
+        achat_data = achat.dict()
+        current_time = datetime.now()
+        
+        # Generate achat ID and purchase order number
+        achat_data["achat_id"] = generate_id()
+        achat_data["numero_bon_commande"] = await generate_numero("BC", achat.fournisseur_nom, date.today())
+        achat_data["date_commande"] = achat.date_commande or date.today().isoformat()
+        achat_data["devise"] = fournisseur.get("devise", "FCFA")
+        achat_data["statut"] = "commandé"
+        achat_data["statut_paiement"] = "impayé"
+        achat_data["montant_paye"] = 0.0
+        achat_data["created_at"] = current_time.isoformat()
+        achat_data["created_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
+        achat_data["updated_at"] = current_time.isoformat()
+        achat_data["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
+        
+        result = await achats_repo.insert_one(achat_data)
+        
+        if result.inserted_id:
+            return {"success": True, "achat": public_document(achat_data)}
+        else:
+            raise HTTPException(status_code=500, detail="Erreur lors de la création du bon de commande")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating achat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/achats", response_model=dict, dependencies=[Depends(conditional(achats_repo))])
+async def get_achats(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
+    try:
+        page = await list_documents(achats_repo, "achats", limit, cursor, fields, summary, all_items,
+                                    legacy_sort=[("created_at", -1)])
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching achats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/achats/{achat_id}", response_model=dict)
+async def get_achat(achat_id: str):
+    try:
+        achat = await achats_repo.find_one({"achat_id": achat_id})
+        if not achat:
+            raise HTTPException(status_code=404, detail="Bon de commande non trouvé")
+        
+        return {"achat": public_document(achat)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching achat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/achats/{achat_id}", response_model=dict)
+async def update_achat(achat_id: str, achat_update: AchatUpdate):
+    """Modifier un bon de commande tant qu'il n'est pas réceptionné"""
+    try:
+        current_time = datetime.now()
+        update = achat_update.dict(exclude_unset=True)
+        update["updated_at"] = current_time.isoformat()
+        update["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
+        
+        # Condition sur le statut : une réception concurrente l'emporte sur la modification
+        achat = await achats_repo.find_one_and_update(
+            {"achat_id": achat_id, "statut": "commandé"},
+            {"$set": update},
+            after=True
+        )
+        if achat is None:
+            if await achats_repo.count({"achat_id": achat_id}) == 0:
+                raise HTTPException(status_code=404, detail="Bon de commande non trouvé")
+            raise HTTPException(status_code=400, detail="Seul un bon de commande non réceptionné peut être modifié")
+        
+        return {"success": True, "achat": public_document(achat)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating achat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/achats/{achat_id}", response_model=dict)
+async def delete_achat(achat_id: str):
+    """Annuler un bon de commande ni réceptionné ni payé (suppression, tombstone pour la synchronisation)"""
+    try:
+        deleted_achat = await achats_repo.find_one_and_delete(
+            {"achat_id": achat_id, "statut": "commandé", "montant_paye": 0}
+        )
+        if deleted_achat is None:
+            if await achats_repo.count({"achat_id": achat_id}) == 0:
+                raise HTTPException(status_code=404, detail="Bon de commande non trouvé")
+            raise HTTPException(
+                status_code=400,
+                detail="Impossible d'annuler un bon de commande réceptionné ou ayant des paiements"
+            )
+        
+        return {"success": True, "message": "Bon de commande annulé avec succès"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting achat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/achats/{achat_id}/reception", response_model=dict)
+async def receive_achat(achat_id: str, reception: ReceptionAchat):
+    """Réceptionner un bon de commande (statut commandé -> reçu)"""
+    try:
+        current_time = datetime.now()
+        update = {
+            "statut": "reçu",
+            "date_reception": reception.date_reception or date.today().isoformat(),
+            "numero_bl": reception.numero_bl,
+            "updated_at": current_time.isoformat(),
+            "updated_at_formatted": current_time.strftime("%d/%m/%Y à %H:%M:%S")
+        }
+        
+        async def write(session):
+            # Condition sur le statut : une double réception concurrente ne passe qu'une fois
+            achat = await achats_repo.find_one_and_update(
+                {"achat_id": achat_id, "statut": "commandé"},
+                {"$set": update},
+                after=True,
+                session=session
+            )
+            if achat is None:
+                return None, []
+            # Entrées en stock valorisées au prix d'achat (prix moyen pondéré), dans la même transaction
+            movements = await stock.write_document_movements(
+                session, achat.get("articles", []), "entrée", "achat",
+                achat_id, motif=achat.get("numero_bon_commande")
+            )
+            return achat, movements
+        
+        achat, movements = await run_in_transaction(write)
+        if achat is None:
+            if await achats_repo.count({"achat_id": achat_id}) == 0:
+                raise HTTPException(status_code=404, detail="Bon de commande non trouvé")
+            raise HTTPException(status_code=400, detail="Bon de commande déjà réceptionné")
+        await stock.movements_applied(movements)
+        
+        return {"success": True, "achat": public_document(achat)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error receiving achat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================
 # STOCK ENDPOINTS
 # ========================================
-@app.get("/api/stock", response_model=dict)
-async def get_stock():
+@app.get("/api/stock", response_model=dict, dependencies=[Depends(conditional(stock_repo))])
+async def get_stock(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
     try:
-        articles = list(stock_collection.find({}))
-        for article in articles:
-            article["_id"] = str(article["_id"])
-        return {"articles": articles}
+        page = await list_documents(stock_repo, "articles", limit, cursor, fields, summary, all_items)
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching stock: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -767,60 +1130,126 @@ async def create_article_stock(article: ArticleStock):
         article_data["updated_at"] = current_time.isoformat()
         article_data["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         
-        result = stock_collection.insert_one(article_data)
-        article_data["_id"] = str(result.inserted_id)
+        # Le stock initial est enregistré comme un premier mouvement d'entrée
+        quantite_initiale = article_data["quantite_stock"]
+        article_data["quantite_stock"] = 0.0
+        
+        result = await stock_repo.insert_one(stock.with_indicators(with_search_terms("stock", article_data)))
+        await dashboard_stats.record_stock_alert(False, dashboard_stats.is_stock_alert(article_data))
+        search.invalidate_suggestions()
+        if quantite_initiale:
+            await stock.apply_movement(article_data["article_id"], "entrée", quantite_initiale,
+                                       prix_unitaire=article_data["prix_achat_moyen"], motif="Stock initial")
+            article_data["quantite_stock"] = quantite_initiale
+            stock.with_indicators(article_data)
         
-        return {"success": True, "article": article_data}
+        return {"success": True, "article": public_document(article_data)}
     except Exception as e:
         logger.error(f"Error creating article: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/stock/{article_id}", response_model=dict)
-async def update_stock_article(article_id: str, article_update: dict):
+async def update_stock_article(article_id: str, article: ArticleStockUpdate):
     try:
         current_time = datetime.now()
         
-        # Remove immutable fields from update data
-        immutable_fields = ['_id', 'article_id', 'created_at', 'created_at_formatted']
-        for field in immutable_fields:
-            if field in article_update:
-                del article_update[field]
+        # Seuls les champs modifiables envoyés par le client sont écrits
+        article_update = article.dict(exclude_unset=True)
+        
+        # La quantité ne change que par mouvement (ici un inventaire), jamais par $set concurrent
+        quantite_comptee = article_update.pop("quantite_stock", None)
         
         # Add updated timestamp
         article_update["updated_at"] = current_time.isoformat()
         article_update["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         
-        result = stock_collection.update_one(
+        previous_article = await stock_repo.find_one_and_update(
             {"article_id": article_id},
-            {"$set": article_update}
+            stock.fields_update(article_update)
         )
         
-        if result.matched_count == 0:
+        if previous_article is None:
             raise HTTPException(status_code=404, detail="Article non trouvé")
         
-        updated_article = stock_collection.find_one({"article_id": article_id})
-        if updated_article:
-            updated_article["_id"] = str(updated_article["_id"])
+        updated_article = stock.with_indicators({**previous_article, **article_update})
+        await dashboard_stats.record_stock_alert(
+            dashboard_stats.is_stock_alert(previous_article),
+            dashboard_stats.is_stock_alert(updated_article)
+        )
+        await search.refresh_search_terms("stock", updated_article)
+        search.invalidate_suggestions()
+        
+        if quantite_comptee is not None and float(quantite_comptee) != previous_article.get("quantite_stock", 0):
+            mouvement = await stock.apply_movement(article_id, "inventaire", float(quantite_comptee),
+                                                   motif="Modification de l'article")
+            updated_article["quantite_stock"] = mouvement["quantite_apres"]
+            stock.with_indicators(updated_article)
         
-        return {"success": True, "article": updated_article}
+        return {"success": True, "article": public_document(updated_article)}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error updating stock article: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la mise à jour: {str(e)}")
 
-@app.get("/api/stock/alerts", response_model=dict)
-async def get_stock_alerts():
+@app.post("/api/stock/{article_id}/mouvements", response_model=dict)
+async def create_mouvement_stock(article_id: str, mouvement: MouvementManuel):
+    """Entrée, sortie ou inventaire manuel d'un article"""
     try:
-        # Find articles with stock below minimum
-        alerts = list(stock_collection.find({
-            "$expr": {"$lt": ["$quantite_stock", "$stock_minimum"]}
-        }))
-        
-        for alert in alerts:
-            alert["_id"] = str(alert["_id"])
+        if mouvement.type_mouvement not in stock.MOUVEMENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Type de mouvement invalide: {mouvement.type_mouvement}")
+        if mouvement.quantite < 0 or (mouvement.quantite == 0 and mouvement.type_mouvement != "inventaire"):
+            raise HTTPException(status_code=400, detail="La quantité doit être positive")
+        
+        mouvement_data = await stock.apply_movement(
+            article_id, mouvement.type_mouvement, mouvement.quantite,
+            prix_unitaire=mouvement.prix_unitaire, motif=mouvement.motif
+        )
+        return {"success": True, "mouvement": mouvement_data}
+    except HTTPException:
+        raise
+    except ArticleNotFound:
+        raise HTTPException(status_code=404, detail="Article non trouvé")
+    except Exception as e:
+        logger.error(f"Error creating stock movement: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/stock/{article_id}/mouvements", response_model=dict)
+async def get_mouvements_stock(article_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Historique des mouvements d'un article, du plus récent au plus ancien (pagination par curseur)"""
+    try:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        try:
+            mouvements, next_cursor = await mouvements_repo.find_page(
+                {"article_id": article_id}, {"_id": 0}, cursor=cursor, limit=limit
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
         
-        return {"alerts": alerts}
+        return {"mouvements": mouvements, "next_cursor": next_cursor, "has_more": next_cursor is not None}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching stock movements: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/stock/valuation", response_model=dict, dependencies=[Depends(conditional(stock_repo))])
+async def get_stock_valuation():
+    """Valeur du stock (quantité * prix d'achat moyen) totale, par emplacement et par fournisseur"""
+    try:
+        return {"success": True, **await stock.valuation()}
+    except Exception as e:
+        logger.error(f"Error computing stock valuation: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def list_stock_alerts() -> list:
+    """Articles below their minimum stock (partial index on en_alerte)"""
+    return await stock_repo.find_many({"en_alerte": True}, HIDDEN_FIELDS, sort=[("created_at", -1)])
+
+@app.get("/api/stock/alerts", response_model=dict, dependencies=[Depends(conditional(stock_repo))])
+async def get_stock_alerts():
+    try:
+        return FastJSONResponse({"alerts": await list_stock_alerts()})
     except Exception as e:
         logger.error(f"Error fetching stock alerts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -842,110 +1271,236 @@ async def create_paiement(paiement: Paiement):
         paiement_data["updated_at"] = current_time.isoformat()
         paiement_data["updated_at_formatted"] = current_time.strftime("%d/%m/%Y à %H:%M:%S")
         
-        result = paiements_collection.insert_one(paiement_data)
+        # Insertion du paiement et montant payé du document en une mise à jour atomique
+        previous = await record_payment(paiement_data)
         
-        if result.inserted_id:
-            # Update facture payment status if it's a facture payment
-            if paiement.type_document == "facture":
-                # Get current facture
-                facture = factures_collection.find_one({"facture_id": paiement.document_id})
-                if facture:
-                    new_montant_paye = facture.get("montant_paye", 0) + paiement.montant
-                    
-                    if new_montant_paye >= facture["total_ttc"]:
-                        statut_paiement = "payé"
-                    else:
-                        statut_paiement = "partiel"
-                    
-                    factures_collection.update_one(
-                        {"facture_id": paiement.document_id},
-                        {"$set": {
-                            "montant_paye": new_montant_paye,
-                            "statut_paiement": statut_paiement,
-                            "updated_at": datetime.now().isoformat()
-                        }}
-                    )
-            
-            paiement_data["_id"] = str(result.inserted_id)
-            return {"success": True, "paiement": paiement_data}
-        else:
-            raise HTTPException(status_code=500, detail="Erreur lors de l'enregistrement du paiement")
+        if paiement.type_document == "facture":
+            await dashboard_stats.record_encaissement(reduced_due(previous, paiement.montant))
+        
+        return {"success": True, "paiement": public_document(paiement_data)}
+    except DocumentNotFound as e:
+        detail = "Facture non trouvée" if e.type_document == "facture" else "Bon de commande non trouvé"
+        raise HTTPException(status_code=404, detail=detail)
     except Exception as e:
         logger.error(f"Error creating paiement: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/paiements", response_model=dict)
-async def get_paiements():
+@app.get("/api/paiements", response_model=dict, dependencies=[Depends(conditional(paiements_repo))])
+async def get_paiements(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    all_items: bool = Query(False, alias="all")
+):
     try:
-        paiements = list(paiements_collection.find({}).sort("created_at", -1))
-        for p in paiements:
-            p["_id"] = str(p["_id"])
-        return {"paiements": paiements}
+        page = await list_documents(paiements_repo, "paiements", limit, cursor, fields, summary, all_items,
+                                    legacy_sort=[("created_at", -1)])
+        return FastJSONResponse(page)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching paiements: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/paiements/import", response_model=dict)
+async def import_paiements(request: Request, dry_run: bool = False):
+    """Importer un relevé (CSV ou JSON) : rapprochement avec les factures et rapport ligne par ligne
+    
+    Fichier CSV/JSON en multipart (champ `file`), corps text/csv, ou corps JSON
+    (liste de lignes ou {"paiements": [...]}). Colonnes : numero_facture,
+    reference_paiement, montant, devise, mode_paiement, date_paiement.
+    ?dry_run=true rapproche sans rien enregistrer.
+    """
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise HTTPException(status_code=400, detail="Fichier manquant (champ 'file')")
+            content = await upload.read()
+            if (upload.filename or "").lower().endswith(".json") or "json" in (upload.content_type or ""):
+                payload = json.loads(content)
+            else:
+                payload = parse_csv(content)
+        elif "csv" in content_type or content_type.startswith("text/plain"):
+            payload = parse_csv(await request.body())
+        else:
+            payload = await request.json()
+        
+        lines = payload.get("paiements") if isinstance(payload, dict) else payload
+        if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+            raise HTTPException(status_code=400, detail="Format d'import non valide : liste de lignes attendue")
+        
+        result = await import_payments(lines, dry_run=dry_run)
+        
+        if not dry_run:
+            await dashboard_stats.record_encaissement(result["encaissement"])
+        
+        return {"success": True, **result}
+    except HTTPException:
+        raise
+    except (InvalidImport, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing paiements: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================
 # DASHBOARD STATS
 # ========================================
 @app.get("/api/dashboard/stats", response_model=dict)
 async def get_dashboard_stats():
     try:
-        current_month_start = datetime.now().replace(day=1)
-        
-        stats = {
-            "total_clients": clients_collection.count_documents({}),
-            "total_fournisseurs": fournisseurs_collection.count_documents({}),
-            "total_devis": devis_collection.count_documents({}),
-            "total_factures": factures_collection.count_documents({}),
-            "devis_ce_mois": devis_collection.count_documents({
-                "created_at": {"$gte": current_month_start.isoformat()}
-            }),
-            "factures_ce_mois": factures_collection.count_documents({
-                "created_at": {"$gte": current_month_start.isoformat()}
-            }),
-            "montant_devis_mois": 0,
-            "montant_factures_mois": 0,
-            "montant_a_encaisser": 0,
-            "clients_fcfa": clients_collection.count_documents({"devise": "FCFA"}),
-            "clients_eur": clients_collection.count_documents({"devise": "EUR"}),
-            "stock_alerts": stock_collection.count_documents({
-                "$expr": {"$lt": ["$quantite_stock", "$stock_minimum"]}
-            })
-        }
+        # Document matérialisé mis à jour par les handlers, derrière un cache TTL
+        stats = await dashboard_stats.get_dashboard_stats()
+        return {"stats": stats}
+    except Exception as e:
+        logger.error(f"Error fetching dashboard stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/dashboard/stats/rebuild", response_model=dict)
+async def rebuild_dashboard_stats(current_user: dict = Depends(verify_token)):
+    """Recalculer les statistiques du tableau de bord depuis les collections (admin uniquement)"""
+    try:
+        if current_user["role"] != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Seuls les administrateurs peuvent recalculer les statistiques"
+            )
         
-        # Calculate monthly amounts
-        devis_pipeline = [
-            {"$match": {"created_at": {"$gte": current_month_start.isoformat()}}},
-            {"$group": {"_id": None, "total": {"$sum": "$total_ttc"}}}
-        ]
-        devis_result = list(devis_collection.aggregate(devis_pipeline))
-        if devis_result:
-            stats["montant_devis_mois"] = devis_result[0]["total"]
+        await dashboard_stats.rebuild_dashboard_stats()
+        return {"success": True, "stats": await dashboard_stats.get_dashboard_stats()}
         
-        factures_pipeline = [
-            {"$match": {"created_at": {"$gte": current_month_start.isoformat()}}},
-            {"$group": {"_id": None, "total": {"$sum": "$total_ttc"}}}
-        ]
-        factures_result = list(factures_collection.aggregate(factures_pipeline))
-        if factures_result:
-            stats["montant_factures_mois"] = factures_result[0]["total"]
-        
-        # Calculate amount to collect (unpaid factures)
-        encaissement_pipeline = [
-            {"$match": {"statut_paiement": {"$in": ["impayé", "partiel"]}}},
-            {"$group": {"_id": None, "total": {"$sum": {"$subtract": ["$total_ttc", "$montant_paye"]}}}}
-        ]
-        encaissement_result = list(factures_collection.aggregate(encaissement_pipeline))
-        if encaissement_result:
-            stats["montant_a_encaisser"] = encaissement_result[0]["total"]
+    except dashboard_stats.RebuildInProgress:
+        raise HTTPException(status_code=409, detail="Recalcul des statistiques déjà en cours")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rebuilding dashboard stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ========================================
+# BOOTSTRAP & SYNC ENDPOINTS
+# ========================================
+# Listes du chargement initial de l'application :
+# clé de réponse -> (permission requise, repository, projection des vues liste, tri historique)
+BOOTSTRAP_LISTS = {
+    "clients": ("clients", clients_repo, HIDDEN_FIELDS, None),
+    "fournisseurs": ("fournisseurs", fournisseurs_repo, HIDDEN_FIELDS, None),
+    "devis": ("devis", devis_repo, {"articles": 0, **HIDDEN_FIELDS}, [("created_at", -1)]),
+    "factures": ("factures", factures_repo, {"articles": 0, **HIDDEN_FIELDS}, [("created_at", -1)]),
+    "articles": ("stock", stock_repo, HIDDEN_FIELDS, None),
+    "paiements": ("paiements", paiements_repo, HIDDEN_FIELDS, [("created_at", -1)]),
+}
+def has_permission(user: dict, permission: str) -> bool:
+    """Same rule as the frontend tabs: admins see everything, others need the permission set to true"""
+    return user.get("role") == "admin" or user.get("permissions", {}).get(permission) is True
+
+@app.get("/api/bootstrap")
+async def bootstrap(
+    limit: int = DEFAULT_PAGE_SIZE,
+    all_items: bool = Query(True, alias="all"),
+    current_user: dict = Depends(verify_token)
+):
+    """Données du chargement initial (listes, statistiques, alertes) en une réponse, selon les permissions"""
+    try:
+        reads = {}
+        for key, (permission, repo, projection, legacy_sort) in BOOTSTRAP_LISTS.items():
+            if has_permission(current_user, permission):
+                reads[key] = list_documents(repo, key, limit, None, None, False, all_items,
+                                            legacy_sort=legacy_sort, projection=dict(projection))
+        if has_permission(current_user, "dashboard"):
+            reads["stats"] = dashboard_stats.get_dashboard_stats()
+        if has_permission(current_user, "stock"):
+            reads["alerts"] = list_stock_alerts()
+        
+        # Lectures lancées en parallèle côté serveur
+        results = dict(zip(reads, await asyncio.gather(*reads.values())))
+        payload = {}
+        for key, result in results.items():
+            if key in BOOTSTRAP_LISTS:
+                payload[key] = result[key]
+                payload.setdefault("next_cursors", {})[key] = result["next_cursor"]
+            else:
+                payload[key] = result
+        payload["sections"] = list(results)
         
-        return {"stats": stats}
+        return FastJSONResponse(payload)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching dashboard stats: {e}")
+        logger.error(f"Error loading bootstrap data: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sync")
+async def sync_lists(
+    since: Optional[str] = None,
+    limit: int = sync.SYNC_MAX_CHANGES,
+    current_user: dict = Depends(verify_token)
+):
+    """Documents créés, modifiés ou supprimés depuis le jeton `since` (tout, sans jeton), selon les permissions"""
+    try:
+        collections = {
+            key: (repo, projection)
+            for key, (permission, repo, projection, _) in BOOTSTRAP_LISTS.items()
+            if has_permission(current_user, permission)
+        }
+        limit = max(1, min(limit, sync.SYNC_MAX_CHANGES))
+        try:
+            payload = await sync.changes(collections, since, limit)
+        except InvalidSyncToken:
+            raise HTTPException(status_code=400, detail="Jeton de synchronisation invalide")
+        
+        return FastJSONResponse(payload)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error syncing lists: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/pdf/liste/factures-impayees")
+async def render_pdf(renderer_name: str, *args) -> bytes:
+    """Render a PDF in the process pool, mapping saturation and timeouts to HTTP errors"""
+    try:
+        return await pdf_renderer.render(renderer_name, *args)
+    except PdfQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Génération PDF saturée, veuillez réessayer dans quelques instants",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except PdfRenderTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="La génération du PDF a dépassé le délai autorisé"
+        )
+
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+def pdf_response(content: bytes, filename: str, headers: Optional[dict] = None) -> StreamingResponse:
+    """Stream a PDF rendered in memory (no temporary file to clean up)"""
+    async def chunks():
+        pdf_renderer.buffer_acquired(len(content))
+        try:
+            for offset in range(0, len(content), PDF_STREAM_CHUNK_SIZE):
+                yield content[offset:offset + PDF_STREAM_CHUNK_SIZE]
+        finally:
+            pdf_renderer.buffer_released(len(content))
+    
+    quoted = quote(filename)
+    disposition = f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+    return StreamingResponse(
+        chunks(),
+        media_type='application/pdf',
+        headers={"Content-Disposition": disposition, "Content-Length": str(len(content)), **(headers or {})}
+    )
+
+def pdf_list_salt() -> str:
+    """PDF lists also depend on the day (printed date, file name) and on the templates"""
+    return f"{date.today().isoformat()}:{TEMPLATE_VERSION}"
+
+@app.get("/api/pdf/liste/factures-impayees", dependencies=[Depends(conditional(factures_repo, salt=pdf_list_salt))])
 async def generate_liste_factures_impayees(date_debut: str = None, date_fin: str = None):
     """Generate PDF list of unpaid invoices for a given period"""
     try:
@@ -967,121 +1522,19 @@ async def generate_liste_factures_impayees(date_debut: str = None, date_fin: str
         if date_filter:
             query["date_facture"] = date_filter
         
-        factures_impayees = list(factures_collection.find(query).sort("date_facture", -1))
+        factures_impayees = await factures_repo.find_many(query, sort=[("date_facture", -1)])
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Professional logo header with actual logo
-            logo_table = create_pdf_header_with_logo()
-            story.append(logo_table)
-            story.append(Spacer(1, 10))
-            
-            # Report title
-            title_style = styles['Heading1']
-            title_style.fontSize = 22
-            title_style.textColor = colors.HexColor('#dc3545')  # Red for unpaid
-            title_style.alignment = 1  # Center
-            
-            period_text = ""
-            if date_debut and date_fin:
-                period_text = f" - Période: {date_debut} au {date_fin}"
-            
-            story.append(Paragraph(f"LISTE DES FACTURES IMPAYÉES{period_text}", title_style))
-            story.append(Spacer(1, 20))
-            
-            # Summary
-            total_impaye = sum(f.get('total_ttc', 0) - f.get('montant_paye', 0) for f in factures_impayees)
-            
-            summary_data = [
-                ["Nombre de factures impayées", str(len(factures_impayees))],
-                ["Montant total à encaisser", f"{total_impaye:,.0f} F CFA"],
-                ["Date de génération", datetime.now().strftime("%d/%m/%Y à %H:%M:%S")]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[200, 280])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#ffe6e6')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#dc3545')),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 12),
-                ('PADDING', (0, 0), (-1, -1), 10),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ]))
-            
-            story.append(summary_table)
-            story.append(Spacer(1, 25))
-            
-            # Detailed list
-            if factures_impayees:
-                facture_data = [["N° Facture", "Client", "Date", "Total TTC", "Payé", "Reste à payer", "Retard"]]
-                
-                for f in factures_impayees:
-                    date_facture = datetime.fromisoformat(f.get('date_facture', ''))
-                    jours_retard = (datetime.now().date() - date_facture.date()).days
-                    
-                    # Truncate long client names
-                    client_nom = f.get('client_nom', '')
-                    if len(client_nom) > 25:
-                        client_nom = client_nom[:25] + "..."
-                    
-                    facture_data.append([
-                        f.get('numero_facture', '')[:18],
-                        client_nom,
-                        f.get('date_facture', '')[:10],
-                        f"{f.get('total_ttc', 0):,.0f}",
-                        f"{f.get('montant_paye', 0):,.0f}",
-                        f"{f.get('total_ttc', 0) - f.get('montant_paye', 0):,.0f}",
-                        f"{jours_retard}j" if jours_retard > 30 else f"{jours_retard}j"
-                    ])
-                
-                detail_table = Table(facture_data, colWidths=[85, 120, 55, 60, 60, 70, 30])
-                detail_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc3545')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
-                    ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),  # Right align amounts
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 8),
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    ('TOPPADDING', (0, 0), (-1, -1), 4),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ]))
-                story.append(detail_table)
-            else:
-                story.append(Paragraph("✅ Aucune facture impayée pour la période sélectionnée", styles['Normal']))
-            
-            story.append(Spacer(1, 30))
-            
-            # Footer
-            footer_style = styles['Normal']
-            footer_style.fontSize = 8
-            footer_style.textColor = colors.HexColor('#666666')
-            
-            story.append(Paragraph("─" * 80, footer_style))
-            story.append(Paragraph("<b>SARL ECO PUMP AFRIK au capital de 1 000 000 F CFA</b>", footer_style))
-            story.append(Paragraph("Siège social: Cocody - Angré 7e Tranche", footer_style))
-            story.append(Paragraph("Tél: +225 0707806359", footer_style))
-            story.append(Paragraph("Email: contact@ecopumpafrik.com | Site WEB: www.ecopumpafrik.com", footer_style))
-            
-            doc.build(story)
-            
-            return FileResponse(
-                tmp_file.name,
-                media_type='application/pdf',
-                filename=f"ECO_PUMP_AFRIK_Factures_Impayees_{date.today().isoformat()}.pdf"
-            )
+        pdf_content = await render_pdf("render_liste_factures_impayees", factures_impayees, date_debut, date_fin)
+        
+        return pdf_response(pdf_content, f"ECO_PUMP_AFRIK_Factures_Impayees_{date.today().isoformat()}.pdf")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating unpaid invoices list: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération: {str(e)}")
 
-@app.get("/api/pdf/liste/factures")
+@app.get("/api/pdf/liste/factures", dependencies=[Depends(conditional(factures_repo, salt=pdf_list_salt))])
 async def generate_liste_factures(date_debut: str = None, date_fin: str = None):
     """Generate PDF list of all invoices for a given period"""
     try:
@@ -1103,123 +1556,19 @@ async def generate_liste_factures(date_debut: str = None, date_fin: str = None):
         if date_filter:
             query["date_facture"] = date_filter
         
-        factures_liste = list(factures_collection.find(query).sort("date_facture", -1))
+        factures_liste = await factures_repo.find_many(query, sort=[("date_facture", -1)])
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Professional logo header with actual logo
-            logo_table = create_pdf_header_with_logo()
-            story.append(logo_table)
-            story.append(Spacer(1, 10))
-            
-            # Report title
-            title_style = styles['Heading1']
-            title_style.fontSize = 22
-            title_style.textColor = colors.HexColor('#0066cc')
-            title_style.alignment = 1  # Center
-            
-            period_text = ""
-            if date_debut and date_fin:
-                period_text = f" - Période: {date_debut} au {date_fin}"
-            
-            story.append(Paragraph(f"LISTE DES FACTURES{period_text}", title_style))
-            story.append(Spacer(1, 20))
-            
-            # Summary
-            total_factures = sum(f.get('total_ttc', 0) for f in factures_liste)
-            total_paye = sum(f.get('montant_paye', 0) for f in factures_liste)
-            nb_payees = len([f for f in factures_liste if f.get('statut_paiement') == 'payé'])
-            
-            summary_data = [
-                ["Nombre total de factures", str(len(factures_liste))],
-                ["Factures payées", f"{nb_payees} ({nb_payees/len(factures_liste)*100:.1f}%)" if factures_liste else "0"],
-                ["Chiffre d'affaires total", f"{total_factures:,.0f} F CFA"],
-                ["Montant encaissé", f"{total_paye:,.0f} F CFA"],
-                ["Reste à encaisser", f"{total_factures - total_paye:,.0f} F CFA"]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[200, 280])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#e6f3ff')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#0066cc')),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('PADDING', (0, 0), (-1, -1), 8),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ]))
-            
-            story.append(summary_table)
-            story.append(Spacer(1, 25))
-            
-            # Detailed list
-            if factures_liste:
-                facture_data = [["N° Facture", "Client", "Date", "Total TTC", "Statut", "Devise"]]
-                
-                for f in factures_liste:
-                    # Truncate long client names
-                    client_nom = f.get('client_nom', '')
-                    if len(client_nom) > 30:
-                        client_nom = client_nom[:30] + "..."
-                    
-                    statut_color = "✅" if f.get('statut_paiement') == 'payé' else "❌"
-                    
-                    facture_data.append([
-                        f.get('numero_facture', '')[:20],
-                        client_nom,
-                        f.get('date_facture', '')[:10],
-                        f"{f.get('total_ttc', 0):,.0f}",
-                        f"{statut_color} {f.get('statut_paiement', '')}",
-                        f.get('devise', '')
-                    ])
-                
-                detail_table = Table(facture_data, colWidths=[90, 150, 55, 70, 80, 35])
-                detail_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
-                    ('ALIGN', (3, 1), (3, -1), 'RIGHT'),  # Right align amounts
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 8),
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    ('TOPPADDING', (0, 0), (-1, -1), 4),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ]))
-                story.append(detail_table)
-            else:
-                story.append(Paragraph("Aucune facture trouvée pour la période sélectionnée", styles['Normal']))
-            
-            story.append(Spacer(1, 30))
-            
-            # Footer
-            footer_style = styles['Normal']
-            footer_style.fontSize = 8
-            footer_style.textColor = colors.HexColor('#666666')
-            
-            story.append(Paragraph("─" * 80, footer_style))
-            story.append(Paragraph("<b>SARL ECO PUMP AFRIK au capital de 1 000 000 F CFA</b>", footer_style))
-            story.append(Paragraph("Siège social: Cocody - Angré 7e Tranche", footer_style))
-            story.append(Paragraph("Tél: +225 0707806359", footer_style))
-            story.append(Paragraph("Email: contact@ecopumpafrik.com | Site WEB: www.ecopumpafrik.com", footer_style))
-            
-            doc.build(story)
-            
-            return FileResponse(
-                tmp_file.name,
-                media_type='application/pdf',
-                filename=f"ECO_PUMP_AFRIK_Liste_Factures_{date.today().isoformat()}.pdf"
-            )
+        pdf_content = await render_pdf("render_liste_factures", factures_liste, date_debut, date_fin)
+        
+        return pdf_response(pdf_content, f"ECO_PUMP_AFRIK_Liste_Factures_{date.today().isoformat()}.pdf")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating invoices list: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération: {str(e)}")
 
-@app.get("/api/pdf/liste/devis")
+@app.get("/api/pdf/liste/devis", dependencies=[Depends(conditional(devis_repo, salt=pdf_list_salt))])
 async def generate_liste_devis(date_debut: str = None, date_fin: str = None):
     """Generate PDF list of all quotes for a given period"""
     try:
@@ -1241,118 +1590,14 @@ async def generate_liste_devis(date_debut: str = None, date_fin: str = None):
         if date_filter:
             query["date_devis"] = date_filter
         
-        devis_liste = list(devis_collection.find(query).sort("date_devis", -1))
+        devis_liste = await devis_repo.find_many(query, sort=[("date_devis", -1)])
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Professional logo header with actual logo
-            logo_table = create_pdf_header_with_logo()
-            story.append(logo_table)
-            story.append(Spacer(1, 10))
-            
-            # Report title
-            title_style = styles['Heading1']
-            title_style.fontSize = 22
-            title_style.textColor = colors.HexColor('#28a745')  # Green for quotes
-            title_style.alignment = 1  # Center
-            
-            period_text = ""
-            if date_debut and date_fin:
-                period_text = f" - Période: {date_debut} au {date_fin}"
-            
-            story.append(Paragraph(f"LISTE DES DEVIS{period_text}", title_style))
-            story.append(Spacer(1, 20))
-            
-            # Summary
-            total_devis = sum(d.get('total_ttc', 0) for d in devis_liste)
-            nb_acceptes = len([d for d in devis_liste if d.get('statut') == 'accepté'])
-            nb_refuses = len([d for d in devis_liste if d.get('statut') == 'refusé'])
-            
-            summary_data = [
-                ["Nombre total de devis", str(len(devis_liste))],
-                ["Devis acceptés", f"{nb_acceptes} ({nb_acceptes/len(devis_liste)*100:.1f}%)" if devis_liste else "0"],
-                ["Devis refusés", f"{nb_refuses} ({nb_refuses/len(devis_liste)*100:.1f}%)" if devis_liste else "0"],
-                ["Valeur totale des devis", f"{total_devis:,.0f} F CFA"],
-                ["Taux de conversion", f"{nb_acceptes/len(devis_liste)*100:.1f}%" if devis_liste else "0%"]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[200, 280])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#e6ffe6')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#28a745')),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('PADDING', (0, 0), (-1, -1), 8),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ]))
-            
-            story.append(summary_table)
-            story.append(Spacer(1, 25))
-            
-            # Detailed list
-            if devis_liste:
-                devis_data = [["N° Devis", "Client", "Date", "Total TTC", "Statut", "Devise"]]
-                
-                for d in devis_liste:
-                    # Truncate long client names
-                    client_nom = d.get('client_nom', '')
-                    if len(client_nom) > 30:
-                        client_nom = client_nom[:30] + "..."
-                    
-                    statut_icon = {"accepté": "✅", "refusé": "❌", "en_attente": "⏳"}.get(d.get('statut', ''), "❓")
-                    
-                    devis_data.append([
-                        d.get('numero_devis', '')[:20],
-                        client_nom,
-                        d.get('date_devis', '')[:10],
-                        f"{d.get('total_ttc', 0):,.0f}",
-                        f"{statut_icon} {d.get('statut', '')}",
-                        d.get('devise', '')
-                    ])
-                
-                detail_table = Table(devis_data, colWidths=[90, 150, 55, 70, 80, 35])
-                detail_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
-                    ('ALIGN', (3, 1), (3, -1), 'RIGHT'),  # Right align amounts
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 8),
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    ('TOPPADDING', (0, 0), (-1, -1), 4),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ]))
-                story.append(detail_table)
-            else:
-                story.append(Paragraph("Aucun devis trouvé pour la période sélectionnée", styles['Normal']))
-            
-            story.append(Spacer(1, 30))
-            
-            # Footer
-            footer_style = styles['Normal']
-            footer_style.fontSize = 8
-            footer_style.textColor = colors.HexColor('#666666')
-            
-            story.append(Paragraph("─" * 80, footer_style))
-            story.append(Paragraph("<b>SARL ECO PUMP AFRIK au capital de 1 000 000 F CFA</b>", footer_style))
-            story.append(Paragraph("Siège social: Cocody - Angré 7e Tranche", footer_style))
-            story.append(Paragraph("Tél: +225 0707806359", footer_style))
-            story.append(Paragraph("Email: contact@ecopumpafrik.com | Site WEB: www.ecopumpafrik.com", footer_style))
-            
-            doc.build(story)
-            
-            return FileResponse(
-                tmp_file.name,
-                media_type='application/pdf',
-                filename=f"ECO_PUMP_AFRIK_Liste_Devis_{date.today().isoformat()}.pdf"
-            )
+        pdf_content = await render_pdf("render_liste_devis", devis_liste, date_debut, date_fin)
+        
+        return pdf_response(pdf_content, f"ECO_PUMP_AFRIK_Liste_Devis_{date.today().isoformat()}.pdf")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating quotes list: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération: {str(e)}")
@@ -1361,12 +1606,12 @@ async def generate_liste_devis(date_debut: str = None, date_fin: str = None):
 # PDF GENERATION ENDPOINTS
 # ========================================
 @app.get("/api/pdf/document/{doc_type}/{doc_id}")
-async def generate_document_pdf(doc_type: str, doc_id: str):
-    """Generate PDF for devis, facture or paiement"""
+async def generate_document_pdf(doc_type: str, doc_id: str, request: Request):
+    """Generate PDF for devis, facture or paiement (cached on disk, ETag aware)"""
     try:
         # Get document data
         if doc_type == "devis":
-            document = devis_collection.find_one({"devis_id": doc_id})
+            document = await devis_repo.find_one({"devis_id": doc_id})
             if not document:
                 raise HTTPException(status_code=404, detail="Devis non trouvé")
             doc_title = "DEVIS"
@@ -1374,7 +1619,7 @@ async def generate_document_pdf(doc_type: str, doc_id: str):
             doc_date = document["date_devis"]
             
         elif doc_type == "facture":
-            document = factures_collection.find_one({"facture_id": doc_id})
+            document = await factures_repo.find_one({"facture_id": doc_id})
             if not document:
                 raise HTTPException(status_code=404, detail="Facture non trouvée") 
             doc_title = "FACTURE"
@@ -1382,7 +1627,7 @@ async def generate_document_pdf(doc_type: str, doc_id: str):
             doc_date = document["date_facture"]
             
         elif doc_type == "paiement":
-            document = paiements_collection.find_one({"paiement_id": doc_id})
+            document = await paiements_repo.find_one({"paiement_id": doc_id})
             if not document:
                 raise HTTPException(status_code=404, detail="Paiement non trouvé")
             doc_title = "REÇU DE PAIEMENT"
@@ -1391,186 +1636,28 @@ async def generate_document_pdf(doc_type: str, doc_id: str):
         else:
             raise HTTPException(status_code=400, detail="Type de document non valide")
 
-        # Create PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Header with ECO PUMP AFRIK branding
-            header_style = styles['Title']
-            header_style.fontSize = 28
-            header_style.textColor = colors.HexColor('#0066cc')
-            header_style.alignment = 1  # Center alignment
-            
-            # Create PROFESSIONAL ECO PUMP AFRIK logo inspired by client's design
-            # Note: Using table-based layout instead of graphics for better compatibility
-            
-            # Professional logo header with actual logo
-            logo_table = create_pdf_header_with_logo()
-            story.append(logo_table)
-            story.append(Spacer(1, 10))
-            
-            # Contact information bar
-            contact_data = [
-                ["📧 contact@ecopumpafrik.com", "📞 +225 0707806359", "🌐 www.ecopumpafrik.com"]
-            ]
-            
-            contact_table = Table(contact_data, colWidths=[160, 160, 160])
-            contact_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f8ff')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#0066cc')),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            
-            story.append(contact_table)
-            story.append(Spacer(1, 20))
-            
-            # Document title
-            title_style = styles['Heading1']
-            title_style.fontSize = 20
-            title_style.textColor = colors.HexColor('#333333')
-            story.append(Paragraph(f"{doc_title} - {doc_number}", title_style))
-            
-            # Date and time information
-            date_str = doc_date
-            current_time = datetime.now().strftime("%d/%m/%Y à %H:%M:%S")
-            story.append(Paragraph(f"Date: {date_str}", styles['Normal']))
-            story.append(Paragraph(f"Heure de génération: {current_time}", styles['Normal']))
-            story.append(Spacer(1, 20))
-            
-            if doc_type in ["devis", "facture"]:
-                # Client info
-                story.append(Paragraph(f"<b>Client:</b> {document['client_nom']}", styles['Normal']))
-                if document.get('reference_commande'):
-                    story.append(Paragraph(f"<b>Référence commande:</b> {document['reference_commande']}", styles['Normal']))
-                story.append(Spacer(1, 15))
-                
-                # Articles table with proper column widths
-                article_data = [["Item", "Réf", "Désignation", "Qté", "P.U.", "Total"]]
-                for article in document.get('articles', []):
-                    # Truncate long designations to fit in column
-                    designation = article['designation']
-                    if len(designation) > 25:
-                        designation = designation[:25] + "..."
-                    
-                    article_data.append([
-                        str(article['item']),
-                        article.get('ref', '')[:8] if article.get('ref') else '',  # Limit ref to 8 chars
-                        designation,
-                        str(article['quantite']),
-                        f"{article['prix_unitaire']:,.0f}",
-                        f"{article['total']:,.0f}"
-                    ])
-                
-                # Define column widths to prevent overflow (total width = 480)
-                table = Table(article_data, colWidths=[30, 50, 180, 40, 80, 100])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('ALIGN', (2, 1), (2, -1), 'LEFT'),  # Left align designation
-                    ('ALIGN', (4, 1), (-1, -1), 'RIGHT'), # Right align prices
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('WORDWRAP', (2, 1), (2, -1), 1)  # Enable word wrap for designation
-                ]))
-                story.append(table)
-                story.append(Spacer(1, 20))
-                
-                # Totals with color coding
-                story.append(Paragraph(f"<b>Sous-total:</b> {document['sous_total']:,.2f} {document['devise']}", styles['Normal']))
-                story.append(Paragraph(f"<b>TVA (18%):</b> {document['tva']:,.2f} {document['devise']}", styles['Normal']))
-                
-                # Total with color based on payment status
-                if doc_type == "facture":
-                    statut_paiement = document.get('statut_paiement', 'impayé')
-                    if statut_paiement == 'payé':
-                        total_color = '#28a745'  # Green for paid
-                        total_text = f"<b><font color='{total_color}'>TOTAL TTC (PAYÉ):</font></b> <font color='{total_color}'>{document['total_ttc']:,.2f} {document['devise']}</font>"
-                    else:
-                        total_color = '#dc3545'  # Red for unpaid
-                        total_text = f"<b><font color='{total_color}'>TOTAL TTC (À PAYER):</font></b> <font color='{total_color}'>{document['total_ttc']:,.2f} {document['devise']}</font>"
-                else:
-                    # For devis, use normal blue color
-                    total_color = '#0066cc'
-                    total_text = f"<b><font color='{total_color}'>TOTAL TTC:</font></b> <font color='{total_color}'>{document['total_ttc']:,.2f} {document['devise']}</font>"
-                
-                story.append(Paragraph(total_text, styles['Heading2']))
-                story.append(Spacer(1, 15))
-                
-                # Terms and conditions
-                if document.get('delai_livraison'):
-                    story.append(Paragraph(f"<b>Délai de livraison:</b> {document['delai_livraison']}", styles['Normal']))
-                if document.get('conditions_paiement'):
-                    story.append(Paragraph(f"<b>Conditions de paiement:</b> {document['conditions_paiement']}", styles['Normal']))
-                if document.get('mode_livraison'):
-                    story.append(Paragraph(f"<b>Mode de livraison:</b> {document['mode_livraison']}", styles['Normal']))
-                if document.get('commentaires'):
-                    story.append(Spacer(1, 15))
-                    comment_style = styles['Normal']
-                    comment_style.fontSize = 11
-                    comment_style.textColor = colors.HexColor('#2c5530')
-                    comment_style.leftIndent = 20
-                    comment_style.rightIndent = 20
-                    
-                    # Create a bordered box for comments
-                    comment_table = Table([[f"💬 COMMENTAIRES:\n{document['commentaires']}"]], colWidths=[460])
-                    comment_table.setStyle(TableStyle([
-                        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 11),
-                        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2c5530')),
-                        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fff8')),
-                        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#28a745')),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                        ('TOPPADDING', (0, 0), (-1, -1), 12),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-                        ('LEFTPADDING', (0, 0), (-1, -1), 15),
-                        ('RIGHTPADDING', (0, 0), (-1, -1), 15),
-                    ]))
-                    story.append(comment_table)
-                
-            else:  # paiement
-                story.append(Paragraph(f"<b>Montant:</b> {document['montant']:,.2f} {document['devise']}", styles['Heading2']))
-                story.append(Paragraph(f"<b>Mode de paiement:</b> {document['mode_paiement']}", styles['Normal']))
-                if document.get('reference_paiement'):
-                    story.append(Paragraph(f"<b>Référence:</b> {document['reference_paiement']}", styles['Normal']))
-                if document.get('client_id'):
-                    client = clients_collection.find_one({"client_id": document['client_id']})
-                    if client:
-                        story.append(Paragraph(f"<b>Client:</b> {client['nom']}", styles['Normal']))
-            
-            story.append(Spacer(1, 30))
-            
-            # Footer with company info
-            footer_style = styles['Normal']
-            footer_style.fontSize = 8
-            footer_style.textColor = colors.HexColor('#666666')
-            
-            story.append(Paragraph("─" * 80, footer_style))
-            story.append(Paragraph("<b>SARL ECO PUMP AFRIK au capital de 1 000 000 F CFA</b>", footer_style))
-            story.append(Paragraph("Siège social: Cocody - Angré 7e Tranche", footer_style))
-            story.append(Paragraph("Tél: +225 0707806359", footer_style))
-            story.append(Paragraph("Email: contact@ecopumpafrik.com | Site WEB: www.ecopumpafrik.com", footer_style))
-            story.append(Paragraph("RCCM: CI-ABJ-2024-B-12345 | N°CC: 2407891H", footer_style))
-            
-            doc.build(story)
-            
-            return FileResponse(
-                tmp_file.name,
-                media_type='application/pdf',
-                filename=f"{doc_title}_{doc_number}_{date.today().isoformat()}.pdf"
-            )
+        # Client name for payment receipts
+        client_nom = None
+        if doc_type == "paiement" and document.get('client_id'):
+            client = await clients_repo.find_one({"client_id": document['client_id']})
+            if client:
+                client_nom = client['nom']
+        
+        # Le rendu ne dépend que du document (et du nom client pour les reçus)
+        digest = document_digest(doc_type, doc_id, document.get("updated_at") or document.get("created_at"), client_nom)
+        etag = f'"{digest}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+        
+        filename = f"{doc_title}_{doc_number}_{date.today().isoformat()}.pdf"
+        pdf_content = await run_in_threadpool(pdf_cache.get, doc_type, doc_id, digest)
+        if pdf_content is not None:
+            return pdf_response(pdf_content, filename, cache_headers)
+        
+        pdf_content = await render_pdf("render_document", doc_type, document, doc_title, doc_number, doc_date, client_nom)
+        await run_in_threadpool(pdf_cache.put, doc_type, doc_id, digest, pdf_content)
+        return pdf_response(pdf_content, filename, cache_headers)
             
     except HTTPException:
         raise
@@ -1578,344 +1665,67 @@ async def generate_document_pdf(doc_type: str, doc_id: str):
         logger.error(f"Error generating PDF: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du PDF: {str(e)}")
 
+def report_period(date_debut: Optional[str], date_fin: Optional[str]) -> dict:
+    """Date filter of a report period (ignored when missing or unparsable)"""
+    if date_debut and date_fin:
+        try:
+            debut = datetime.fromisoformat(date_debut)
+            fin = datetime.fromisoformat(date_fin)
+            return {
+                "$gte": debut.isoformat(),
+                "$lte": fin.isoformat()
+            }
+        except ValueError:
+            pass
+    return {}
+
 @app.get("/api/pdf/rapport/{report_type}")
 async def generate_report_pdf(report_type: str, date_debut: str = None, date_fin: str = None):
     """Generate professional PDF reports with optional date filtering"""
     try:
-        # Parse date filters if provided
-        date_filter = {}
-        if date_debut and date_fin:
-            try:
-                debut = datetime.fromisoformat(date_debut)
-                fin = datetime.fromisoformat(date_fin)
-                date_filter = {
-                    "$gte": debut.isoformat(),
-                    "$lte": fin.isoformat()
-                }
-            except:
-                # If date parsing fails, ignore filters
-                date_filter = {}
+        date_filter = report_period(date_debut, date_fin)
         
-        # Get data for reports with date filtering
-        clients_data = list(clients_collection.find({}))
+        # Chaque type de rapport ne charge que les données qu'il affiche
+        if report_type not in REPORT_LOADERS:
+            raise HTTPException(status_code=400, detail="Type de rapport non valide")
+        report_data = await load_report_data(report_type, date_filter)
         
-        # Apply date filtering to collections
-        if date_filter:
-            factures_data = list(factures_collection.find({"date_facture": date_filter}).sort("created_at", -1))
-            devis_data = list(devis_collection.find({"date_devis": date_filter}).sort("created_at", -1))
-            paiements_data = list(paiements_collection.find({"date_paiement": date_filter}).sort("created_at", -1))
-        else:
-            factures_data = list(factures_collection.find({}).sort("created_at", -1))
-            devis_data = list(devis_collection.find({}).sort("created_at", -1))
-            paiements_data = list(paiements_collection.find({}).sort("created_at", -1))
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Professional logo header with actual logo
-            logo_table = create_pdf_header_with_logo()
-            story.append(logo_table)
-            story.append(Spacer(1, 10))
-            
-            # Contact information bar
-            contact_data = [
-                ["📧 contact@ecopumpafrik.com", "📞 +225 0707806359", "🌐 www.ecopumpafrik.com"]
-            ]
-            
-            contact_table = Table(contact_data, colWidths=[160, 160, 160])
-            contact_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f8ff')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#0066cc')),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            
-            story.append(contact_table)
-            story.append(Spacer(1, 15))
-            
-            # Report title
-            title_style = styles['Heading1']
-            title_style.fontSize = 18
-            title_style.textColor = colors.HexColor('#333333')
-            
-            if report_type == "journal_ventes":
-                period_text = ""
-                if date_debut and date_fin:
-                    period_text = f" - Période: {date_debut} au {date_fin}"
-                
-                story.append(Paragraph(f"JOURNAL DES VENTES{period_text}", title_style))
-                story.append(Spacer(1, 20))
-                
-                # Sales summary table
-                summary_data = [
-                    ["Indicateur", "Valeur"],
-                    ["Nombre de factures", str(len(factures_data))],
-                    ["Chiffre d'affaires", f"{sum(f.get('total_ttc', 0) for f in factures_data):,.2f} F CFA"],
-                    ["TVA collectée", f"{sum(f.get('tva', 0) for f in factures_data):,.2f} F CFA"],
-                    ["Factures impayées", str(len([f for f in factures_data if f.get('statut_paiement') != 'payé']))],
-                ]
-                
-                table = Table(summary_data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(table)
-                story.append(Spacer(1, 20))
-                
-                # Detailed factures table with fixed column widths
-                story.append(Paragraph("Détail des Factures", styles['Heading2']))
-                facture_data = [["N° Facture", "Client", "Date", "Montant", "Statut"]]
-                for f in factures_data[:15]:  # Limit to 15 recent invoices
-                    # Truncate long client names
-                    client_nom = f.get('client_nom', '')
-                    if len(client_nom) > 20:
-                        client_nom = client_nom[:20] + "..."
-                    
-                    facture_data.append([
-                        f.get('numero_facture', '')[:15],  # Limit invoice number
-                        client_nom,
-                        f.get('date_facture', '')[:10],  # Date only, no time
-                        f"{f.get('total_ttc', 0):,.0f} {f.get('devise', 'FCFA')}",
-                        f.get('statut_paiement', '')
-                    ])
-                
-                detail_table = Table(facture_data, colWidths=[80, 120, 60, 80, 60])
-                detail_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Left align client names
-                    ('ALIGN', (3, 1), (3, -1), 'RIGHT'), # Right align amounts
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(detail_table)
-                
-            elif report_type == "balance_clients":
-                story.append(Paragraph("BALANCE CLIENTS", title_style))
-                story.append(Spacer(1, 20))
-                
-                # Client balance table with strictly controlled column widths
-                balance_data = [["Client", "Type", "Dev", "Fact", "Facturé", "Payé", "Solde"]]
-                for client in clients_data:
-                    client_factures = [f for f in factures_data if f.get('client_id') == client.get('client_id')]
-                    total_facture = sum(f.get('total_ttc', 0) for f in client_factures)
-                    total_paye = sum(f.get('montant_paye', 0) for f in client_factures)
-                    solde = total_facture - total_paye
-                    
-                    # Truncate long client names to fit
-                    client_nom = client.get('nom', '')
-                    if len(client_nom) > 18:
-                        client_nom = client_nom[:18] + "..."
-                    
-                    balance_data.append([
-                        client_nom,
-                        client.get('type_client', '')[:4],  # Truncate type
-                        client.get('devise', '')[:4],
-                        str(len(client_factures)),
-                        f"{total_facture:,.0f}",
-                        f"{total_paye:,.0f}",
-                        f"{solde:,.0f}"
-                    ])
-                
-                # Very strict column widths (total = 480)
-                balance_table = Table(balance_data, colWidths=[90, 30, 25, 25, 70, 70, 70])
-                balance_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066cc')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # Left align client names
-                    ('ALIGN', (4, 1), (-1, -1), 'RIGHT'), # Right align amounts
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 8),  # Smaller header font
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),  # Smaller content font
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 2),
-                    ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
-                ]))
-                story.append(balance_table)
-                
-            elif report_type == "journal_achats":
-                story.append(Paragraph("JOURNAL DES ACHATS", title_style))
-                story.append(Spacer(1, 20))
-                
-                # Get purchases data (since we don't have achats_collection implemented, we'll show placeholder) 
-                achats_data = []  # In real implementation, get from achats_collection
-                
-                # Purchases summary
-                summary_data = [
-                    ["Indicateur", "Valeur"],
-                    ["Nombre de commandes", "0"],  # Would be len(achats_data)
-                    ["Total des achats", "0,00 F CFA"],  # Would be sum(a.total_ttc for a in achats_data)
-                    ["Commandes en attente", "0"],
-                    ["Fournisseurs actifs", str(len([f for f in fournisseurs_collection.find({})]))],
-                ]
-                
-                table = Table(summary_data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(table)
-                
-                story.append(Spacer(1, 20))
-                story.append(Paragraph("Note: Module d'achats en cours de développement", styles['Normal']))
-                
-            elif report_type == "balance_fournisseurs":
-                story.append(Paragraph("BALANCE FOURNISSEURS", title_style))
-                story.append(Spacer(1, 20))
-                
-                # Supplier balance table
-                fournisseurs_data = list(fournisseurs_collection.find({}))
-                balance_data = [["Fournisseur", "Devise", "Nb Commandes", "Total Commandé", "Total Payé", "Solde"]]
-                
-                for fournisseur in fournisseurs_data:
-                    # Since achats module is not fully implemented, we'll show placeholder data
-                    balance_data.append([
-                        fournisseur.get('nom', ''),
-                        fournisseur.get('devise', ''),
-                        "0",  # Would be number of orders
-                        "0,00",  # Would be total ordered
-                        "0,00",  # Would be total paid
-                        "0,00"   # Would be balance
-                    ])
-                
-                balance_table = Table(balance_data)
-                balance_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ffc107')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(balance_table)
-                
-                story.append(Spacer(1, 20))
-                story.append(Paragraph("Note: Module d'achats en cours de développement", styles['Normal']))
-                
-            elif report_type == "tresorerie":
-                story.append(Paragraph("SUIVI DE TRÉSORERIE", title_style))
-                story.append(Spacer(1, 20))
-                
-                # Treasury summary
-                total_encaisse = sum(p.get('montant', 0) for p in paiements_data)
-                total_a_encaisser = sum(f.get('total_ttc', 0) - f.get('montant_paye', 0) 
-                                     for f in factures_data if f.get('statut_paiement') != 'payé')
-                
-                tresorerie_data = [
-                    ["Indicateur", "Montant"],
-                    ["Total encaissé", f"{total_encaisse:,.2f} F CFA"],
-                    ["À encaisser", f"{total_a_encaisser:,.2f} F CFA"],
-                    ["Nombre de paiements", str(len(paiements_data))],
-                    ["Factures impayées", str(len([f for f in factures_data if f.get('statut_paiement') != 'payé']))]
-                ]
-                
-                tresorerie_table = Table(tresorerie_data)
-                tresorerie_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ffc107')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(tresorerie_table)
-                
-            elif report_type == "compte_resultat":
-                story.append(Paragraph("COMPTE DE RÉSULTAT", title_style))
-                story.append(Spacer(1, 20))
-                
-                # Results summary
-                ca_ttc = sum(f.get('total_ttc', 0) for f in factures_data)
-                tva_collectee = sum(f.get('tva', 0) for f in factures_data)
-                ca_ht = ca_ttc - tva_collectee
-                taux_conversion = (len(factures_data) / len(devis_data) * 100) if devis_data else 0
-                
-                resultat_data = [
-                    ["Poste", "Montant"],
-                    ["Chiffre d'affaires HT", f"{ca_ht:,.2f} F CFA"],
-                    ["TVA collectée (18%)", f"{tva_collectee:,.2f} F CFA"],
-                    ["Chiffre d'affaires TTC", f"{ca_ttc:,.2f} F CFA"],
-                    ["Taux de conversion devis", f"{taux_conversion:.1f}%"],
-                    ["Nombre de clients actifs", str(len(clients_data))]
-                ]
-                
-                resultat_table = Table(resultat_data)
-                resultat_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#17a2b8')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(resultat_table)
-            
-            story.append(Spacer(1, 30))
-            
-            # Footer with company info
-            footer_style = styles['Normal']
-            footer_style.fontSize = 8
-            footer_style.textColor = colors.HexColor('#666666')
-            
-            story.append(Paragraph("─" * 80, footer_style))
-            story.append(Paragraph(f"Rapport généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}", footer_style))
-            story.append(Paragraph("<b>SARL ECO PUMP AFRIK au capital de 1 000 000 F CFA</b>", footer_style))
-            story.append(Paragraph("Siège social: Cocody - Angré 7e Tranche", footer_style))
-            story.append(Paragraph("Tél: +225 0707806359", footer_style))
-            story.append(Paragraph("Email: contact@ecopumpafrik.com | Site WEB: www.ecopumpafrik.com", footer_style))
-            story.append(Paragraph("RCCM: CI-ABJ-2024-B-12345 | N°CC: 2407891H", footer_style))
-            
-            doc.build(story)
-            
-            return FileResponse(
-                tmp_file.name,
-                media_type='application/pdf',
-                filename=f"ECO_PUMP_AFRIK_{report_type}_{date.today().isoformat()}.pdf"
-            )
+        pdf_content = await render_pdf("render_report", report_type, date_debut, date_fin, report_data)
+        
+        return pdf_response(pdf_content, f"ECO_PUMP_AFRIK_{report_type}_{date.today().isoformat()}.pdf")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating report PDF: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du rapport: {str(e)}")
 
+# ========================================
+# RAPPORTS (JSON)
+# ========================================
+@app.get("/api/reports/balance-clients", response_model=dict)
+async def get_balance_clients(date_debut: str = None, date_fin: str = None):
+    """Balance clients : soldes par client et par devise, sous-totaux et ancienneté des créances"""
+    try:
+        return await reports.balance_clients(report_period(date_debut, date_fin))
+    except Exception as e:
+        logger.error(f"Error computing balance clients: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/reports/balance-fournisseurs", response_model=dict)
+async def get_balance_fournisseurs(date_debut: str = None, date_fin: str = None):
+    """Balance fournisseurs : commandes, montants commandés et réglés, solde par fournisseur et par devise"""
+    try:
+        return await reports.balance_fournisseurs(report_period(date_debut, date_fin))
+    except Exception as e:
+        logger.error(f"Error computing balance fournisseurs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================
 # ADVANCED SEARCH AND FILTERING ENDPOINTS
 # ========================================
 
-@app.get("/api/search/devis", response_model=dict)
+@app.get("/api/search/devis", response_model=dict, dependencies=[Depends(conditional(devis_repo))])
 async def search_devis(
     client_nom: str = None,
     numero_devis: str = None,
@@ -1923,17 +1733,14 @@ async def search_devis(
     date_fin: str = None,
     devise: str = None,
     statut: str = None,
-    limit: int = 50
+    limit: int = 50,
+    skip: int = 0,
+    facets: bool = False
 ):
-    """Advanced search for devis with multiple filters"""
+    """Advanced search for devis with multiple filters (?facets=true: total, facet counts and sums)"""
     try:
-        query = {}
-        
         # Text search filters
-        if client_nom:
-            query["client_nom"] = {"$regex": client_nom, "$options": "i"}
-        if numero_devis:
-            query["numero_devis"] = {"$regex": numero_devis, "$options": "i"}
+        query = search.fields_filter("devis", {"client_nom": client_nom, "numero_devis": numero_devis})
         if devise:
             query["devise"] = devise
         if statut:
@@ -1948,21 +1755,32 @@ async def search_devis(
                 date_filter["$lte"] = date_fin
             query["date_devis"] = date_filter
         
-        devis_list = list(devis_collection.find(query).sort("created_at", -1).limit(limit))
-        for devis in devis_list:
-            devis["_id"] = str(devis["_id"])
+        if facets:
+            result = await faceted_search(devis_repo, query, ["statut", "devise"],
+                                          {"total_ttc": "$total_ttc"}, limit, skip)
+            return FastJSONResponse({
+                "success": True,
+                "devis": result["items"],
+                "count": len(result["items"]),
+                "total": result["total"],
+                "facets": result["facets"],
+                "totaux": result["totaux"],
+                "filters_applied": query
+            })
         
-        return {
+        devis_list = await devis_repo.find_many(query, HIDDEN_FIELDS, sort=[("created_at", -1)], limit=limit, skip=skip)
+        
+        return FastJSONResponse({
             "success": True,
             "devis": devis_list,
             "count": len(devis_list),
             "filters_applied": query
-        }
+        })
     except Exception as e:
         logger.error(f"Error searching devis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/search/factures", response_model=dict)
+@app.get("/api/search/factures", response_model=dict, dependencies=[Depends(conditional(factures_repo))])
 async def search_factures(
     client_nom: str = None,
     numero_facture: str = None,
@@ -1972,17 +1790,14 @@ async def search_factures(
     devise: str = None,
     montant_min: float = None,
     montant_max: float = None,
-    limit: int = 50
+    limit: int = 50,
+    skip: int = 0,
+    facets: bool = False
 ):
-    """Advanced search for factures with multiple filters"""
+    """Advanced search for factures with multiple filters (?facets=true: total, facet counts and sums)"""
     try:
-        query = {}
-        
         # Text search filters
-        if client_nom:
-            query["client_nom"] = {"$regex": client_nom, "$options": "i"}
-        if numero_facture:
-            query["numero_facture"] = {"$regex": numero_facture, "$options": "i"}
+        query = search.fields_filter("factures", {"client_nom": client_nom, "numero_facture": numero_facture})
         if statut_paiement:
             query["statut_paiement"] = statut_paiement
         if devise:
@@ -2006,86 +1821,122 @@ async def search_factures(
                 amount_filter["$lte"] = montant_max
             query["total_ttc"] = amount_filter
         
-        factures_list = list(factures_collection.find(query).sort("created_at", -1).limit(limit))
-        for facture in factures_list:
-            facture["_id"] = str(facture["_id"])
+        if facets:
+            result = await faceted_search(
+                factures_repo, query, ["statut_paiement", "devise"],
+                {"total_ttc": "$total_ttc", "montant_paye": {"$ifNull": ["$montant_paye", 0]}},
+                limit, skip
+            )
+            return FastJSONResponse({
+                "success": True,
+                "factures": result["items"],
+                "count": len(result["items"]),
+                "total": result["total"],
+                "facets": result["facets"],
+                "totaux": result["totaux"],
+                "filters_applied": query
+            })
+        
+        factures_list = await factures_repo.find_many(query, HIDDEN_FIELDS,
+                                                      sort=[("created_at", -1)], limit=limit, skip=skip)
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "factures": factures_list,
             "count": len(factures_list),
             "filters_applied": query
-        }
+        })
     except Exception as e:
         logger.error(f"Error searching factures: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/search/clients", response_model=dict)
+@app.get("/api/search/clients", response_model=dict, dependencies=[Depends(conditional(clients_repo))])
 async def search_clients(
     nom: str = None,
     type_client: str = None,
     devise: str = None,
     ville: str = None,
-    limit: int = 50
+    limit: int = 50,
+    skip: int = 0,
+    facets: bool = False
 ):
-    """Advanced search for clients"""
+    """Advanced search for clients (?facets=true: total and facet counts)"""
     try:
-        query = {}
-        
-        if nom:
-            query["nom"] = {"$regex": nom, "$options": "i"}
+        query = search.fields_filter("clients", {"nom": nom, "adresse": ville})
         if type_client:
             query["type_client"] = type_client
         if devise:
             query["devise"] = devise
-        if ville:
-            query["adresse"] = {"$regex": ville, "$options": "i"}
         
-        clients_list = list(clients_collection.find(query).sort("created_at", -1).limit(limit))
-        for client in clients_list:
-            client["_id"] = str(client["_id"])
+        if facets:
+            result = await faceted_search(clients_repo, query, ["type_client", "devise"], {}, limit, skip)
+            return FastJSONResponse({
+                "success": True,
+                "clients": result["items"],
+                "count": len(result["items"]),
+                "total": result["total"],
+                "facets": result["facets"],
+                "filters_applied": query
+            })
+        
+        clients_list = await clients_repo.find_many(query, HIDDEN_FIELDS,
+                                                    sort=[("created_at", -1)], limit=limit, skip=skip)
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "clients": clients_list,
             "count": len(clients_list),
             "filters_applied": query
-        }
+        })
     except Exception as e:
         logger.error(f"Error searching clients: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/search/stock", response_model=dict)
+@app.get("/api/search/stock", response_model=dict, dependencies=[Depends(conditional(stock_repo))])
 async def search_stock(
     designation: str = None,
     ref: str = None,
     stock_bas: bool = None,
     fournisseur: str = None,
-    limit: int = 50
+    limit: int = 50,
+    skip: int = 0,
+    facets: bool = False
 ):
-    """Advanced search for stock items"""
+    """Advanced search for stock items (?facets=true: total, counts per supplier, quantities and value)"""
     try:
-        query = {}
-        
-        if designation:
-            query["designation"] = {"$regex": designation, "$options": "i"}
-        if ref:
-            query["ref"] = {"$regex": ref, "$options": "i"}
-        if fournisseur:
-            query["fournisseur_principal"] = {"$regex": fournisseur, "$options": "i"}
+        query = search.fields_filter(
+            "stock", {"designation": designation, "ref": ref, "fournisseur_principal": fournisseur}
+        )
         if stock_bas:
-            query["$expr"] = {"$lte": ["$quantite_stock", "$stock_minimum"]}
+            query["en_alerte"] = True
+        
+        if facets:
+            result = await faceted_search(
+                stock_repo, query, ["fournisseur_principal"],
+                {
+                    "quantite_stock": "$quantite_stock",
+                    "valeur_stock": "$valeur_stock"
+                },
+                limit, skip
+            )
+            return FastJSONResponse({
+                "success": True,
+                "stock": result["items"],
+                "count": len(result["items"]),
+                "total": result["total"],
+                "facets": result["facets"],
+                "totaux": result["totaux"],
+                "filters_applied": query
+            })
         
-        stock_list = list(stock_collection.find(query).sort("created_at", -1).limit(limit))
-        for article in stock_list:
-            article["_id"] = str(article["_id"])
+        stock_list = await stock_repo.find_many(query, HIDDEN_FIELDS, sort=[("created_at", -1)], limit=limit, skip=skip)
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "stock": stock_list,
             "count": len(stock_list),
             "filters_applied": query
-        }
+        })
     except Exception as e:
         logger.error(f"Error searching stock: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2093,57 +1944,32 @@ async def search_stock(
 # ========================================
 # SEARCH ENDPOINTS
 # ========================================
-@app.get("/api/search", response_model=dict)
-async def search_documents(q: str):
+@app.get("/api/search", response_model=dict,
+         dependencies=[Depends(conditional(clients_repo, devis_repo, factures_repo))])
+async def search_documents(q: str, limit: int = search.SEARCH_LIMIT):
+    """Recherche globale (clients, devis, factures) classée par pertinence, sans accents ni casse"""
     try:
-        results = {
-            "clients": [],
-            "devis": [],
-            "factures": []
-        }
-        
-        # Search clients
-        clients = list(clients_collection.find({
-            "$or": [
-                {"nom": {"$regex": q, "$options": "i"}},
-                {"numero_cc": {"$regex": q, "$options": "i"}},
-                {"email": {"$regex": q, "$options": "i"}}
-            ]
-        }).limit(10))
-        
-        for client in clients:
-            client["_id"] = str(client["_id"])
-        results["clients"] = clients
-        
-        # Search devis
-        devis = list(devis_collection.find({
-            "$or": [
-                {"numero_devis": {"$regex": q, "$options": "i"}},
-                {"client_nom": {"$regex": q, "$options": "i"}}
-            ]
-        }).limit(10))
-        
-        for d in devis:
-            d["_id"] = str(d["_id"])
-        results["devis"] = devis
-        
-        # Search factures
-        factures = list(factures_collection.find({
-            "$or": [
-                {"numero_facture": {"$regex": q, "$options": "i"}},
-                {"client_nom": {"$regex": q, "$options": "i"}}
-            ]
-        }).limit(10))
-        
-        for f in factures:
-            f["_id"] = str(f["_id"])
-        results["factures"] = factures
-        
-        return {"results": results}
+        limit = max(1, min(limit, search.SEARCH_CANDIDATES))
+        return FastJSONResponse({"results": await search.search(q, limit)})
     except Exception as e:
         logger.error(f"Error searching: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/autocomplete/{kind}", response_model=dict, dependencies=[Depends(conditional(clients_repo, stock_repo))])
+async def autocomplete_suggestions(kind: str, q: str, limit: int = search.AUTOCOMPLETE_LIMIT):
+    """Suggestions des sélecteurs de clients (nom) et d'articles (référence, désignation)"""
+    try:
+        if kind not in search.AUTOCOMPLETE:
+            raise HTTPException(status_code=400, detail="Type d'autocomplétion non valide")
+        
+        limit = max(1, min(limit, search.SEARCH_CANDIDATES))
+        return {"suggestions": await search.autocomplete(kind, q, limit)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error autocompleting {kind}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================
 # ENDPOINTS D'AUTHENTIFICATION
 # ========================================
@@ -2153,9 +1979,13 @@ async def login(user_credentials: UserLogin):
     """Authentification utilisateur"""
     try:
         # Vérifier les identifiants
-        user = users_collection.find_one({"username": user_credentials.username})
+        user = await users_repo.get_by_username(user_credentials.username)
         
-        if not user or not verify_password(user_credentials.password, user["password"]):
+        # Vérification hors boucle d'événements ; new_hash remplace un ancien hachage SHA-256
+        password_ok, new_hash = await password_hasher.verify(
+            user_credentials.password, user["password"] if user else None
+        )
+        if not password_ok:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Nom d'utilisateur ou mot de passe incorrect",
@@ -2169,16 +1999,19 @@ async def login(user_credentials: UserLogin):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # Mettre à jour la dernière connexion
-        users_collection.update_one(
+        # Mettre à jour la dernière connexion (et le hachage du mot de passe si nécessaire)
+        login_update = {"last_login": datetime.now().isoformat()}
+        if new_hash:
+            login_update["password"] = new_hash
+        await users_repo.update_one(
             {"user_id": user["user_id"]},
-            {"$set": {"last_login": datetime.now().isoformat()}}
+            {"$set": login_update}
         )
         
         # Créer le token JWT
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user["username"]}, expires_delta=access_token_expires
+            data={"sub": user["username"], "uid": user["user_id"]}, expires_delta=access_token_expires
         )
         
         # Informations utilisateur (sans mot de passe)
@@ -2199,6 +2032,12 @@ async def login(user_credentials: UserLogin):
         
     except HTTPException:
         raise
+    except PasswordHasherBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Trop de connexions simultanées, veuillez réessayer dans quelques instants",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error during login: {e}")
         raise HTTPException(status_code=500, detail="Erreur interne du serveur")
@@ -2228,7 +2067,7 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(verify
             )
         
         # Vérifier que le nom d'utilisateur n'existe pas déjà
-        existing_user = users_collection.find_one({"username": user_data.username})
+        existing_user = await users_repo.get_by_username(user_data.username)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -2237,7 +2076,7 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(verify
         
         # Créer l'utilisateur
         user_id = str(uuid.uuid4())
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         
         # Permissions par défaut pour un nouvel utilisateur (seulement dashboard)
         default_permissions = {
@@ -2264,7 +2103,7 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(verify
             "last_login": None
         }
         
-        users_collection.insert_one(new_user)
+        await users_repo.insert_one(new_user)
         
         # Retourner les infos utilisateur (sans mot de passe)
         return {
@@ -2294,7 +2133,7 @@ async def list_users(current_user: dict = Depends(verify_token)):
             )
         
         # Récupérer tous les utilisateurs (sans les mots de passe)
-        users = list(users_collection.find({}, {"password": 0}))
+        users = await users_repo.find_many({}, {"password": 0})
         
         for user in users:
             user["_id"] = str(user["_id"])
@@ -2327,12 +2166,12 @@ async def update_user(user_id: str, user_data: dict, current_user: dict = Depend
         if "is_active" in user_data:
             update_data["is_active"] = user_data["is_active"]
         if "password" in user_data and user_data["password"]:
-            update_data["password"] = hash_password(user_data["password"])
+            update_data["password"] = await password_hasher.hash(user_data["password"])
         if "permissions" in user_data:  # Nouveau : mise à jour des permissions
             update_data["permissions"] = user_data["permissions"]
         
         if update_data:
-            result = users_collection.update_one(
+            result = await users_repo.update_one(
                 {"user_id": user_id},
                 {"$set": update_data}
             )
@@ -2342,6 +2181,7 @@ async def update_user(user_id: str, user_data: dict, current_user: dict = Depend
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Utilisateur introuvable"
                 )
+            await invalidate_principal(user_id)
         
         return {"message": "Utilisateur mis à jour avec succès"}
         
@@ -2369,13 +2209,14 @@ async def delete_user(user_id: str, current_user: dict = Depends(verify_token)):
                 detail="Vous ne pouvez pas supprimer votre propre compte"
             )
         
-        result = users_collection.delete_one({"user_id": user_id})
+        result = await users_repo.delete_one({"user_id": user_id})
         
         if result.deleted_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Utilisateur introuvable"
             )
+        await invalidate_principal(user_id)
         
         return {"message": "Utilisateur supprimé avec succès"}
         
@@ -2411,7 +2252,7 @@ async def update_user_permissions(user_id: str, permissions_data: UserPermission
                 )
         
         # Mettre à jour les permissions
-        result = users_collection.update_one(
+        result = await users_repo.update_one(
             {"user_id": user_id},
             {"$set": {"permissions": permissions_data.permissions}}
         )
@@ -2421,6 +2262,7 @@ async def update_user_permissions(user_id: str, permissions_data: UserPermission
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Utilisateur introuvable"
             )
+        await invalidate_principal(user_id)
         
         return {"message": "Permissions mises à jour avec succès"}
         
@@ -2430,6 +2272,121 @@ async def update_user_permissions(user_id: str, permissions_data: UserPermission
         logger.error(f"Error updating user permissions: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de la mise à jour des permissions")
 
+# ========================================
+# ADMINISTRATION BASE DE DONNÉES
+# ========================================
+
+@app.get("/api/admin/indexes")
+async def get_index_report(current_user: dict = Depends(verify_token)):
+    """Rapport des index MongoDB : manquants, non déclarés, inutilisés (admin uniquement)"""
+    try:
+        if current_user["role"] != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Seuls les administrateurs peuvent consulter les index"
+            )
+        
+        return {"indexes": await index_report()}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building index report: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de l'analyse des index")
+
+@app.post("/api/admin/indexes/sync")
+async def sync_indexes(current_user: dict = Depends(verify_token)):
+    """Créer les index déclarés manquants (admin uniquement)"""
+    try:
+        if current_user["role"] != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Seuls les administrateurs peuvent synchroniser les index"
+            )
+        
+        summary = await ensure_indexes()
+        return {"success": not summary["failed"], **summary}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error synchronizing indexes: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la création des index")
+
+@app.post("/api/admin/counters/migrate")
+async def migrate_counters(current_user: dict = Depends(verify_token)):
+    """Initialiser les compteurs de numérotation à partir des documents existants (admin uniquement)"""
+    try:
+        if current_user["role"] != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Seuls les administrateurs peuvent migrer les compteurs"
+            )
+        
+        return {"success": True, **await seed_counters_from_documents()}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error seeding counters: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la migration des compteurs")
+
+@app.post("/api/admin/search/reindex")
+async def reindex_search(rebuild: bool = False, current_user: dict = Depends(verify_token)):
+    """Calculer les termes de recherche des documents existants (admin uniquement)"""
+    try:
+        if current_user["role"] != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Seuls les administrateurs peuvent réindexer la recherche"
+            )
+        
+        return {"success": True, "indexed": await backfill_search_terms(rebuild=rebuild)}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rebuilding search terms: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la réindexation de la recherche")
+
+@app.get("/api/admin/pdf/metrics")
+async def get_pdf_metrics(current_user: dict = Depends(verify_token)):
+    """Métriques du pool de rendu PDF (file d'attente, temps de rendu) et du cache PDF (admin uniquement)"""
+    if current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les administrateurs peuvent consulter les métriques"
+        )
+    
+    return {"pdf": pdf_renderer.metrics(), "cache": await run_in_threadpool(pdf_cache.stats)}
+
+# ========================================
+# NUMÉROTATION DES DOCUMENTS
+# ========================================
+
+@app.post("/api/numeros/reserve", response_model=dict)
+async def reserve_numeros_endpoint(reservation: NumeroReservation, current_user: dict = Depends(verify_token)):
+    """Réserver un lot de numéros consécutifs (imports en masse)"""
+    try:
+        if reservation.prefix not in NUMERO_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Préfixe invalide: {reservation.prefix}")
+        if reservation.count < 1 or reservation.count > 10000:
+            raise HTTPException(status_code=400, detail="Le nombre de numéros doit être compris entre 1 et 10000")
+        
+        numeros = await reserve_numeros(
+            reservation.prefix,
+            reservation.count,
+            reservation.client_nom,
+            reservation.date_doc
+        )
+        return {"success": True, "numeros": numeros}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reserving numbers: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,278 @@
+"""
+Mouvements de stock - ECO PUMP AFRIK
+
+Toute variation de quantité d'un article passe par un mouvement (entrée,
+sortie, inventaire) enregistré dans `mouvements_stock`. La quantité de
+l'article est modifiée par une mise à jour atomique relative à la valeur
+stockée (jamais lue puis réécrite), si bien que deux mouvements simultanés
+sont tous les deux comptés.
+
+Une entrée valorisée recalcule le prix d'achat moyen pondéré dans la même
+mise à jour :
+    (quantité * prix moyen + quantité entrée * prix unitaire) / (quantité + quantité entrée)
+
+Les factures génèrent des sorties et la réception d'un bon de commande des
+entrées, pour les lignes dont la référence correspond à un article. Ces
+mouvements sont écrits dans la transaction du document et une seule fois
+par ligne (index unique `cle_ligne`) : une opération reprise après un
+échec partiel n'applique que les lignes manquantes.
+
+Chaque écriture sur un article recalcule aussi, dans la même mise à jour,
+deux champs dérivés : `en_alerte` (quantité sous le stock minimum, indexé
+partiellement) et `valeur_stock` (quantité * prix d'achat moyen). Les
+alertes et la valorisation du stock se lisent ainsi sans `$expr`.
+"""
+import uuid
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import UpdateMany
+from pymongo.errors import DuplicateKeyError
+
+import search
+import dashboard_stats
+from database import stock_repo, mouvements_repo, run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+MOUVEMENT_TYPES = ("entrée", "sortie", "inventaire")
+BACKFILL_BATCH_SIZE = 1000
+
+
+class ArticleNotFound(Exception):
+    """The stock article of a movement does not exist"""
+
+
+# Étape de pipeline recalculant les champs dérivés après la mise à jour de l'article
+INDICATORS_STAGE = {"$set": {
+    "en_alerte": {"$lt": [{"$ifNull": ["$quantite_stock", 0]}, {"$ifNull": ["$stock_minimum", 0]}]},
+    "valeur_stock": {"$multiply": [{"$ifNull": ["$quantite_stock", 0]}, {"$ifNull": ["$prix_achat_moyen", 0]}]},
+}}
+
+
+def with_indicators(article: dict) -> dict:
+    """Set en_alerte and valeur_stock of an article about to be inserted (returns it)"""
+    article["en_alerte"] = article.get("quantite_stock", 0) < article.get("stock_minimum", 0)
+    article["valeur_stock"] = article.get("quantite_stock", 0) * article.get("prix_achat_moyen", 0)
+    return article
+
+
+def fields_update(fields: dict) -> list:
+    """Update pipeline setting `fields` (as literal values) and recomputing the indicators"""
+    return [{"$set": {key: {"$literal": value} for key, value in fields.items()}}, INDICATORS_STAGE]
+
+
+def _entry_update(quantite: float, prix_unitaire: float, moment: datetime) -> list:
+    """Update pipeline of a valued entry: weighted average purchase price, then quantity"""
+    stock = {"$max": [{"$ifNull": ["$quantite_stock", 0]}, 0]}
+    prix_moyen = {"$ifNull": ["$prix_achat_moyen", 0]}
+    return [
+        {"$set": {
+            "prix_achat_moyen": {"$cond": [
+                {"$gt": [{"$add": [stock, quantite]}, 0]},
+                {"$divide": [
+                    {"$add": [{"$multiply": [stock, prix_moyen]}, quantite * prix_unitaire]},
+                    {"$add": [stock, quantite]},
+                ]},
+                prix_unitaire,
+            ]},
+        }},
+        {"$set": {
+            "quantite_stock": {"$add": [{"$ifNull": ["$quantite_stock", 0]}, quantite]},
+            "updated_at": moment.isoformat(),
+        }},
+        INDICATORS_STAGE,
+    ]
+
+
+def _movement_update(type_mouvement: str, quantite: float, prix_unitaire: float, moment: datetime) -> list:
+    if type_mouvement == "entrée" and prix_unitaire > 0:
+        return _entry_update(quantite, prix_unitaire, moment)
+    if type_mouvement == "inventaire":
+        return fields_update({"quantite_stock": quantite, "updated_at": moment.isoformat()})
+    delta = quantite if type_mouvement == "entrée" else -quantite
+    return [
+        {"$set": {"quantite_stock": {"$add": [{"$ifNull": ["$quantite_stock", 0]}, delta]},
+                  "updated_at": moment.isoformat()}},
+        INDICATORS_STAGE,
+    ]
+
+
+async def write_movement(session, article_id: str, type_mouvement: str, quantite: float, prix_unitaire: float = 0.0,
+                         document_type: str = "manuel", document_id: Optional[str] = None,
+                         motif: Optional[str] = None, ligne: Optional[int] = None) -> Optional[tuple]:
+    """Apply a movement to its article and record it, in `session` (None without transaction)
+
+    Returns (article before the movement, movement). A document line movement
+    (`ligne` set) is written once: None when it is already recorded.
+    """
+    if type_mouvement not in MOUVEMENT_TYPES:
+        raise ValueError(f"Type de mouvement invalide: {type_mouvement}")
+    moment = datetime.now()
+    mouvement = {
+        "mouvement_id": str(uuid.uuid4()),
+        "article_id": article_id,
+        "type_mouvement": type_mouvement,
+        "quantite": quantite,
+        "prix_unitaire": prix_unitaire,
+        "document_type": document_type,
+        "document_id": document_id,
+        "motif": motif,
+        "created_at": moment.isoformat(),
+        "created_at_formatted": moment.strftime("%d/%m/%Y à %H:%M:%S"),
+    }
+    if ligne is not None:
+        mouvement.update(ligne=ligne, cle_ligne=f"{document_type}:{document_id}:{ligne}")
+        if await mouvements_repo.find_one({"cle_ligne": mouvement["cle_ligne"]}, {"_id": 1}, session=session):
+            return None
+        # La ligne est réservée (index unique) avant de toucher l'article : sans
+        # transaction, un enregistrement concurrent de la même ligne échoue ici
+        # sans avoir rien modifié
+        try:
+            await mouvements_repo.insert_one(mouvement, session=session)
+        except DuplicateKeyError:
+            if session is not None:
+                raise
+            return None
+
+    previous = await stock_repo.find_one_and_update(
+        {"article_id": article_id}, _movement_update(type_mouvement, quantite, prix_unitaire, moment),
+        session=session
+    )
+    if previous is None:
+        if ligne is not None:
+            await mouvements_repo.delete_one({"mouvement_id": mouvement["mouvement_id"]}, session=session)
+        raise ArticleNotFound(article_id)
+    quantite_avant = previous.get("quantite_stock", 0)
+    if type_mouvement == "inventaire":
+        quantite_apres = quantite
+    else:
+        quantite_apres = quantite_avant + (quantite if type_mouvement == "entrée" else -quantite)
+
+    quantities = {
+        "quantite": quantite_apres - quantite_avant if type_mouvement == "inventaire" else quantite,
+        "quantite_avant": quantite_avant,
+        "quantite_apres": quantite_apres,
+    }
+    mouvement.update(quantities)
+    if ligne is not None:
+        await mouvements_repo.update_one({"mouvement_id": mouvement["mouvement_id"]}, {"$set": quantities},
+                                         session=session)
+    else:
+        await mouvements_repo.insert_one(mouvement, session=session)
+    return previous, mouvement
+
+
+async def movements_applied(results: List[Optional[tuple]]) -> List[dict]:
+    """After the write: dashboard alert counter and stock suggestions; returns the new movements"""
+    mouvements = []
+    for result in results:
+        if result is None:
+            continue
+        previous, mouvement = result
+        await dashboard_stats.record_stock_alert(
+            dashboard_stats.is_stock_alert(previous),
+            dashboard_stats.is_stock_alert({**previous, "quantite_stock": mouvement["quantite_apres"]})
+        )
+        mouvement.pop("_id", None)
+        mouvements.append(mouvement)
+    if mouvements:
+        # Les suggestions de stock affichent la quantité
+        search.invalidate_suggestions()
+    return mouvements
+
+
+async def apply_movement(article_id: str, type_mouvement: str, quantite: float, prix_unitaire: float = 0.0,
+                         document_type: str = "manuel", document_id: Optional[str] = None,
+                         motif: Optional[str] = None) -> dict:
+    """Record a movement and apply it to the article quantity (and average price); returns the movement
+
+    For an "inventaire" movement `quantite` is the counted quantity: the
+    movement records the difference with the stored quantity.
+    """
+    async def write(session):
+        return await write_movement(session, article_id, type_mouvement, quantite, prix_unitaire,
+                                    document_type, document_id, motif)
+
+    return (await movements_applied([await run_in_transaction(write)]))[0]
+
+
+async def write_document_movements(session, articles: List[dict], type_mouvement: str, document_type: str,
+                                   document_id: str, motif: Optional[str] = None) -> List[Optional[tuple]]:
+    """Movements of the lines of a facture or achat whose ref matches a stock article, in `session`
+
+    Each line is moved once (unique cle_ligne "document_type:document_id:ligne"):
+    running it again after a partial failure only writes the missing lines.
+    """
+    refs = {line.get("ref") for line in articles if line.get("ref")}
+    if not refs:
+        return []
+    stock_articles = {}
+    for article in await stock_repo.find_many({"ref": {"$in": list(refs)}},
+                                              {"_id": 0, "article_id": 1, "ref": 1}):
+        stock_articles.setdefault(article["ref"], article["article_id"])
+
+    results = []
+    for ligne, line in enumerate(articles):
+        article_id = stock_articles.get(line.get("ref"))
+        if article_id is None or not line.get("quantite"):
+            continue
+        results.append(await write_movement(
+            session, article_id, type_mouvement, line["quantite"],
+            prix_unitaire=line.get("prix_unitaire", 0),
+            document_type=document_type, document_id=document_id, motif=motif, ligne=ligne,
+        ))
+    return results
+
+
+async def document_movements(articles: List[dict], type_mouvement: str, document_type: str,
+                             document_id: str, motif: Optional[str] = None) -> List[dict]:
+    """Movements of the lines of a facture or achat, in their own transaction"""
+    async def write(session):
+        return await write_document_movements(session, articles, type_mouvement, document_type,
+                                              document_id, motif)
+
+    return await movements_applied(await run_in_transaction(write))
+
+
+async def valuation() -> dict:
+    """Inventory value and quantities, in total and per emplacement and per supplier (one aggregation)"""
+    sums = {
+        "articles": {"$sum": 1},
+        "quantite_stock": {"$sum": {"$ifNull": ["$quantite_stock", 0]}},
+        "valeur_stock": {"$sum": {"$ifNull": ["$valeur_stock", 0]}},
+        "articles_en_alerte": {"$sum": {"$cond": [{"$eq": ["$en_alerte", True]}, 1, 0]}},
+    }
+    pipeline = [{"$facet": {
+        "total": [{"$group": {"_id": None, **sums}}],
+        "par_emplacement": [{"$group": {"_id": "$emplacement", **sums}}, {"$sort": {"valeur_stock": -1}}],
+        "par_fournisseur": [{"$group": {"_id": "$fournisseur_principal", **sums}}, {"$sort": {"valeur_stock": -1}}],
+    }}]
+    result = (await stock_repo.aggregate(pipeline))[0]
+
+    def rows(groups, key):
+        return [{key: group.pop("_id") or "", **group} for group in groups]
+
+    total = result["total"][0] if result["total"] else {key: 0 for key in sums}
+    total.pop("_id", None)
+    return {
+        "total": total,
+        "par_emplacement": rows(result["par_emplacement"], "emplacement"),
+        "par_fournisseur": rows(result["par_fournisseur"], "fournisseur_principal"),
+    }
+
+
+async def backfill_indicators(rebuild: bool = False) -> int:
+    """Compute en_alerte and valeur_stock of the articles written before they existed (or of all)"""
+    query = {} if rebuild else {"$or": [{"en_alerte": {"$exists": False}}, {"valeur_stock": {"$exists": False}}]}
+    # Champs dérivés des valeurs stockées : écrits sans nouvelle version
+    modified = 0
+    async for batch in stock_repo.find_batches(query, {"_id": 1}, batch_size=BACKFILL_BATCH_SIZE):
+        result = await stock_repo.write_derived([
+            UpdateMany({"_id": {"$in": [article["_id"] for article in batch]}}, [INDICATORS_STAGE])
+        ])
+        modified += result.modified_count
+    if modified:
+        logger.info(f"Stock indicators computed for {modified} articles")
+    return modified
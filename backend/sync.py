@@ -0,0 +1,113 @@
+"""
+Synchronisation incrémentale des listes - ECO PUMP AFRIK
+
+Les collections synchronisées portent un champ `version` (compteur global
+croissant, voir VersionedRepository) et leurs suppressions laissent une
+pierre tombale versionnée. Un client qui a déjà ses listes en cache envoie
+le jeton de sa dernière synchronisation et ne reçoit que les documents
+créés, modifiés ou supprimés depuis.
+
+Une version est réservée juste avant l'écriture : un document écrit à
+l'instant peut donc être visible alors qu'une version plus petite n'est pas
+encore enregistrée. Le jeton renvoyé ne dépasse jamais une version attribuée
+depuis moins de SYNC_SETTLE_SECONDS ; ces documents récents sont renvoyés
+une seconde fois à la synchronisation suivante (l'application remplace
+chaque document par son identifiant, le doublon est sans effet).
+
+Un jeton plus ancien que la durée de conservation des pierres tombales
+déclenche une resynchronisation complète (`reset`).
+"""
+import os
+import json
+import base64
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from database import tombstones_repo, SYNC_TOMBSTONE_TTL_DAYS
+
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '5'))
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', '1000'))
+
+
+class InvalidSyncToken(Exception):
+    """The token was not produced by encode_token"""
+
+
+def encode_token(version: int, issued_at: Optional[datetime] = None) -> str:
+    payload = json.dumps([version, (issued_at or datetime.now()).isoformat()])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_token(token: str) -> Tuple[int, datetime]:
+    try:
+        version, issued_at = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return int(version), datetime.fromisoformat(issued_at)
+    except Exception:
+        raise InvalidSyncToken(token)
+
+
+async def _changed(repo, projection: Optional[dict], since: Optional[int], limit: Optional[int]) -> list:
+    if since is None:
+        # Synchronisation complète (documents antérieurs au versionnage compris)
+        return await repo.find_many({}, projection)
+    return await repo.find_many({"version": {"$gt": since}}, projection, sort=[("version", 1)],
+                                limit=limit + 1)
+
+
+async def changes(collections: Dict[str, tuple], token: Optional[str] = None,
+                  limit: int = SYNC_MAX_CHANGES) -> dict:
+    """Documents changed and ids deleted since `token`, per collection key, and the next token
+
+    `collections` maps a response key to (repository, projection excluding _id).
+    """
+    started_at = datetime.now()
+    since = None
+    if token:
+        since, issued_at = decode_token(token)
+        if started_at - issued_at > timedelta(days=SYNC_TOMBSTONE_TTL_DAYS):
+            # Des suppressions ont pu expirer depuis : on repart de zéro
+            since = None
+
+    keys = list(collections)
+    reads = [_changed(repo, dict(projection or {}) or None, since, limit) for repo, projection in collections.values()]
+    if since is not None:
+        reads.append(tombstones_repo.find_many(
+            {"version": {"$gt": since},
+             "collection": {"$in": [repo.collection_name for repo, _ in collections.values()]}},
+            {"_id": 0, "collection": 1, "document_id": 1, "version": 1, "version_at": 1},
+            sort=[("version", 1)], limit=limit + 1,
+        ))
+    results = await asyncio.gather(*reads)
+
+    settled_before = (started_at - timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+    next_version = since or 0
+    ceiling = None  # plus grande version sûre quand une liste est tronquée
+    has_more = False
+    for documents in results:
+        if since is not None and len(documents) > limit:
+            has_more = True
+            del documents[limit:]
+            ceiling = min(ceiling, documents[-1]["version"]) if ceiling is not None else documents[-1]["version"]
+        for document in documents:
+            if document.get("version_at", "") < settled_before:
+                next_version = max(next_version, document.get("version", 0))
+    if ceiling is not None:
+        next_version = min(next_version, ceiling)
+
+    changed = dict(zip(keys, results))
+
+    deleted = {key: [] for key in keys}
+    if since is not None:
+        key_by_collection = {repo.collection_name: key for key, (repo, _) in collections.items()}
+        for tombstone in results[-1]:
+            deleted[key_by_collection[tombstone["collection"]]].append(tombstone["document_id"])
+
+    return {
+        "token": encode_token(next_version, started_at),
+        "full": since is None,
+        "reset": bool(token) and since is None,
+        "has_more": has_more,
+        "changes": changed,
+        "deleted": deleted,
+    }
@@ -337,12 +337,12 @@ function App() {
         clientsRes, fournisseursRes, devisRes, facturesRes, 
         stockRes, paiementsRes, statsRes, alertsRes
       ] = await Promise.allSettled([
-        axios.get(`${API_BASE_URL}/api/clients`),
-        axios.get(`${API_BASE_URL}/api/fournisseurs`),
-        axios.get(`${API_BASE_URL}/api/devis`),
-        axios.get(`${API_BASE_URL}/api/factures`),
-        axios.get(`${API_BASE_URL}/api/stock`),
-        axios.get(`${API_BASE_URL}/api/paiements`),
+        axios.get(`${API_BASE_URL}/api/clients?all=true`),
+        axios.get(`${API_BASE_URL}/api/fournisseurs?all=true`),
+        axios.get(`${API_BASE_URL}/api/devis?all=true`),
+        axios.get(`${API_BASE_URL}/api/factures?all=true`),
+        axios.get(`${API_BASE_URL}/api/stock?all=true`),
+        axios.get(`${API_BASE_URL}/api/paiements?all=true`),
         axios.get(`${API_BASE_URL}/api/dashboard/stats`),
         axios.get(`${API_BASE_URL}/api/stock/alerts`)
       ]);
@@ -0,0 +1,672 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for ECO PUMP AFRIK backend
+Run against a live backend: python performance_test.py [scenario] [--base-url URL] [--server-pid PID]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from metrics import percentile
+
+REPORT_TYPES = ["journal_ventes", "balance_clients", "journal_achats",
+                "balance_fournisseurs", "tresorerie", "compte_resultat"]
+
+
+def process_tree(pid):
+    """The backend process and its children (PDF render workers)"""
+    pids = [pid]
+    for current in pids:
+        for task in os.listdir(f"/proc/{current}/task"):
+            with open(f"/proc/{current}/task/{task}/children") as children:
+                pids.extend(int(child) for child in children.read().split())
+    return pids
+
+
+def reset_peak_rss(pids):
+    """Reset VmHWM (Linux >= 4.0) so the next reading is the peak of one request"""
+    for pid in pids:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+
+
+def peak_rss_kb(pids):
+    total = 0
+    for pid in pids:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    total += int(line.split()[1])
+    return total
+
+
+class EcoPumpAfrikPerformanceTester:
+    def __init__(self, base_url="http://localhost:8001", server_pid=None):
+        self.base_url = base_url
+        self.server_pid = server_pid
+        self.client_id = None
+        self.devis_id = None
+        self.token = None
+        self._local = threading.local()
+
+    def session(self):
+        """One HTTP session (keep-alive connection) per worker thread"""
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        if self.token:
+            self._local.session.headers["Authorization"] = f"Bearer {self.token}"
+        return self._local.session
+
+    def login(self, username="admin", password="admin123"):
+        response = requests.post(f"{self.base_url}/api/auth/login",
+                                 json={"username": username, "password": password})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+
+    def seed_data(self, nb_devis=20):
+        """Create a client and a few devis so list endpoints return real payloads"""
+        response = requests.post(f"{self.base_url}/api/clients", json={
+            "nom": "Client Benchmark",
+            "email": "bench@ecopumpafrik.com",
+            "devise": "FCFA",
+            "type_client": "standard"
+        })
+        response.raise_for_status()
+        self.client_id = response.json()["client"]["client_id"]
+
+        articles = [
+            {"item": i, "ref": f"REF{i}", "designation": f"Pompe immergée {i}",
+             "quantite": 2, "prix_unitaire": 150000, "total": 300000}
+            for i in range(1, 6)
+        ]
+        for _ in range(nb_devis):
+            response = requests.post(f"{self.base_url}/api/devis", json={
+                "client_id": self.client_id,
+                "client_nom": "Client Benchmark",
+                "articles": articles,
+                "sous_total": 1500000,
+                "tva": 270000,
+                "total_ttc": 1770000,
+                "net_a_payer": 1770000,
+                "devise": "FCFA"
+            })
+            response.raise_for_status()
+            self.devis_id = response.json()["devis"]["devis_id"]
+
+    def seed_clients(self, nb_clients):
+        """Create clients in parallel and return their ids"""
+        def create(index):
+            response = self.session().post(f"{self.base_url}/api/clients", json={
+                "nom": f"Client Benchmark {index:06d}",
+                "devise": "EUR" if index % 5 == 0 else "FCFA",
+                "type_client": "standard"
+            })
+            response.raise_for_status()
+            return response.json()["client"]["client_id"]
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            return list(executor.map(create, range(nb_clients)))
+
+    def seed_factures(self, nb_factures, client_ids=None):
+        """Create invoices (with a payment on one out of three) for the report benchmarks"""
+        if not client_ids:
+            if not self.client_id:
+                self.seed_data(nb_devis=1)
+            client_ids = [self.client_id]
+        articles = [{"item": 1, "ref": "REF1", "designation": "Pompe immergée",
+                     "quantite": 1, "prix_unitaire": 100000, "total": 100000}]
+
+        def create(index):
+            session = self.session()
+            response = session.post(f"{self.base_url}/api/factures", json={
+                "client_id": client_ids[index % len(client_ids)],
+                "client_nom": "Client Benchmark",
+                "articles": articles,
+                "sous_total": 100000,
+                "tva": 18000,
+                "total_ttc": 118000,
+                "net_a_payer": 118000,
+                "devise": "FCFA"
+            })
+            response.raise_for_status()
+            if index % 3 == 0:
+                session.post(f"{self.base_url}/api/paiements", json={
+                    "type_document": "facture",
+                    "document_id": response.json()["facture"]["facture_id"],
+                    "client_id": client_ids[index % len(client_ids)],
+                    "montant": 50000,
+                    "devise": "FCFA",
+                    "mode_paiement": "espèce"
+                }).raise_for_status()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            list(executor.map(create, range(nb_factures)))
+
+    def _timed_get(self, endpoint):
+        start = time.perf_counter()
+        response = self.session().get(f"{self.base_url}/{endpoint}")
+        elapsed = time.perf_counter() - start
+        return response.status_code, elapsed
+
+    def run_load(self, endpoints, concurrency, total_requests):
+        """Fire total_requests GETs spread over `concurrency` workers"""
+        latencies = []
+        errors = 0
+        jobs = [endpoints[i % len(endpoints)] for i in range(total_requests)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for status_code, elapsed in executor.map(self._timed_get, jobs):
+                latencies.append(elapsed)
+                if status_code != 200:
+                    errors += 1
+        duration = time.perf_counter() - start
+
+        return {
+            "concurrency": concurrency,
+            "requests": total_requests,
+            "errors": errors,
+            "rps": total_requests / duration if duration else 0.0,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+        }
+
+    def benchmark_concurrent_load(self, levels=(1, 10, 50), requests_per_level=500):
+        """Requests per second of the main read endpoints under 1, 10 and 50 concurrent clients"""
+        print("\n🔍 Concurrent load benchmark (async data access layer)")
+        self.seed_data()
+
+        endpoints = [
+            "api/clients",
+            "api/devis",
+            f"api/devis/{self.devis_id}",
+            f"api/clients/{self.client_id}",
+            "api/factures",
+            "api/paiements",
+            "api/dashboard/stats",
+        ]
+
+        # Warm up connection pools
+        self.run_load(endpoints, 5, 50)
+
+        results = []
+        for concurrency in levels:
+            result = self.run_load(endpoints, concurrency, requests_per_level)
+            results.append(result)
+            print(f"   {concurrency:>3} clients: {result['rps']:8.1f} req/s | "
+                  f"p50 {result['p50_ms']:7.1f} ms | p95 {result['p95_ms']:7.1f} ms | "
+                  f"errors {result['errors']}")
+
+        baseline = results[0]["rps"]
+        if baseline:
+            print(f"   Scaling 1 → {levels[-1]} clients: x{results[-1]['rps'] / baseline:.2f} req/s")
+        return all(r["errors"] == 0 for r in results)
+
+    def benchmark_report_memory(self, nb_factures=2000):
+        """Latency and peak RSS of each PDF report (run on two builds to compare before/after)"""
+        print(f"\n🔍 PDF report benchmark ({nb_factures} invoices)")
+        self.seed_factures(nb_factures)
+        if not self.server_pid:
+            print("   (pass --server-pid to also measure the backend peak RSS)")
+
+        ok = True
+        for report_type in REPORT_TYPES:
+            pids = process_tree(self.server_pid) if self.server_pid else []
+            reset_peak_rss(pids)
+            baseline_kb = peak_rss_kb(pids)
+
+            start = time.perf_counter()
+            response = self.session().get(f"{self.base_url}/api/pdf/rapport/{report_type}")
+            elapsed = time.perf_counter() - start
+            ok = ok and response.status_code == 200
+
+            line = f"   {report_type:<22} {elapsed * 1000:8.1f} ms | {len(response.content) / 1024:7.1f} KiB PDF"
+            if pids:
+                peak_kb = peak_rss_kb(pids)
+                line += f" | peak RSS {peak_kb / 1024:7.1f} MiB (+{(peak_kb - baseline_kb) / 1024:.1f})"
+            print(line)
+        return ok
+
+    def benchmark_balance_clients(self, levels=(1000, 10000, 100000), invoices_per_client=10):
+        """Balance clients (JSON and PDF) latency as the number of invoices grows"""
+        print("\n🔍 Balance clients scaling benchmark")
+        client_ids = []
+        seeded = 0
+        ok = True
+        for level in levels:
+            # Les données s'accumulent d'un palier à l'autre
+            client_ids += self.seed_clients(level // invoices_per_client - len(client_ids))
+            self.seed_factures(level - seeded, client_ids)
+            seeded = level
+
+            for label, endpoint in (("JSON", "api/reports/balance-clients"),
+                                    ("PDF ", "api/pdf/rapport/balance_clients")):
+                timings = []
+                for _ in range(3):
+                    status_code, elapsed = self._timed_get(endpoint)
+                    ok = ok and status_code == 200
+                    timings.append(elapsed)
+                print(f"   {level:>7} invoices / {len(client_ids):>6} clients | {label} "
+                      f"median {statistics.median(timings) * 1000:9.1f} ms")
+        return ok
+
+    def benchmark_search(self, nb_documents=100000, concurrency=10, total_requests=500):
+        """Global search latency (p95 target: 50 ms) over a large client base"""
+        print(f"\n🔍 Global search benchmark ({nb_documents} clients)")
+        client_ids = self.seed_clients(nb_documents)
+        self.seed_factures(min(1000, nb_documents), client_ids)
+
+        queries = ["client", "benchmark 0420", "Client Bénchmark 09", "FACT/CLIENTBE", "pompe immergee", "zzz"]
+        endpoints = [f"api/search?q={quote(query)}" for query in queries]
+        self.run_load(endpoints, 2, 20)
+
+        result = self.run_load(endpoints, concurrency, total_requests)
+        print(f"   {concurrency:>3} clients: {result['rps']:8.1f} req/s | "
+              f"p50 {result['p50_ms']:7.1f} ms | p95 {result['p95_ms']:7.1f} ms | "
+              f"errors {result['errors']}")
+        return result["errors"] == 0 and result["p95_ms"] < 50
+
+    def benchmark_autocomplete(self, nb_clients=10000, concurrency=10, total_requests=1000):
+        """Picker autocomplete latency, one request per keystroke (target: single-digit ms)"""
+        print(f"\n🔍 Autocomplete benchmark ({nb_clients} clients)")
+        self.seed_clients(nb_clients)
+
+        typed = "Client Benchmark 0042"
+        endpoints = [f"api/autocomplete/clients?q={quote(typed[:length])}" for length in range(2, len(typed) + 1)]
+        endpoints += [f"api/autocomplete/stock?q={quote(typed[:length])}" for length in range(2, 8)]
+
+        result = self.run_load(endpoints, concurrency, total_requests)
+        print(f"   {concurrency:>3} clients: {result['rps']:8.1f} req/s | "
+              f"p50 {result['p50_ms']:7.1f} ms | p95 {result['p95_ms']:7.1f} ms | "
+              f"errors {result['errors']}")
+        return result["errors"] == 0
+
+    def benchmark_auth(self, levels=(1, 10), requests_per_level=1000):
+        """Authenticated request latency, compared with an unauthenticated endpoint"""
+        print("\n🔍 Authentication overhead benchmark")
+        self.login()
+        self.run_load(["api/auth/me"], 5, 50)
+
+        ok = True
+        for concurrency in levels:
+            baseline = self.run_load(["api/health"], concurrency, requests_per_level)
+            authenticated = self.run_load(["api/auth/me"], concurrency, requests_per_level)
+            ok = ok and authenticated["errors"] == 0
+            print(f"   {concurrency:>3} clients: /api/auth/me p50 {authenticated['p50_ms']:6.2f} ms "
+                  f"p95 {authenticated['p95_ms']:6.2f} ms | /api/health p50 {baseline['p50_ms']:6.2f} ms | "
+                  f"auth overhead {authenticated['p50_ms'] - baseline['p50_ms']:+.2f} ms")
+        return ok
+
+    def _timed_login(self, credentials):
+        start = time.perf_counter()
+        response = self.session().post(f"{self.base_url}/api/auth/login", json=credentials)
+        return response.status_code, time.perf_counter() - start
+
+    def benchmark_login(self, levels=(1, 10, 50), requests_per_level=200, target_p95_ms=500):
+        """Login throughput and p95 under concurrency (rerun with another PASSWORD_HASH_ROUNDS to tune the cost)"""
+        print(f"\n🔍 Login benchmark (p95 target {target_p95_ms} ms)")
+        credentials = {"username": "admin", "password": "admin123"}
+        ok = True
+        for concurrency in levels:
+            latencies = []
+            errors = 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for status_code, elapsed in executor.map(self._timed_login, [credentials] * requests_per_level):
+                    latencies.append(elapsed)
+                    errors += status_code != 200
+            duration = time.perf_counter() - start
+
+            p95_ms = percentile(latencies, 95) * 1000
+            ok = ok and errors == 0 and p95_ms <= target_p95_ms
+            print(f"   {concurrency:>3} clients: {requests_per_level / duration:7.1f} logins/s | "
+                  f"p50 {statistics.median(latencies) * 1000:7.1f} ms | p95 {p95_ms:7.1f} ms | errors {errors}"
+                  f"{'' if p95_ms <= target_p95_ms else '  ⚠️ above target'}")
+        return ok
+
+    def benchmark_bootstrap(self, nb_clients=2000, nb_factures=2000, iterations=20):
+        """Initial SPA load: eight parallel list GETs vs one /api/bootstrap (time and bytes on the wire)"""
+        print(f"\n🔍 Bootstrap benchmark ({nb_clients} clients, {nb_factures} factures)")
+        client_ids = self.seed_clients(nb_clients)
+        self.seed_factures(nb_factures, client_ids)
+        endpoints = ["api/clients?all=true", "api/fournisseurs?all=true", "api/devis?all=true",
+                     "api/factures?all=true", "api/stock?all=true", "api/paiements?all=true",
+                     "api/dashboard/stats", "api/stock/alerts"]
+
+        def wire_size(response):
+            return int(response.headers.get("Content-Length") or len(response.content))
+
+        def separate():
+            with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+                return sum(executor.map(lambda endpoint: wire_size(self.session().get(f"{self.base_url}/{endpoint}")),
+                                        endpoints))
+
+        def bootstrap():
+            response = self.session().get(f"{self.base_url}/api/bootstrap")
+            response.raise_for_status()
+            return wire_size(response)
+
+        results = {}
+        for name, load in (("8 requests", separate), ("bootstrap", bootstrap)):
+            load()
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                size = load()
+                durations.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(durations)
+            print(f"   {name:<11} median {results[name]:8.1f} ms | p95 {percentile(durations, 95):8.1f} ms | "
+                  f"{size / 1024:9.1f} KiB transferred")
+        return results["bootstrap"] < results["8 requests"]
+
+    def benchmark_sync(self, nb_clients=2000, nb_factures=2000, nb_changes=20, settle_seconds=6):
+        """Warm-cache refresh: full list reload vs /api/sync?since=<token> after a few writes"""
+        print(f"\n🔍 Delta sync benchmark ({nb_clients} clients, {nb_factures} factures, {nb_changes} changes)")
+        client_ids = self.seed_clients(nb_clients)
+        self.seed_factures(nb_factures, client_ids)
+        time.sleep(settle_seconds)
+
+        def fetch(url):
+            start = time.perf_counter()
+            response = self.session().get(url)
+            response.raise_for_status()
+            size = int(response.headers.get("Content-Length") or len(response.content))
+            return response.json(), (time.perf_counter() - start) * 1000, size
+
+        full, full_ms, full_size = fetch(f"{self.base_url}/api/sync")
+        self.seed_clients(nb_changes)
+        time.sleep(settle_seconds)
+        delta, delta_ms, delta_size = fetch(f"{self.base_url}/api/sync?since={quote(full['token'])}")
+
+        received = sum(len(documents) for documents in delta["changes"].values())
+        print(f"   full sync  {full_ms:8.1f} ms | {full_size / 1024:9.1f} KiB")
+        print(f"   delta sync {delta_ms:8.1f} ms | {delta_size / 1024:9.1f} KiB | {received} documents "
+              f"(expected {nb_changes})")
+        return received == nb_changes and delta_size < full_size
+
+    def benchmark_json_encoding(self, nb_factures=10000, lines_per_facture=5, repeats=5):
+        """In-process encode time of a 10k invoice list: jsonable_encoder + json vs the orjson path"""
+        print(f"\n🔍 JSON encoding micro-benchmark ({nb_factures} factures, {lines_per_facture} lines each)")
+        import json
+        from bson import ObjectId
+        from fastapi.encoders import jsonable_encoder
+        from serialization import dumps
+
+        def factures():
+            return [{
+                "_id": ObjectId(),
+                "facture_id": f"facture-{index}",
+                "numero_facture": f"FACT/CLIENTBENCH/01012025/{index:05d}",
+                "client_nom": "Client Benchmark Société",
+                "articles": [{"item": line, "ref": f"REF-{line}", "designation": "Pompe immergée 5CV",
+                              "quantite": 2, "prix_unitaire": 150000.0, "total": 300000.0}
+                             for line in range(lines_per_facture)],
+                "total_ttc": 300000.0 * lines_per_facture,
+                "statut_paiement": "impayé",
+                "created_at": "2025-01-01T10:00:00",
+            } for index in range(nb_factures)]
+
+        def before(documents):
+            # Ancien chemin : conversion _id par boucle, jsonable_encoder puis JSONResponse (json.dumps)
+            for document in documents:
+                document["_id"] = str(document["_id"])
+            content = jsonable_encoder({"factures": documents})
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+        def after(documents):
+            # Nouveau chemin : _id exclu par la projection, encodage orjson direct
+            return dumps({"factures": documents})
+
+        timings = {"before": [], "after": []}
+        for _ in range(repeats):
+            documents = factures()
+            start = time.perf_counter()
+            old_body = before(documents)
+            timings["before"].append((time.perf_counter() - start) * 1000)
+
+            documents = [{key: value for key, value in document.items() if key != "_id"} for document in factures()]
+            start = time.perf_counter()
+            new_body = after(documents)
+            timings["after"].append((time.perf_counter() - start) * 1000)
+
+        for name, values in timings.items():
+            print(f"   {name:<6} median {statistics.median(values):8.1f} ms per {nb_factures} factures")
+        speedup = statistics.median(timings["before"]) / statistics.median(timings["after"])
+        print(f"   {speedup:.1f}x faster | {len(old_body) / 1024:.0f} KiB -> {len(new_body) / 1024:.0f} KiB")
+        return speedup > 1
+
+    def benchmark_conditional_get(self, nb_clients=2000, nb_factures=2000, iterations=20, settle_seconds=6):
+        """List revalidation: identity vs compressed body, full 200 vs If-None-Match 304"""
+        print(f"\n🔍 Compression / conditional GET benchmark ({nb_clients} clients, {nb_factures} factures)")
+        client_ids = self.seed_clients(nb_clients)
+        self.seed_factures(nb_factures, client_ids)
+        # Pas d'ETag tant que la dernière écriture n'est pas stabilisée (SYNC_SETTLE_SECONDS)
+        time.sleep(settle_seconds)
+        url = f"{self.base_url}/api/factures?all=true"
+
+        def fetch(headers):
+            start = time.perf_counter()
+            response = self.session().get(url, headers=headers)
+            elapsed = (time.perf_counter() - start) * 1000
+            return response, elapsed, int(response.headers.get("Content-Length") or len(response.content))
+
+        identity, _, identity_size = fetch({"Accept-Encoding": "identity"})
+        compressed, _, compressed_size = fetch({"Accept-Encoding": "br, gzip"})
+        etag = compressed.headers.get("ETag")
+        print(f"   identity   {identity_size / 1024:9.1f} KiB")
+        print(f"   {compressed.headers.get('Content-Encoding', 'identity'):<10} {compressed_size / 1024:9.1f} KiB "
+              f"({identity_size / max(compressed_size, 1):.1f}x smaller)")
+
+        results = {}
+        for name, headers in (("200 full", {"Accept-Encoding": "br, gzip"}),
+                              ("304", {"Accept-Encoding": "br, gzip", "If-None-Match": etag or ""})):
+            durations = []
+            for _ in range(iterations):
+                response, elapsed, size = fetch(headers)
+                durations.append(elapsed)
+            results[name] = response.status_code
+            print(f"   {name:<10} median {statistics.median(durations):8.1f} ms | "
+                  f"p95 {percentile(durations, 95):8.1f} ms | status {response.status_code} | {size} bytes")
+        return bool(etag) and results["304"] == 304 and compressed_size < identity_size
+
+    def stress_concurrent_payments(self, nb_payments=500, concurrency=50, montant=100):
+        """Hundreds of parallel partial payments on one invoice: every one must be counted"""
+        print(f"\n🔍 Concurrent payments stress test ({nb_payments} payments, {concurrency} clients)")
+        if not self.client_id:
+            self.seed_data(nb_devis=1)
+        total = nb_payments * montant
+        response = requests.post(f"{self.base_url}/api/factures", json={
+            "client_id": self.client_id,
+            "client_nom": "Client Benchmark",
+            "articles": [{"item": 1, "designation": "Stress paiements", "quantite": 1,
+                          "prix_unitaire": total, "total": total}],
+            "sous_total": total,
+            "tva": 0,
+            "total_ttc": total,
+            "net_a_payer": total,
+            "devise": "FCFA"
+        })
+        response.raise_for_status()
+        facture = response.json()["facture"]
+
+        def pay(_):
+            return self.session().post(f"{self.base_url}/api/paiements", json={
+                "type_document": "facture",
+                "document_id": facture["facture_id"],
+                "client_id": self.client_id,
+                "montant": montant,
+                "devise": "FCFA",
+                "mode_paiement": "mobile_money"
+            }).status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            statuses = list(executor.map(pay, range(nb_payments)))
+        duration = time.perf_counter() - start
+
+        response = requests.get(f"{self.base_url}/api/search/factures",
+                                params={"numero_facture": facture["numero_facture"]})
+        stored = response.json()["factures"][0]
+        accepted = statuses.count(200)
+        ok = stored["montant_paye"] == accepted * montant and stored["statut_paiement"] == "payé"
+        print(f"   {accepted}/{nb_payments} accepted in {duration:.1f}s | montant_paye {stored['montant_paye']} "
+              f"(expected {accepted * montant}) | statut {stored['statut_paiement']} | "
+              f"{'✅ exact' if ok else '❌ lost updates'}")
+        return ok and accepted == nb_payments
+
+    def benchmark_stock_alerts(self, nb_articles=10000, alert_ratio=0.01, concurrency=10, total_requests=500):
+        """Low-stock list and valuation latency over a large catalogue with few alerting articles"""
+        print(f"\n🔍 Stock alerts benchmark ({nb_articles} articles, {alert_ratio:.0%} en alerte)")
+        run_id = int(time.time())
+        alert_every = max(1, int(1 / alert_ratio))
+
+        def create(index):
+            self.session().post(f"{self.base_url}/api/stock", json={
+                "ref": f"BENCH-{run_id}-{index:06d}",
+                "designation": f"Article Benchmark {index}",
+                "quantite_stock": 1 if index % alert_every == 0 else 100,
+                "stock_minimum": 10,
+                "prix_achat_moyen": 50,
+                "prix_vente": 80,
+                "emplacement": f"Magasin {index % 5}"
+            }).raise_for_status()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            list(executor.map(create, range(nb_articles)))
+
+        ok = True
+        for endpoint in ("api/stock/alerts", "api/search/stock?stock_bas=true", "api/stock/valuation"):
+            result = self.run_load([endpoint], concurrency, total_requests)
+            print(f"   {endpoint:<34} {result['rps']:8.1f} req/s | p50 {result['p50_ms']:7.1f} ms | "
+                  f"p95 {result['p95_ms']:7.1f} ms | errors {result['errors']}")
+            ok = ok and result["errors"] == 0
+        return ok
+
+    def stress_concurrent_stock_movements(self, nb_movements=500, concurrency=50):
+        """Parallel entries and exits on one article: the final quantity must match the ledger"""
+        print(f"\n🔍 Concurrent stock movements stress test ({nb_movements} movements, {concurrency} clients)")
+        response = requests.post(f"{self.base_url}/api/stock", json={
+            "ref": f"STRESS-{int(time.time())}",
+            "designation": "Stress mouvements",
+            "quantite_stock": 1000,
+            "prix_achat_moyen": 100,
+            "prix_vente": 150
+        })
+        response.raise_for_status()
+        article = response.json()["article"]
+        article_id = article["article_id"]
+
+        def move(index):
+            type_mouvement = "entrée" if index % 2 else "sortie"
+            return type_mouvement, self.session().post(f"{self.base_url}/api/stock/{article_id}/mouvements", json={
+                "type_mouvement": type_mouvement,
+                "quantite": 1 + index % 3,
+                "prix_unitaire": 120 if type_mouvement == "entrée" else 0
+            }).status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(move, range(nb_movements)))
+        duration = time.perf_counter() - start
+
+        expected = 1000 + sum((1 + index % 3) * (1 if type_mouvement == "entrée" else -1)
+                              for index, (type_mouvement, status) in enumerate(results) if status == 200)
+        response = requests.get(f"{self.base_url}/api/search/stock", params={"ref": article["ref"]})
+        stored = response.json()["stock"][0]["quantite_stock"]
+        accepted = sum(1 for _, status in results if status == 200)
+        ok = stored == expected
+        print(f"   {accepted}/{nb_movements} accepted in {duration:.1f}s | quantite_stock {stored} "
+              f"(expected {expected}) | {'✅ exact' if ok else '❌ lost updates'}")
+        return ok and accepted == nb_movements
+
+    def benchmark_payment_import(self, nb_lines=10000, per_line_sample=500):
+        """Bulk statement import vs one POST /api/paiements per line"""
+        print(f"\n🔍 Payment import benchmark ({nb_lines} lines)")
+        self.seed_factures(nb_lines)
+        response = requests.get(f"{self.base_url}/api/factures",
+                                params={"all": "true", "fields": "numero_facture,facture_id,client_id"})
+        factures = response.json()["factures"][:nb_lines]
+        run_id = int(time.time())
+
+        def pay(facture):
+            return self.session().post(f"{self.base_url}/api/paiements", json={
+                "type_document": "facture",
+                "document_id": facture["facture_id"],
+                "client_id": facture.get("client_id"),
+                "montant": 1,
+                "devise": "FCFA",
+                "mode_paiement": "virement"
+            }).status_code
+
+        sample = factures[:per_line_sample]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            per_line_ok = all(code == 200 for code in executor.map(pay, sample))
+        per_line_estimate = (time.perf_counter() - start) / len(sample) * len(factures)
+
+        lines = [{"numero_facture": f["numero_facture"], "reference_paiement": f"BENCH-{run_id}-{i}",
+                  "montant": 1, "mode_paiement": "virement"} for i, f in enumerate(factures)]
+        start = time.perf_counter()
+        response = self.session().post(f"{self.base_url}/api/paiements/import", json=lines)
+        bulk_duration = time.perf_counter() - start
+        imported = response.json().get("resultats", {}).get("importé", 0) if response.ok else 0
+
+        print(f"   per-line API: {per_line_estimate:7.1f} s (estimated from {len(sample)} lines, 10 clients)")
+        print(f"   bulk import:  {bulk_duration:7.1f} s | {imported}/{len(lines)} imported | "
+              f"x{per_line_estimate / bulk_duration:.1f} faster")
+        return per_line_ok and imported == len(lines)
+
+
+SCENARIOS = {
+    "load": lambda tester: tester.benchmark_concurrent_load(),
+    "reports": lambda tester: tester.benchmark_report_memory(),
+    "balance": lambda tester: tester.benchmark_balance_clients(),
+    "search": lambda tester: tester.benchmark_search(),
+    "autocomplete": lambda tester: tester.benchmark_autocomplete(),
+    "auth": lambda tester: tester.benchmark_auth(),
+    "login": lambda tester: tester.benchmark_login(),
+    "payments": lambda tester: tester.stress_concurrent_payments(),
+    "import": lambda tester: tester.benchmark_payment_import(),
+    "stock": lambda tester: tester.stress_concurrent_stock_movements(),
+    "stock_alerts": lambda tester: tester.benchmark_stock_alerts(),
+    "bootstrap": lambda tester: tester.benchmark_bootstrap(),
+    "sync": lambda tester: tester.benchmark_sync(),
+    "encoding": lambda tester: tester.benchmark_json_encoding(),
+    "conditional": lambda tester: tester.benchmark_conditional_get(),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ECO PUMP AFRIK performance benchmarks")
+    parser.add_argument("scenario", nargs="?", default="all", choices=["all"] + list(SCENARIOS))
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--server-pid", type=int, help="backend PID, to measure its memory")
+    args = parser.parse_args()
+
+    print("🚀 Starting ECO PUMP AFRIK performance benchmarks")
+    print("=" * 70)
+
+    tester = EcoPumpAfrikPerformanceTester(args.base_url, args.server_pid)
+    selected = SCENARIOS if args.scenario == "all" else {args.scenario: SCENARIOS[args.scenario]}
+
+    results = [scenario(tester) for scenario in selected.values()]
+
+    print("\n" + "=" * 70)
+    if all(results):
+        print("✅ Benchmarks completed without errors")
+        return 0
+    print("⚠️  Some benchmarks reported errors")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
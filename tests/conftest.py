@@ -0,0 +1,36 @@
+"""
+Fixtures des tests backend - ECO PUMP AFRIK
+
+Les tests écrivent dans une base dédiée (TEST_DB_NAME) du serveur MONGO_URL.
+Sans MONGO_URL, ils tournent sur une base en mémoire (mongomock-motor).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME", "ecopump_afrik_test")
+
+if "MONGO_URL" not in os.environ:
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    motor.motor_asyncio.AsyncIOMotorClient = lambda *args, **kwargs: AsyncMongoMockClient()
+
+# Importé après le choix du client MongoDB
+import database
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # Une seule boucle d'événements pour toute la session : le client Motor y reste attaché
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Empty test database"""
+    for name in await database.db.list_collection_names():
+        await database.db.drop_collection(name)
+    yield database.db
@@ -0,0 +1,81 @@
+"""
+Paiements partiels simultanés - ECO PUMP AFRIK
+"""
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+
+from database import factures_repo, paiements_repo
+from payments import record_payment
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_facture(total_ttc: float) -> str:
+    facture_id = str(uuid.uuid4())
+    await factures_repo.insert_one({
+        "facture_id": facture_id,
+        "numero_facture": f"FACT/TEST/{facture_id[:8]}",
+        "client_id": "client-test",
+        "total_ttc": total_ttc,
+        "montant_paye": 0.0,
+        "statut_paiement": "impayé",
+        "devise": "FCFA",
+        "created_at": datetime.now().isoformat(),
+    })
+    return facture_id
+
+
+def paiement(facture_id: str, montant: float) -> dict:
+    return {
+        "paiement_id": str(uuid.uuid4()),
+        "type_document": "facture",
+        "document_id": facture_id,
+        "client_id": "client-test",
+        "montant": montant,
+        "devise": "FCFA",
+        "mode_paiement": "espèce",
+        "statut": "validé",
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+async def pay_concurrently(facture_id: str, montants: list):
+    await asyncio.gather(*(record_payment(paiement(facture_id, montant)) for montant in montants))
+    return await factures_repo.find_one({"facture_id": facture_id})
+
+
+async def test_concurrent_partial_payments_are_all_counted(db):
+    facture_id = await create_facture(100000.0)
+
+    facture = await pay_concurrently(facture_id, [2500.0] * 20)
+
+    assert facture["montant_paye"] == 50000.0
+    assert facture["statut_paiement"] == "partiel"
+    assert await paiements_repo.count({"document_id": facture_id}) == 20
+
+
+async def test_concurrent_payments_settling_the_invoice(db):
+    facture_id = await create_facture(100000.0)
+
+    facture = await pay_concurrently(facture_id, [10000.0] * 8 + [5000.0] * 4)
+
+    assert facture["montant_paye"] == 100000.0
+    assert facture["statut_paiement"] == "payé"
+    assert await paiements_repo.count({"document_id": facture_id}) == 12
+
+
+async def test_concurrent_payments_on_several_invoices(db):
+    factures = [await create_facture(30000.0) for _ in range(3)]
+
+    await asyncio.gather(*(
+        record_payment(paiement(facture_id, 1000.0))
+        for _ in range(15) for facture_id in factures
+    ))
+
+    for facture_id in factures:
+        facture = await factures_repo.find_one({"facture_id": facture_id})
+        assert facture["montant_paye"] == 15000.0
+        assert facture["statut_paiement"] == "partiel"
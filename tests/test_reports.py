@@ -0,0 +1,116 @@
+"""
+Balance clients par agrégation - ECO PUMP AFRIK
+"""
+from datetime import date
+
+import pytest
+
+from database import clients_repo, factures_repo
+from reports import balance_clients
+
+pytestmark = pytest.mark.anyio
+
+TODAY = date(2026, 3, 31)
+
+CLIENTS = [
+    {"client_id": "c-alpha", "nom": "Alpha Forages", "type_client": "standard", "devise": "FCFA"},
+    {"client_id": "c-beta", "nom": "Beta Irrigation", "type_client": "revendeur", "devise": "EUR"},
+    {"client_id": "c-gamma", "nom": "Gamma Sans Facture", "type_client": "standard", "devise": "FCFA"},
+]
+
+FACTURES = [
+    # client, devise, date, total, payé, statut
+    ("c-alpha", "FCFA", "2026-03-20", 1000.0, 400.0, "partiel"),
+    ("c-alpha", "FCFA", "2026-01-10", 500.0, 0.0, "impayé"),
+    ("c-alpha", "FCFA", "2026-02-15", 300.0, 300.0, "payé"),
+    ("c-beta", "EUR", "2025-11-01", 200.0, 50.0, "partiel"),
+    ("c-beta", "FCFA", "2026-03-30", 700.0, 0.0, "impayé"),
+]
+
+
+async def seed():
+    for client in CLIENTS:
+        await clients_repo.insert_one(dict(client))
+    for number, (client_id, devise, date_facture, total_ttc, montant_paye, statut) in enumerate(FACTURES, start=1):
+        await factures_repo.insert_one({
+            "facture_id": f"f-{number}",
+            "numero_facture": f"FACT/TEST/{number:03d}",
+            "client_id": client_id,
+            "devise": devise,
+            "date_facture": date_facture,
+            "total_ttc": total_ttc,
+            "montant_paye": montant_paye,
+            "statut_paiement": statut,
+        })
+
+
+def per_client_loop():
+    """Former computation: invoices of each client filtered in Python (per currency)"""
+    balances = {}
+    for client in CLIENTS:
+        for devise in ("FCFA", "EUR"):
+            client_factures = [f for f in FACTURES if f[0] == client["client_id"] and f[1] == devise]
+            if not client_factures:
+                continue
+            total_facture = sum(f[3] for f in client_factures)
+            total_paye = sum(f[4] for f in client_factures)
+            balances[(client["client_id"], devise)] = {
+                "nombre_factures": len(client_factures),
+                "total_facture": total_facture,
+                "total_paye": total_paye,
+                "solde": total_facture - total_paye,
+            }
+    return balances
+
+
+async def test_balance_matches_the_per_client_computation(db):
+    await seed()
+
+    balance = await balance_clients(today=TODAY)
+
+    rows = {(row["client_id"], row["devise"]): row for row in balance["clients"]}
+    expected = per_client_loop()
+    assert rows.keys() == expected.keys()
+    for key, totals in expected.items():
+        for field, value in totals.items():
+            assert rows[key][field] == value, (key, field)
+
+
+async def test_balance_rows_and_ageing(db):
+    await seed()
+
+    balance = await balance_clients(today=TODAY)
+
+    assert balance["date_reference"] == "2026-03-31"
+    assert [(row["nom"], row["devise"]) for row in balance["clients"]] == [
+        ("Alpha Forages", "FCFA"), ("Beta Irrigation", "EUR"), ("Beta Irrigation", "FCFA"),
+    ]
+    alpha = balance["clients"][0]
+    assert alpha["type_client"] == "standard"
+    assert (alpha["nombre_factures"], alpha["total_facture"], alpha["total_paye"], alpha["solde"]) == (
+        3, 1800.0, 700.0, 1100.0)
+    assert alpha["anciennete"] == {"0_30": 600.0, "31_60": 0, "61_90": 500.0, "plus_90": 0}
+    assert balance["clients"][1]["anciennete"] == {"0_30": 0, "31_60": 0, "61_90": 0, "plus_90": 150.0}
+
+
+async def test_balance_currency_subtotals(db):
+    await seed()
+
+    sous_totaux = (await balance_clients(today=TODAY))["sous_totaux"]
+
+    assert sous_totaux["FCFA"] == {
+        "clients": 2, "nombre_factures": 4, "total_facture": 2500.0, "total_paye": 700.0, "solde": 1800.0,
+        "anciennete": {"0_30": 1300.0, "31_60": 0, "61_90": 500.0, "plus_90": 0},
+    }
+    assert sous_totaux["EUR"] == {
+        "clients": 1, "nombre_factures": 1, "total_facture": 200.0, "total_paye": 50.0, "solde": 150.0,
+        "anciennete": {"0_30": 0, "31_60": 0, "61_90": 0, "plus_90": 150.0},
+    }
+
+
+async def test_balance_period_filter(db):
+    await seed()
+
+    balance = await balance_clients({"$gte": "2026-03-01", "$lte": "2026-03-31"}, today=TODAY)
+
+    assert [(row["client_id"], row["solde"]) for row in balance["clients"]] == [("c-alpha", 600.0), ("c-beta", 700.0)]